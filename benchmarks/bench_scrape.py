@@ -0,0 +1,74 @@
+"""
+Parse time and peak memory of the Wikipedia extractor on the saved page fixtures.
+
+Usage:
+    python -m benchmarks.bench_scrape [-n 50] [fixture.html ...]
+
+'full_tree' is the cost of building the parsing tree for the whole page, which is what the extractor
+paid before it started to parse the lead section only.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+from pathlib import Path
+from selectolax.parser import HTMLParser
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'mainApp' / 'testdata'
+
+def _setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stargazing.settings')
+    import django
+    django.setup()
+
+def best_time(func, page, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(page)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def _peak_rss_child(func, page, queue):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = func(page)
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+    # keep the result alive until the peak is read
+    del result
+
+def peak_rss_kb(func, page):
+    """
+    Growth of the peak RSS of a forked process while it runs func(page), selectolax allocates outside of tracemalloc's sight.
+    """
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_peak_rss_child, args=(func, page, queue))
+    process.start()
+    growth = queue.get()
+    process.join()
+    return growth
+
+def bench(path, rounds):
+    from mainApp.wiki import parse_wiki_page
+    page = Path(path).read_text()
+    cases = {'full_tree': HTMLParser, 'parse_wiki_page': parse_wiki_page}
+    return {
+        'fixture': Path(path).name,
+        'page_kb': round(len(page.encode()) / 1024, 1),
+        **{f'{name}_ms': round(best_time(func, page, rounds), 3) for name, func in cases.items()},
+        **{f'{name}_peak_rss_kb': peak_rss_kb(func, page) for name, func in cases.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fixtures', nargs='*', default=[str(FIXTURES / 'wiki_orion.html')])
+    parser.add_argument('-n', '--rounds', type=int, default=50)
+    args = parser.parse_args()
+    _setup_django()
+    for path in args.fixtures:
+        print(json.dumps(bench(path, args.rounds), indent=2))
+
+if __name__ == '__main__':
+    main()
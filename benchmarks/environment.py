@@ -0,0 +1,85 @@
+"""
+Local stand-ins for MongoDB, Redis and Wikipedia, so the benchmarks measure SkyGaze code only.
+
+Requires mongomock and fakeredis:
+    python -m pip install mongomock fakeredis
+"""
+import contextlib
+import os
+import tempfile
+from unittest import mock
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stargazing.settings')
+    import django
+    django.setup()
+
+class AsyncCursor():
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def to_list(self, length=None):
+        return list(self.cursor)[:length]
+
+class AsyncCollection():
+    """
+    The part of pymongo's AsyncCollection the async views use, over a mongomock collection.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    async def replace_one(self, *args, **kwargs):
+        return self.collection.replace_one(*args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return self.collection.update_one(*args, **kwargs)
+
+@contextlib.contextmanager
+def standins(wiki_delay=0):
+    """
+    Run the block against mongomock (loaded with the repo's dump), fakeredis and a local stub of Wikipedia.
+    The async pools get views of the same data, border images are mirrored into a temporary directory.
+
+    Args:
+        wiki_delay (float): Seconds the stub waits before answering, the round trip to Wikipedia.
+
+    Yields:
+        dict: {'mongo': mongomock.MongoClient, 'redis': fakeredis.FakeRedis, 'wiki': StubWikipedia}
+    """
+    try:
+        import fakeredis
+        import mongomock
+    except ImportError as exc:
+        raise SystemExit(f"Benchmarks need mongomock and fakeredis: {exc}")
+    setup_django()
+    from django.conf import settings
+    from django.test.utils import override_settings, setup_test_environment
+    from mainApp import catalog, pools, sidereal
+    from mainApp.testing import StubWikipedia, load_dump
+
+    mongo = mongomock.MongoClient()
+    db = mongo[{**pools.MONGO_DEFAULTS, **getattr(settings, 'MONGO', {})}['DB']]
+    db.constellations.insert_many([{key: value for key, value in elem.items() if key != '_id'} for elem in load_dump()])
+    server = fakeredis.FakeServer()
+    fake_redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    fake_async_redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+    setup_test_environment()
+    with StubWikipedia(delay=wiki_delay) as wiki, tempfile.TemporaryDirectory() as border_root, \
+         override_settings(WIKI={**getattr(settings, 'WIKI', {}), 'BASE_URL': wiki.url},
+                           BORDERS={**getattr(settings, 'BORDERS', {}), 'ROOT': border_root}), \
+         mock.patch('mainApp.pools.get_mongo_client', return_value=mongo), \
+         mock.patch('mainApp.pools.get_redis', return_value=fake_redis), \
+         mock.patch('mainApp.pools.get_async_mongo_collection', side_effect=lambda name: AsyncCollection(db[name])), \
+         mock.patch('mainApp.pools.get_async_redis', new=mock.AsyncMock(return_value=fake_async_redis)):
+        catalog.invalidate_catalog()
+        sidereal.clear_gmst_table()
+        yield {'mongo': mongo, 'redis': fake_redis, 'wiki': wiki}
+        catalog.invalidate_catalog()
@@ -0,0 +1,125 @@
+"""
+Concurrent HTTP load generator for comparing deployments of SkyGaze.
+
+Usage:
+    python -m benchmarks.loadtest "http://127.0.0.1:8000/api/get_wiki_page/?constell_id=60" -c 200 -n 2000 --label asgi
+    python -m benchmarks.loadtest "http://127.0.0.1:8000/api/get_wiki_page/?constell_id={id}" --ids 1-88 -c 88 -n 88
+
+{id} in the url is replaced by the ids in turn, e.g. to spread the load over distinct wiki pages.
+
+Run it once against the WSGI path and once against the ASGI path (see README), then compare with:
+    python -m benchmarks.loadtest --compare wsgi.json asgi.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import httpx
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+def parse_ids(spec):
+    """
+    Parse ids like "1-88" or "1,5,60" (or a mix of both) into a list.
+    """
+    ids = []
+    for part in spec.split(','):
+        first, _, last = part.partition('-')
+        ids.extend(range(int(first), int(last or first) + 1))
+    return ids
+
+async def run(url, concurrency, requests, method='GET', data=None, timeout=60, ids=None):
+    """
+    Fire requests at url, keeping at most concurrency of them in flight.
+
+    Args:
+        ids (list): Values of {id} in url, used in turn.
+
+    Returns:
+        dict: Throughput, latency percentiles in milliseconds and error count.
+    """
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(url.replace('{id}', str(ids[i % len(ids)])) if ids else url)
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            target = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, target, data=data)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        'url': url,
+        'ids': len(ids) if ids else None,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(requests / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+def compare(paths):
+    rows = []
+    for path in paths:
+        with open(path) as f:
+            rows.append(json.load(f))
+    keys = ('rps', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'errors')
+    print(f"{'label':<16}" + ''.join(f'{key:>10}' for key in keys))
+    for row in rows:
+        print(f"{row.get('label', '-'):<16}" + ''.join(f'{row[key]:>10}' for key in keys))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', nargs='?')
+    parser.add_argument('-c', '--concurrency', type=int, default=50)
+    parser.add_argument('-n', '--requests', type=int, default=1000)
+    parser.add_argument('-X', '--method', default='GET')
+    parser.add_argument('--ids', type=parse_ids, help="Values of {id} in the url, e.g. 1-88.")
+    parser.add_argument('-d', '--data', help="Form data as a JSON object, e.g. for POST /session/.")
+    parser.add_argument('--label', default='-', help="Name of this run in the saved results.")
+    parser.add_argument('-o', '--output', help="Save the results as JSON, defaults to <label>.json if a label is given.")
+    parser.add_argument('--compare', nargs='+', metavar='RESULTS', help="Print saved results side by side.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+    if not args.url:
+        parser.error("url is required")
+    data = json.loads(args.data) if args.data else None
+    if '{id}' in args.url and not args.ids:
+        parser.error("--ids is required with {id} in the url")
+    result = asyncio.run(run(args.url, args.concurrency, args.requests, args.method, data, ids=args.ids))
+    result['label'] = args.label
+    print(json.dumps(result, indent=2))
+    output = args.output or (f'{args.label}.json' if args.label != '-' else None)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Serve SkyGaze over HTTP against the stand-ins of environment.py, for benchmarks.loadtest.
+
+Usage:
+    python -m benchmarks.serve wsgi --port 8000
+    python -m benchmarks.serve asgi --port 8000 --wiki-delay 0.2
+
+wsgi runs gunicorn with one worker and --threads threads, asgi runs uvicorn with one worker and the async
+views, like the commands of the README. Requires gunicorn and uvicorn.
+"""
+import argparse
+import os
+from benchmarks.environment import standins
+
+def serve_wsgi(port, threads):
+    from gunicorn.app.base import BaseApplication
+    from stargazing.wsgi import application
+
+    class Server(BaseApplication):
+        def load_config(self):
+            # the worker is forked from this process and keeps its stand-ins
+            self.cfg.set('bind', f'127.0.0.1:{port}')
+            self.cfg.set('workers', 1)
+            self.cfg.set('threads', threads)
+            self.cfg.set('backlog', 2048)
+
+        def load(self):
+            return application
+
+    Server().run()
+
+def serve_asgi(port):
+    import uvicorn
+    from stargazing.asgi import application
+    uvicorn.run(application, host='127.0.0.1', port=port, log_level='warning', backlog=2048)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('interface', choices=('wsgi', 'asgi'))
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--threads', type=int, default=8, help="Threads of the gunicorn worker.")
+    parser.add_argument('--wiki-delay', type=float, default=0, help="Seconds Wikipedia takes to answer.")
+    args = parser.parse_args()
+
+    # urls.py picks the views when it's imported
+    os.environ['SKYGAZE_ASYNC_VIEWS'] = '1' if args.interface == 'asgi' else '0'
+    with standins(args.wiki_delay):
+        if args.interface == 'asgi':
+            serve_asgi(args.port)
+        else:
+            serve_wsgi(args.port, args.threads)
+
+if __name__ == '__main__':
+    main()
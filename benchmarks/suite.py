@@ -0,0 +1,235 @@
+"""
+Throughput and latency of the astronomy math, the cache layer, the scraper and the Django endpoints.
+
+MongoDB, Redis and Wikipedia are replaced by mongomock, fakeredis and a local stub server (see environment.py).
+
+Usage:
+    python -m benchmarks.suite run -o before.json
+    python -m benchmarks.suite run -o after.json -k astro
+    python -m benchmarks.suite compare before.json after.json --threshold 10
+
+compare exits with status 1 if any benchmark's median got slower than the threshold (in percent).
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+from benchmarks.environment import standins
+
+CASES = {}
+
+def case(name):
+    """
+    Register a benchmark. The decorated function gets the stand-ins and returns the callable to measure.
+    """
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+@case('astro.calculate_JD')
+def _(env):
+    from mainApp.api import calculate_JD
+    time_n_date = {'year': '2023', 'month': '11', 'day': '4', 'hour': '21', 'minute': '30', 'second': '0'}
+    return lambda: calculate_JD(time_n_date)
+
+@case('astro.calculate_GMST_alt')
+def _(env):
+    from mainApp.api import calculate_GMST_alt
+    # a different second on every call, so the memoization does not help
+    moments = [(f'{h:02}:{m:02}:{s:02}', '2023-11-04') for h in range(24) for m in range(60) for s in range(0, 60, 7)]
+    state = {'i': 0}
+    def run():
+        state['i'] = (state['i'] + 1) % len(moments)
+        calculate_GMST_alt(*moments[state['i']])
+    return run
+
+@case('astro.calculate_GMST_alt_memoized')
+def _(env):
+    from mainApp.api import calculate_GMST_alt
+    return lambda: calculate_GMST_alt('21:30:00', '2023-11-04')
+
+@case('astro.equatorial_to_horizontal')
+def _(env):
+    from mainApp.api import equatorial_to_horizontal
+    return lambda: equatorial_to_horizontal(Decimal('5.5948885'), Decimal('5.138143'), Decimal('55.75'), 3.25)
+
+@case('astro.are_visible_many')
+def _(env):
+    from mainApp.api import are_visible_many
+    from mainApp.catalog import get_catalog
+    catalog = get_catalog()
+    return lambda: are_visible_many(Decimal('55.75'), 3.25, catalog)
+
+@case('astro.get_visible_constells')
+def _(env):
+    from mainApp.api import get_visible_constells
+    return lambda: get_visible_constells('37.6173', '55.7558', '21:30:00', '2023-11-04')
+
+@case('cache.get_constells')
+def _(env):
+    from mainApp.api import get_constells
+    return get_constells
+
+@case('cache.get_constell_by_id')
+def _(env):
+    from mainApp.api import get_constell_by_id
+    return lambda: get_constell_by_id(60)
+
+@case('cache.load_constells')
+def _(env):
+    from mainApp.api import load_constells
+    return load_constells
+
+@case('cache.load_constell_by_id')
+def _(env):
+    from mainApp.api import load_constell_by_id
+    return lambda: load_constell_by_id(60)
+
+@case('wiki.parse_wiki_page')
+def _(env):
+    from mainApp.testing import TESTDATA
+    from mainApp.wiki import parse_wiki_page
+    page = (TESTDATA / 'wiki_orion.html').read_text()
+    return lambda: parse_wiki_page(page)
+
+@case('wiki.scrape_wiki_page')
+def _(env):
+    from mainApp.api import scrape_wiki_page
+    from mainApp.wiki import wiki_api_url
+    url = wiki_api_url('Orion_(constellation)')
+    return lambda: scrape_wiki_page(url)
+
+@case('http.session')
+def _(env):
+    from django.test import Client
+    client = Client()
+    form = {'long': '37.6173', 'lat': '55.7558', 'time': '21:30:00', 'date': '2023-11-04'}
+    return lambda: client.post('/session/', form)
+
+@case('http.constellations')
+def _(env):
+    from django.test import Client
+    client = Client()
+    return lambda: client.get('/constellations/')
+
+@case('http.get_by_id')
+def _(env):
+    from django.test import Client
+    client = Client()
+    return lambda: client.get('/api/get_by_id/', {'constell_id': 60})
+
+@case('http.get_wiki_page')
+def _(env):
+    from django.test import Client
+    client = Client()
+    # the first call scrapes the stub and stores the page, the measured ones are served from the caches
+    client.get('/api/get_wiki_page/', {'constell_id': 60})
+    return lambda: client.get('/api/get_wiki_page/', {'constell_id': 60})
+
+def measure(func, seconds):
+    """
+    Call func repeatedly for about the given time, in batches of roughly a millisecond.
+
+    Returns:
+        dict: Operations per second and per-call latencies in microseconds.
+    """
+    start = time.perf_counter()
+    func()
+    once = max(time.perf_counter() - start, 1e-7)
+    batch = max(1, int(0.001 / once))
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(samples) < 5:
+        start = time.perf_counter()
+        for _ in range(batch):
+            func()
+        samples.append((time.perf_counter() - start) / batch)
+    samples.sort()
+    return {
+        'iterations': len(samples) * batch,
+        'ops_per_sec': round(1 / statistics.fmean(samples), 1),
+        'mean_us': round(statistics.fmean(samples) * 1e6, 3),
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 3),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6, 3),
+    }
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+
+def run(names, seconds):
+    results = {}
+    with standins() as env:
+        for name in names:
+            results[name] = measure(CASES[name](env), seconds)
+            print(f"{name:<36}{results[name]['p50_us']:>14.1f} us{results[name]['ops_per_sec']:>14.1f} ops/s", file=sys.stderr)
+    return {'meta': metadata(), 'results': results}
+
+def compare(before, after, threshold):
+    """
+    Print the change of the median latency of every benchmark.
+
+    Returns:
+        list: Names of the benchmarks that got slower than threshold percent.
+    """
+    regressions = []
+    print(f"{'benchmark':<36}{'before us':>12}{'after us':>12}{'change':>10}")
+    for name in sorted(set(before['results']) | set(after['results'])):
+        old, new = before['results'].get(name), after['results'].get(name)
+        if old is None or new is None:
+            print(f"{name:<36}{'-' if old is None else old['p50_us']:>12}{'-' if new is None else new['p50_us']:>12}")
+            continue
+        change = (new['p50_us'] / old['p50_us'] - 1) * 100
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<36}{old['p50_us']:>12.1f}{new['p50_us']:>12.1f}{change:>+9.1f}%{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="Run the benchmarks.")
+    run_parser.add_argument('-k', '--filter', default='', help="Only run benchmarks whose name contains this.")
+    run_parser.add_argument('-t', '--seconds', type=float, default=0.5, help="Time spent on every benchmark.")
+    run_parser.add_argument('-o', '--output', help="Save the results as JSON.")
+    compare_parser = commands.add_parser('compare', help="Compare two saved results.")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--threshold', type=float, default=10, help="Allowed slowdown of the median, in percent.")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        names = [name for name in CASES if args.filter in name]
+        results = run(names, args.seconds)
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output)
+        else:
+            print(output)
+    else:
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        if compare(before, after, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,32 @@
 import math
 import datetime
-import httpx
-import redis
 import json
-from selectolax.parser import HTMLParser
+import numpy as np
 from mainApp.visibleConstell import VisibleConstell
-from decimal import Decimal, getcontext
-from pymongo import MongoClient
+from mainApp.engine import catalog_arrays, calculate_lst_many, equatorial_to_horizontal_many, rise_transit_set_many, visible_mask
+from decimal import Decimal
+from django.conf import settings
 from redis.exceptions import RedisError
+from mainApp import pools, sidereal
+from mainApp.cache import constell_cache
+from mainApp.catalog import Catalog, aget_catalog, get_catalog
+from mainApp.httpcache import constell_key, purge
+from mainApp.instrumentation import span, timed
+from mainApp.skyIndex import visible_candidates
+from mainApp.stars import get_star_index, star_columns, stars_conf
+from pymongo.errors import PyMongoError
+from mainApp.borders import mirror_image, resolve_images
+from mainApp.wiki import coalesce, current_revids, is_stale, load_wiki_entry, parse_wiki_page, refresh_in_background, save_wiki_page, touch_wiki_pages, wiki_conf
+
+RISE_SET_DEFAULTS = {
+    # decimal places the site is rounded to, every site of a cell shares one cached result
+    'SITE_DECIMALS': 1,
+    # seconds a result lives in Redis
+    'TTL': 24 * 3600,
+}
+
+def rise_set_conf():
+    return {**RISE_SET_DEFAULTS, **getattr(settings, 'RISE_SET', {})}
 
 def calculate_JD(time_n_date):
     """
@@ -17,85 +36,41 @@ def calculate_JD(time_n_date):
         time_n_date (dict): A dictionary containing the year, month, day, hour, minute, and second.
 
     Returns:
-        Decimal: The calculated Julian Date (JD).
+        float: The calculated Julian Date (JD).
     """
-    getcontext().prec=10
-    year =   int(time_n_date['year'])
-    month =  int(time_n_date['month'])
-    day =    int(time_n_date['day'])
-    hour =   int(time_n_date['hour'])
-    minute = int(time_n_date['minute'])
-    second = int(time_n_date['second'])
-
-    return Decimal(str(367 * year - 7 * (year + (month + 9)\
-                                        // 12) // 4 + 275 * month\
-                                              // 9 + day + 1721013.5 + \
-                                                (hour + minute / 60 + second / 3600) / 24))
+    return sidereal.julian_date(int(time_n_date['year']),
+                                int(time_n_date['month']),
+                                int(time_n_date['day']),
+                                int(time_n_date['hour']),
+                                int(time_n_date['minute']),
+                                int(time_n_date['second']))
 
+@timed('compute.gmst')
 def calculate_GMST_alt(time, date):
-    getcontext().prec=10
-    time_l = time.split(":")
-    date_l = date.split("-")
-    time_n_date = {
-        'year':     date_l[0],
-        'month':    date_l[1],
-        'day':      date_l[2],
-
-        'hour':     time_l[0],
-        'minute':   time_l[1],
-        'second':   time_l[2],
-    }
-
-    JD = calculate_JD(time_n_date)
-
-
-    midnight = Decimal((math.floor(JD) + Decimal((0.5))))
-    days_since_midnight = Decimal((JD - midnight))
-    hours_since_midnight = Decimal((days_since_midnight * Decimal((24 ))))
-    days_since_epoch = Decimal((JD - Decimal((2451545.0))))
-    centuries_since_epoch = Decimal((days_since_epoch / Decimal((36525))))
-    whole_days_since_epoch = Decimal((midnight - Decimal((2451545.0))))
-
-
-
-    GMST = Decimal(str(6.697374558)) \
-    + Decimal(str(0.06570982441908)) * whole_days_since_epoch \
-    + Decimal(str(1.00273790935)) * hours_since_midnight \
-    + Decimal(str(0.000026)) * centuries_since_epoch**Decimal(str(2))
-
-
-    GMST_hours = math.trunc(GMST) % 24 
-    GMST_minutes =  round((GMST - math.trunc(GMST)) * 60 , 2 )
-    GMST_seconds =  math.trunc(round((GMST_minutes - math.trunc(GMST_minutes)) , 2)*60)
-    GMST_minutes = math.floor(GMST_minutes)
-
-    GMST = GMST_hours + GMST_minutes/Decimal(60) + GMST_seconds/Decimal(3600)
+    """
+    Calculate the Greenwich Mean Sidereal Time (GMST) from the UT date and time.
 
-    #print(f'GMST is : {GMST_hours}:{GMST_minutes}:{GMST_seconds}\n')
+    Args:
+        time (str): UT time in 'HH:MM:SS' format.
+        date (str): UT date in 'YYYY-MM-DD' format.
 
-    return GMST
+    Returns:
+        float: GMST in hours, within 0-24.
+    """
+    return sidereal.gmst(date, time)
 
 def calculate_lst(gmst, long):
     """
     Calculate the Local Sidereal Time (LST) based on the Greenwich Mean Sidereal Time (GMST) and longitude.
 
     Args:
-        gmst (Decimal): The Greenwich Mean Sidereal Time.
+        gmst (float): The Greenwich Mean Sidereal Time.
         long (Decimal): The longitude of the location.
 
     Returns:
-        Decimal: The Local Sidereal Time (LST) in hours.
+        float: The Local Sidereal Time (LST) in hours.
     """
-    # Convert longitude to hours
-    long_hours = long / Decimal(15)
-
-    # Calculate LST
-    lst = gmst + long_hours
-
-    # Make sure LST is in the range 0-24
-    lst = lst % Decimal(str(24))
-
-    return lst
+    return sidereal.lst(float(gmst), float(long))
 
 def equatorial_to_horizontal(ra, dec, lat, lst): 
     """
@@ -132,30 +107,23 @@ def equatorial_to_horizontal(ra, dec, lat, lst):
 
 def connect_to_db():
     """
-    Connect to the database and retrieve the collection of constellations.
+    Retrieve the collection of constellations using the process-wide MongoDB connection pool.
 
     Returns:
         pymongo.collection.Collection: The collection of constellations from the database.
     """
-    client = MongoClient('mongodb://localhost:27017')
-    db = client['stargazeNow']
-    return db['constellations']
+    return pools.get_mongo_collection('constellations')
 
 def connect_to_redis():
     """
-    Connects to a Redis server running on localhost at port 6379.
+    Get a Redis client from the process-wide connection pool (see settings.REDIS).
 
     Returns:
-        Redis: A Redis client object for interacting with the Redis server.
+        Redis: A Redis client object for interacting with the Redis server, or None if Redis is down.
     """
-    try:
-        r = redis.Redis(host="localhost", port=6379, decode_responses=True)
-        r.ping()
-    except redis.ConnectionError:
-        r = None
-        print("Unable to reach Redis, working with MongoDB exclusively.")
-    return r
+    return pools.get_redis()
 
+@timed('compute.visibility')
 def are_visible_many(lat, lst, constells):
     """
     Check which constellations are visible at a specific location and time.
@@ -163,20 +131,28 @@ def are_visible_many(lat, lst, constells):
     Args:
         lat (Decimal): The latitude of the location.
         lst (Decimal): The Local Sidereal Time (LST) at the location.
-        constells (list): List of constellations to check for visibility.
+        constells (Catalog | list): Catalog or list of constellations to check for visibility.
 
     Returns:
         list: A list of visible constellations with their horizontal coordinates.
     """
-    visible = []
-    for elem in constells:
-        ra = Decimal(elem['ra'])
-        dec = Decimal(elem['dec'])
-        az, alt = equatorial_to_horizontal(ra, dec, lat, lst)
-        if az > 0 and alt > 0:
-            new_visible_constell = VisibleConstell(elem, round(az, 3), round(alt, 3))
-            visible.append(new_visible_constell)
-    return visible
+    lat, lst = float(lat), float(lst)
+    indices = None
+    if isinstance(constells, Catalog):
+        ra, dec = constells.ra, constells.dec
+        # with a sky index only the constellations that may be above the horizon are computed
+        indices = visible_candidates(constells, lat, lst)
+        if indices is not None:
+            ra, dec = ra[indices], dec[indices]
+    else:
+        ra, dec = catalog_arrays(constells)
+    az, alt = equatorial_to_horizontal_many(ra, dec, lat, lst)
+    mask = visible_mask(az, alt)
+    hits = np.flatnonzero(mask) if indices is None else indices[mask]
+    # plain Python values in one go, indexing numpy arrays element by element is far slower
+    records = constells.records if isinstance(constells, Catalog) else constells
+    az, alt = np.round(az[mask], 3).tolist(), np.round(alt[mask], 3).tolist()
+    return [VisibleConstell(records[i], az_i, alt_i) for i, az_i, alt_i in zip(hits.tolist(), az, alt)]
 
 def get_utc_time(long, time):
     """
@@ -207,17 +183,55 @@ def fix_long_lat(long, lat):
         tuple (Decimal, Decimal): A tuple containing the fixed longitude and latitude values.
 
     Examples:
-        >>> long = 147.3058, lat = 60.95
+        >>> long = 147.3058, lat = 60
         <<< fix_long_lat(long, lat):
-        60.950000, 147.305800
+        147.305800, 60.000000
+    """
+    return fix_coordinate(long), fix_coordinate(lat)
+
+def fix_coordinate(value):
+    # pad the fractional part to 6 digits, values without one get it added
+    whole, _, dec = str(value).partition('.')
+    return Decimal(f"{whole}.{dec.ljust(6, '0')}")
+
+def get_observation(long, lat, time, date):
+    """
+    Normalize the observation parameters of a session.
+
+    Args:
+        long (str): The longitude of the location.
+        lat (str): The latitude of the location.
+        time (str): The local time at the location.
+        date (str): The date of the observation.
+
+    Returns:
+        dict: Observational information, as shown on the session page.
+    """
+    long, lat = fix_long_lat(long, lat)
+    return {
+        'Longtitude': long, 
+        'Latitude': lat, 
+        'Local_Time': time, 
+        'UTC_Time': get_utc_time(long, time), 
+        'Date': date
+    }
+
+def get_visible_at(long, lat, utc_time, date):
+    """
+    Get visible constellations at a location and UTC time.
+
+    Args:
+        long (Decimal): The longitude of the location.
+        lat (Decimal): The latitude of the location.
+        utc_time (str): UTC time in 'HH:MM:SS' format.
+        date (str): UTC date in 'YYYY-MM-DD' format.
+
+    Returns:
+        list: A list of visible constellations with their horizontal coordinates.
     """
-    whole, dec = long.split('.')
-    dec = dec.ljust(6,'0')
-    long = Decimal(f"{whole}.{dec}")
-    whole, dec = lat.split('.')
-    dec = dec.ljust(6,'0')
-    lat = Decimal(f"{whole}.{dec}")
-    return long, lat
+    gmst = calculate_GMST_alt(utc_time, date)
+    lst = calculate_lst(gmst, long)
+    return are_visible_many(lat, lst, get_catalog())
 
 def get_visible_constells(long, lat, time, date):
     """
@@ -232,24 +246,208 @@ def get_visible_constells(long, lat, time, date):
     Returns:
         tuple: Tuple containing list with visible constellations and a dictionary with observational information.
     """
-    getcontext().prec=10
-    long, lat = fix_long_lat(long, lat)
+    observ_info = get_observation(long, lat, time, date)
+    visible = get_visible_at(observ_info['Longtitude'], observ_info['Latitude'], observ_info['UTC_Time'], date)
+    return visible, observ_info
 
-    utc_time = get_utc_time(long, time)
-    gmst = calculate_GMST_alt(utc_time, date)
-    lst = calculate_lst(gmst, long)
-    constells = get_constells()
-    visible = are_visible_many(lat, lst, constells)
+def session_cell(observ_info, site_decimals, time_bucket):
+    """
+    Snap an observation to its cell: the site rounded to site_decimals places and the UTC time floored
+    to time_bucket seconds. Every observation of a cell is answered with the visibility of the cell.
 
-    observ_info = {
-        'Longtitude': long, 
-        'Latitude': lat, 
-        'Local_Time': time, 
-        'UTC_Time': utc_time, 
-        'Date': date
+    Args:
+        observ_info (dict): The result of get_observation.
+        site_decimals (int): Decimal places of longtitude and latitude.
+        time_bucket (int): Seconds of UTC time.
+
+    Returns:
+        tuple: (long, lat, utc_time, date) of the cell.
+    """
+    hours, minutes, seconds = (int(part) for part in observ_info['UTC_Time'].split(':'))
+    bucket = (hours * 3600 + minutes * 60 + seconds) // time_bucket * time_bucket
+    return (round(observ_info['Longtitude'], site_decimals),
+            round(observ_info['Latitude'], site_decimals),
+            f'{bucket // 3600:02}:{bucket % 3600 // 60:02}:{bucket % 60:02}',
+            observ_info['Date'])
+
+def get_visible_stars(long, lat, time, date, min_alt=0.0, max_mag=None, limit=None):
+    """
+    Get the objects of the star catalog above the horizon at a specific location and time.
+
+    Args:
+        long (str): The longitude of the location.
+        lat (str): The latitude of the location.
+        time (str): The local time at the location.
+        date (str): The date of the observation.
+        min_alt (float): Minimum altitude in degrees.
+        max_mag (float): Only objects at least this bright, None for all.
+        limit (int): Most objects to return, settings.STARS['MAX_RESULTS'] by default.
+
+    Returns:
+        tuple: Columnar dictionary {'count', 'star_ids', 'names', 'mag', 'az', 'alt'} of the brightest
+        objects ('count' is the number of all matching ones) and a dictionary with observational information.
+    """
+    observ_info = get_observation(long, lat, time, date)
+    lst = calculate_lst(calculate_GMST_alt(observ_info['UTC_Time'], date), observ_info['Longtitude'])
+    index = get_star_index()
+    indices, az, alt = index.above_horizon(float(observ_info['Latitude']), lst, min_alt, max_mag)
+    columns, order = star_columns(index, indices, limit or stars_conf()['MAX_RESULTS'])
+    columns.update({
+        'az': np.round(az[order], 3).tolist(),
+        'alt': np.round(alt[order], 3).tolist(),
+    })
+    return {'count': len(indices), **columns}, observ_info
+
+def get_stars_in_field(ra, dec, radius, max_mag=None, limit=None):
+    """
+    Get the objects of the star catalog within a field of view.
+
+    Args:
+        ra (float): Right ascension of the center in hours.
+        dec (float): Declination of the center in degrees.
+        radius (float): Radius of the field in degrees.
+        max_mag (float): Only objects at least this bright, None for all.
+        limit (int): Most objects to return, settings.STARS['MAX_RESULTS'] by default.
+
+    Returns:
+        dict: Columnar {'count', 'star_ids', 'names', 'mag', 'ra', 'dec', 'separation'} of the brightest objects.
+    """
+    index = get_star_index()
+    indices, separation = index.cone(ra, dec, radius, max_mag)
+    columns, order = star_columns(index, indices, limit or stars_conf()['MAX_RESULTS'])
+    chosen = indices[order]
+    columns.update({
+        'ra': index.ra[chosen].tolist(),
+        'dec': index.dec[chosen].tolist(),
+        'separation': np.round(separation[order], 4).tolist(),
+    })
+    return {'count': len(indices), **columns}
+
+def get_visible_grid(sites, timestamps):
+    """
+    Get visibility of every constellation for a grid of observation sites and UTC timestamps.
+
+    Args:
+        sites (list): List of (longtitude, latitude) pairs in degrees.
+        timestamps (list): List of datetime.datetime objects in UTC.
+
+    Returns:
+        dict: Catalog axis and tensors of shape (len(sites), len(timestamps), len(constells)):
+            - 'constells' (tuple): The constellations along the last axis.
+            - 'visible' (numpy.ndarray): Boolean visibility mask.
+            - 'az' (numpy.ndarray): Azimuths in degrees.
+            - 'alt' (numpy.ndarray): Altitudes in degrees.
+    """
+    catalog = get_catalog()
+    constells, ra, dec = catalog.records, catalog.ra, catalog.dec
+
+    # GMST depends on the moment only, so it is computed once per distinct timestamp
+    gmst_by_time = {}
+    keys = [tuple(moment.strftime('%Y-%m-%d %H:%M:%S').split(' ')) for moment in timestamps]
+    for date, time in keys:
+        if (date, time) not in gmst_by_time:
+            gmst_by_time[(date, time)] = calculate_GMST_alt(time, date)
+    gmst = np.array([gmst_by_time[key] for key in keys], dtype=np.float64)
+
+    sites = np.asarray(sites, dtype=np.float64).reshape(-1, 2)
+    long, lat = sites[:, 0], sites[:, 1]
+    # sites x times
+    lst = calculate_lst_many(gmst[np.newaxis, :], long[:, np.newaxis])
+    # sites x times x constellations
+    az, alt = equatorial_to_horizontal_many(ra, dec, lat[:, np.newaxis, np.newaxis], lst[:, :, np.newaxis])
+
+    return {
+        'constells': constells,
+        'visible': visible_mask(az, alt),
+        'az': az,
+        'alt': alt,
     }
-    return visible, observ_info
 
+def calculate_rise_set(catalog, long, lat, date):
+    """
+    Calculate rise, transit and set times and the maximum altitude of every constellation for a night.
+
+    The night is the 24 hours from local noon of the date, local time being UTC shifted by whole
+    hours of longitude as in get_utc_time. Each constellation gets its first transit in that window,
+    with the rising before and the setting after it.
+
+    Args:
+        catalog (Catalog): The constellations.
+        long (float): The longitude of the location in degrees.
+        lat (float): The latitude of the location in degrees.
+        date (datetime.date): The local date the night starts on.
+
+    Returns:
+        dict: JSON-serializable result with the site, the UTC window and a list of constellations with
+        'rise', 'transit' and 'set' as UTC ISO 8601 strings ('rise' and 'set' are None for constellations
+        that are always up or never rise) and 'max_alt' in degrees.
+    """
+    offset = int(long / 15)
+    start = datetime.datetime.combine(date, datetime.time(12)) - datetime.timedelta(hours=offset)
+    lst0 = sidereal.lst(sidereal.gmst_at(start), long)
+    start64 = np.datetime64(start, 's')
+
+    def moments(hours):
+        seconds = np.round(np.nan_to_num(hours) * 3600).astype(np.int64)
+        return np.datetime_as_string(start64 + seconds.astype('timedelta64[s]'), unit='s')
+
+    with span('compute.rise_set'):
+        events = rise_transit_set_many(catalog.ra, catalog.dec, lat, lst0, sidereal.SIDEREAL_RATE)
+        transit = moments(events['transit'])
+        rise = moments(events['transit'] - events['half_arc'])
+        setting = moments(events['transit'] + events['half_arc'])
+        crosses = np.isfinite(events['half_arc']).tolist()
+        max_alt = np.round(events['max_alt'], 3).tolist()
+        circumpolar = events['circumpolar'].tolist()
+        never_rises = events['never_rises'].tolist()
+
+    constells = []
+    for i, elem in enumerate(catalog.records):
+        constells.append({
+            'constell_id': elem['constell_id'],
+            'name': elem['name'],
+            'rise': f'{rise[i]}Z' if crosses[i] else None,
+            'transit': f'{transit[i]}Z',
+            'set': f'{setting[i]}Z' if crosses[i] else None,
+            'max_alt': max_alt[i],
+            'circumpolar': circumpolar[i],
+            'never_rises': never_rises[i],
+        })
+    return {
+        'site': {'long': long, 'lat': lat},
+        'date': date.isoformat(),
+        'utc_offset': offset,
+        'window': {'start': f'{start.isoformat()}Z', 'end': f'{(start + datetime.timedelta(days=1)).isoformat()}Z'},
+        'constells': constells,
+    }
+
+def get_rise_set(long, lat, date):
+    """
+    Get rise, transit and set times of every constellation, cached in Redis per rounded site and date.
+
+    The site is rounded to settings.RISE_SET['SITE_DECIMALS'] decimal places before computing, so the
+    cached result is exact for every request of the cell.
+
+    Args:
+        long (float): The longitude of the location in degrees.
+        lat (float): The latitude of the location in degrees.
+        date (datetime.date): The local date the night starts on.
+
+    Returns:
+        dict: Same as calculate_rise_set.
+    """
+    conf = rise_set_conf()
+    long, lat = round(float(long), conf['SITE_DECIMALS']), round(float(lat), conf['SITE_DECIMALS'])
+    catalog = get_catalog()
+    key = f'riseset:{catalog.version}:{long}:{lat}:{date.isoformat()}'
+    cached = retreive_from_redis(key, conf['TTL'])
+    if cached is not None:
+        return json.loads(cached)
+    result = calculate_rise_set(catalog, long, lat, date)
+    cache_in_redis(key, json.dumps(result), conf['TTL'])
+    return result
+
+@timed('db.constell_by_id')
 def get_constell_by_id_db(constell_id):
     constell = connect_to_db().find_one({'constell_id': constell_id})
     if constell is not None:
@@ -258,7 +456,36 @@ def get_constell_by_id_db(constell_id):
 
 def get_constell_by_id(constell_id):
     """
-    Retrieves constellation object from DB or Redis.
+    Retrieves constellation object from the in-process catalog.
+
+    Ids unknown to the catalog (e.g. added before the next version check) are looked up in Redis and DB.
+
+    Args:
+        constell_id (float): The float id of constell_id field of an object from DB.
+
+    Returns:
+        (dict): The constell object in dictionary form with _id as a string, to be treated as read-only.
+    """
+    constell = get_catalog().get(constell_id)
+    if constell is None:
+        constell = load_constell_by_id(constell_id)
+    return constell
+
+async def aget_constell_by_id(constell_id):
+    """
+    Async counterpart of get_constell_by_id, falling back to AsyncMongoClient for ids unknown to the catalog.
+    """
+    constell = (await aget_catalog()).get(constell_id)
+    if constell is None:
+        with span('db.constell_by_id'):
+            constell = await pools.get_async_mongo_collection('constellations').find_one({'constell_id': constell_id})
+        if constell is not None:
+            constell["_id"] = str(constell.get("_id"))
+    return constell
+
+def load_constell_by_id(constell_id):
+    """
+    Retrieves constellation object from Redis or DB.
 
     Args:
         constell_id (float): The float id of constell_id field of an object from DB.
@@ -266,63 +493,146 @@ def get_constell_by_id(constell_id):
     Returns:
         (dict): The constell object in dictionary form with _id as a string.
     """
-    # Connect to Redis
-    redis_coll = connect_to_redis()
-    if redis_coll is None:
-        return get_constell_by_id_db(constell_id)
-    #Check if key-value pair exists in Redis
-    constell = redis_coll.zrangebyscore("constellations", constell_id, constell_id)
-    if len(constell) > 0:
-        # If pair exist, reset it expiration time and return cached object
-        constell = json.loads(constell[0])
-    else:
-        # If pair does not exist, try to retrieve it from DB
+    constell = constell_cache.get(constell_id)
+    if constell is None:
         constell = get_constell_by_id_db(constell_id)
-        # And place it in Redis' collection
-        redis_coll.zadd("constellations", {json.dumps(constell): constell_id})
-    redis_coll.expire("constellations", 20)
+        if constell is not None:
+            constell_cache.set(constell)
+    return constell
+
+def project(constell, fields):
+    """
+    Keep only the given fields of a constell object, all of them if fields is empty.
+
+    Returns:
+        (dict): A new dict, or the object itself when every field is kept.
+    """
+    if not fields:
+        return constell
+    return {name: constell[name] for name in fields if name in constell}
+
+def _resolved_by_ids(found, constell_ids, fields, missing, error):
+    # request order, duplicates included, and why every unresolved id is missing
+    errors = {constell_id: error for constell_id in missing if constell_id not in found}
+    return [project(found[constell_id], fields) if constell_id in found else None for constell_id in constell_ids], errors
+
+def get_constells_by_ids(constell_ids, fields=None):
+    """
+    Retrieves many constellation objects at once.
+
+    Ids are looked up in the in-process catalog first, the remaining ones in Redis with one MGET, and those
+    still missing in DB with one $in query, whose results are cached.
+
+    Args:
+        constell_ids (list): Integer constell_ids, in the order of the results. Duplicates are resolved once.
+        fields (list): Fields to return of every object, all of them by default.
+
+    Returns:
+        tuple (list, dict): The objects in request order, None for the unresolved ids, and an error message
+            by unresolved id ('not found', or 'database unavailable' if DB couldn't be queried).
+    """
+    catalog = get_catalog()
+    found = {}
+    missing = []
+    for constell_id in dict.fromkeys(constell_ids):
+        constell = catalog.get(constell_id)
+        if constell is None:
+            missing.append(constell_id)
+        else:
+            found[constell_id] = constell
+    if not missing:
+        return _resolved_by_ids(found, constell_ids, fields, missing, None)
+
+    found.update(constell_cache.get_many(missing))
+    missing = [constell_id for constell_id in missing if constell_id not in found]
+    if not missing:
+        return _resolved_by_ids(found, constell_ids, fields, missing, None)
+    try:
+        with span('db.constells_by_ids'):
+            constell_db_list = list(connect_to_db().find({'constell_id': {'$in': missing}}))
+    except PyMongoError as exc:
+        print(f"Unable to read constellations {missing} from MongoDB: {exc!r}")
+        return _resolved_by_ids(found, constell_ids, fields, missing, 'database unavailable')
+    for elem in constell_db_list:
+        elem["_id"] = str(elem["_id"])
+        found[elem['constell_id']] = elem
+    constell_cache.set_many(constell_db_list)
+    return _resolved_by_ids(found, constell_ids, fields, missing, 'not found')
+
+async def aget_constells_by_ids(constell_ids, fields=None):
+    """
+    Async counterpart of get_constells_by_ids, reading the ids unknown to the catalog with one $in query
+    of AsyncMongoClient.
+    """
+    catalog = await aget_catalog()
+    found = {}
+    missing = []
+    for constell_id in dict.fromkeys(constell_ids):
+        constell = catalog.get(constell_id)
+        if constell is None:
+            missing.append(constell_id)
+        else:
+            found[constell_id] = constell
+    if not missing:
+        return _resolved_by_ids(found, constell_ids, fields, missing, None)
+    try:
+        with span('db.constells_by_ids'):
+            cursor = pools.get_async_mongo_collection('constellations').find({'constell_id': {'$in': missing}})
+            constell_db_list = await cursor.to_list()
+    except PyMongoError as exc:
+        print(f"Unable to read constellations {missing} from MongoDB: {exc!r}")
+        return _resolved_by_ids(found, constell_ids, fields, missing, 'database unavailable')
+    for elem in constell_db_list:
+        elem["_id"] = str(elem["_id"])
+        found[elem['constell_id']] = elem
+    return _resolved_by_ids(found, constell_ids, fields, missing, 'not found')
+
+def refresh_constell(constell_id):
+    """
+    Re-reads a single constellation from DB and replaces its cache entry, leaving the other entries alone.
+
+    Args:
+        constell_id (float): The float id of constell_id field of an object from DB.
+
+    Returns:
+        (dict): The fresh constell object, or None if it's not in DB anymore.
+    """
+    constell = get_constell_by_id_db(constell_id)
+    if constell is None:
+        constell_cache.invalidate([constell_id])
+    else:
+        constell_cache.set(constell)
+    purge([constell_key(constell_id)])
     return constell
-        
 
 def get_constells():
     """
-    Retrieves a list of constellations from the database after connecting to Redis.
+    Retrieves a list of constellations from the in-process catalog.
 
     Returns:
-        list: A list of dictionaries representing constellations with modified keys.
+        list: A list of dictionaries representing constellations sorted by constell_id, to be treated as read-only.
     """
-    # Connect to Redis
-    redis_coll = connect_to_redis()
-    scores = []
-    cached_values = []
-    redis_cached = None
-    if redis_coll is not None:
-        redis_cached = redis_coll.zrange("constellations",0, -1, withscores=True )
-        if  redis_cached:
-            cached_values, scores = map(list, zip(*redis_cached))
-            cached_values = [json.loads(value) for value in cached_values]
-            redis_coll.expire("constellations", 20)
+    return list(get_catalog().records)
 
-    # retrieve all non-cached constells
-    constell_db_list = list(connect_to_db().find({'constell_id': {'$nin': scores}}))
+def load_constells():
+    """
+    Retrieves a list of constellations from Redis, reading only the non-cached ones from DB.
+
+    Returns:
+        list: A list of dictionaries representing constellations sorted by constell_id, with _id as a string.
+    """
+    cached = constell_cache.get_many(constell_cache.known_ids())
 
-    if constell_db_list:
+    # retrieve all non-cached constells
+    with span('db.constells'):
+        constell_db_list = list(connect_to_db().find({'constell_id': {'$nin': list(cached)}}))
     # convert ObjectId to str and cache all uncached elements
-        to_cache = {}
-        for elem in constell_db_list:
-            elem["_id"] = str(elem["_id"])
-            to_cache[json.dumps(elem)] = elem["constell_id"]
-        
-        if redis_coll is not None:
-            redis_coll.zadd("constellations", to_cache)
-
-    sorted_list = constell_db_list + cached_values
-
-    # we'll sort only if there were cached constellations
-    if  redis_cached:
-        sorted_list = sorted(sorted_list, key=lambda elem: elem["constell_id"])
-    return sorted_list
-    
+    for elem in constell_db_list:
+        elem["_id"] = str(elem["_id"])
+    constell_cache.set_many(constell_db_list)
+
+    return sorted(constell_db_list + list(cached.values()), key=lambda elem: elem["constell_id"])
+
 def get_time_date():
     """
     Get the current date and time.
@@ -333,6 +643,22 @@ def get_time_date():
     d,t = d_t.split(' ')
     return d,t
 
+@timed('http.wiki_page')
+def get_wiki_parse(page_url):
+    """
+    Retrieves a page from the MediaWiki parse API.
+
+    Args:
+        page_url (str): The parse API url of the page, see wiki.wiki_api_url.
+
+    Returns:
+        dict: The 'parse' object of the response, with the html under ['text']['*'] and the 'revid'.
+    """
+    # httpx is only needed by the scraper, it's imported on first use to keep worker boot fast
+    import httpx
+    response = httpx.get(page_url)
+    return response.json()['parse']
+
 def get_html_wiki_page(page_title):
     """
     Retrieves html content of a Wikipedia page.
@@ -348,18 +674,16 @@ def get_html_wiki_page(page_title):
         <<< get_wikipedia_page(page_title):
         '<div class="mw-parser-output">\n<p>Orion is a prominent constellation located on the celestial equator and visible throughout the world.</p>\n<p>...</p>\n</div>'
     """
-    # Make the GET request to the MediaWiki API
-    response = httpx.get(page_title)
-    # Parse the JSON response
-    data = response.json()
-    return data['parse']['text']['*']
+    return get_wiki_parse(page_title)['text']['*']
 
-def retreive_from_redis(key):
+@timed('cache.get')
+def retreive_from_redis(key, ttl=20):
     """
-    Retrieves a value from Redis associated with the specified key and sets a 20-second expiration if the value exists.
+    Retrieves a value from Redis associated with the specified key and resets its expiration if the value exists.
 
     Args:
         key (str): The key used to retrieve the value from Redis.
+        ttl (int): The new expiration in seconds.
 
     Returns:
         str: The value associated with the key in Redis, or None if the key does not exist.
@@ -367,30 +691,41 @@ def retreive_from_redis(key):
     value = None
     redis_coll = connect_to_redis()
     if redis_coll is not None:
-        value = redis_coll.get(key)
-        if value is not None:
-            redis_coll.expire(key, 20)
+        try:
+            value = redis_coll.get(key)
+            if value is not None:
+                redis_coll.expire(key, ttl)
+        except RedisError:
+            pools.mark_redis_down()
     return value
 
-def cache_in_redis(key, value):
+@timed('cache.set')
+def cache_in_redis(key, value, ttl=20):
     """
-    Caches a value in Redis with the specified key for a duration of 20 seconds.
+    Caches a value in Redis with the specified key for a duration of ttl seconds.
 
     Args:
         key (str): The key under which the value will be cached in Redis.
         value (str): The value to be cached in Redis.
+        ttl (int): The expiration in seconds.
 
     Returns:
         None
     """
     redis_coll = connect_to_redis()
     if redis_coll is not None:
-        redis_coll.psetex(key, 20000, value)
+        try:
+            redis_coll.psetex(key, ttl * 1000, value)
+        except RedisError:
+            pools.mark_redis_down()
 
 def get_wiki_cached(page_url, suffix):
     """
-    Retrieves a cached JSON object associated with the suffix from Redis. If not cached, scrapes the specified Wikipedia page,
-    caches the scraped data in Redis, and returns the scraped data.
+    Retrieves scraped data of a Wikipedia page from Redis, then from MongoDB, and scrapes the page only
+    if it was never stored.
+
+    A page stored longer than settings.WIKI['STALE_AFTER'] ago is still returned at once, while a single
+    background refresh rescrapes it if its revision changed. Concurrent misses of the same page share one scrape.
 
     Args:
         page_url (str): The URL of the Wikipedia page to scrape.
@@ -399,14 +734,57 @@ def get_wiki_cached(page_url, suffix):
     Returns:
         dict: A JSON object representing the scraped data from the Wikipedia page.
     """
-    cached = retreive_from_redis(suffix)
+    ttl = wiki_conf()['L1_TTL']
+    cached = retreive_from_redis(suffix, ttl)
     if cached is not None:
         return json.loads(cached)
-    
+
+    stored = load_wiki_entry(suffix)
+    if stored is not None:
+        if is_stale(stored):
+            refresh_in_background(suffix, lambda: refresh_wiki_page(page_url, suffix, stored))
+        cache_in_redis(suffix, json.dumps(stored['data']), ttl)
+        return stored['data']
+
+    return coalesce(suffix, lambda: scrape_and_store(page_url, suffix))
+
+def refresh_wiki_page(page_url, suffix, stored):
+    """
+    Rescrapes a stored page, unless Wikipedia says it is still at the revision it was scraped at, in which
+    case it is only marked as fetched now.
+
+    Args:
+        page_url (str): The URL of the Wikipedia page to scrape.
+        suffix (str): The Wikipedia page title.
+        stored (dict): The stored entry, as returned by load_wiki_entry.
+
+    Returns:
+        dict: Same as scrape_wiki_page.
+    """
+    revid = stored['data'].get('revid')
+    # pages stored before revisions were recorded are always rescraped
+    if revid is not None and current_revids([suffix]).get(suffix) == revid:
+        try:
+            touch_wiki_pages([suffix])
+        except PyMongoError as exc:
+            print(f"Unable to touch {suffix} in MongoDB: {exc!r}")
+        return stored['data']
+    return scrape_and_store(page_url, suffix)
+
+def scrape_and_store(page_url, suffix):
+    """
+    Scrapes a Wikipedia page and stores the result in MongoDB and Redis.
+
+    Returns:
+        dict: Same as scrape_wiki_page.
+    """
     scraped = scrape_wiki_page(page_url)
-    cache_in_redis(suffix, json.dumps(scraped))
+    try:
+        save_wiki_page(suffix, scraped)
+    except PyMongoError as exc:
+        print(f"Unable to store {suffix} in MongoDB: {exc!r}")
+    cache_in_redis(suffix, json.dumps(scraped), wiki_conf()['L1_TTL'])
     return scraped
-        
 
 def scrape_wiki_page(page_url):
     """
@@ -421,6 +799,7 @@ def scrape_wiki_page(page_url):
             - 'symbolism' (str): The symbolism associated with the page.
             - 'neighbours' (str): The neighboring elements as an unordered list.
             - 'visibility' (str): The visibility of the page.
+            - 'revid' (int): The revision of the page that was scraped.
 
     Examples:
         >>> page_url = "https://en.wikipedia.org/wiki/Orion_(constellation)"
@@ -432,55 +811,13 @@ def scrape_wiki_page(page_url):
             'visibility': 'Orion is visible in both the northern and southern hemispheres.'
         }
     """
-    page = get_html_wiki_page(page_url)
-    # create as parsing tree
-    parsed = HTMLParser(page)
-    # retrieve short description from tree by searching a div with class="shortdescription
-    short_desc = parsed.css_first("div.shortdescription").text()
-
-    # a bit of madness here
-    # first, selecting th with class="infobox-label which contains Symbolism in it's text
-    # second, retrieve the td (table-data) using .matches[0].next - which gives next sibling to a tag
-    # third, get a text of td and get rid of any [2] wikipedia stuff
-    symbolism = parsed.select("th.infobox-label").text_contains("Symbolism").matches[0].next.text().split('[')[0].title()
-    
-    visibility = parsed.css_first("td.infobox-below").text()
-
-    cursor = parsed.css_first("table.infobox.plainlist").next.next.child
-    flavor_text =""
-    while cursor.next is not None:
-        if cursor.tag != "sup":
-            flavor_text = f"{flavor_text}{cursor.text()}"
-        cursor=cursor.next
-
-    # lets chop up our flavor text a lil bit
-    index_of_space = flavor_text.find(' ', 290, 320)
-    flavor_text = flavor_text[:index_of_space]
-
-    # get the start of a neighbours list
-    # near_const = parsed.select("th.infobox-label").text_contains("Bordering").matches[0].next.css("not(sup)>a")
-    near_const = parsed.select("th.infobox-label").text_contains("Bordering").matches[0].next
-
-    # this line may be way too resourse-expensive
-    near_const = [elem for elem in near_const.css("a[href]") if not elem.attributes["href"].startswith("#cite")]
-
-    neighbours = "<ul>"
-    for elem in near_const:
-        if elem.tag != "sup":
-            neighbours = f"{neighbours}<li>{elem.text()}</li>"
-
-    image = parsed.css_first(".infobox-image")
-    image = image.css_first("img").parent.attributes["href"]
-
-    img_response = httpx.get(f"https://en.wikipedia.org{image}")
-    parsed_img_response = HTMLParser(img_response.text)
-    parsed_img_response = parsed_img_response.css_first("div.fullImageLink").css_first("img").attributes["src"]
+    data = get_wiki_parse(page_url)
+    scraped = parse_wiki_page(data['text']['*'])
+    scraped['revid'] = data.get('revid')
 
-    return {
-        'shortdesc': short_desc,
-        'symbolism': symbolism,
-        'neighbours': neighbours,
-        'visibility': visibility,
-        'flavor_text' : flavor_text,
-        'border_img' : parsed_img_response,
-    }
+    # the border image is resolved with the imageinfo API and mirrored locally (see mainApp/borders.py),
+    # both are timed as http spans of their own
+    href = scraped.pop('border_img_page')
+    url = resolve_images([href])[href]
+    scraped['border_img'] = mirror_image(url) if url else None
+    return scraped
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class SkygazeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mainApp'
+
+    def ready(self):
+        # preload what the first requests of a worker would otherwise pay for, see mainApp/warmup.py
+        from mainApp.warmup import should_warm_up, warm_up
+        if should_warm_up():
+            warm_up()
@@ -0,0 +1,72 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, common, csrf, security
+
+# Django's middleware for the async views (settings.ASYNC_VIEWS). Under ASGI, Django 4.2 runs every
+# process_request, process_view and process_response of the stock middleware through sync_to_async, a
+# round trip to a worker thread each, about a dozen per request. Their hooks only set headers and lazy
+# attributes, so these subclasses run them on the event loop, and go to a thread only when a hook may
+# read or write the session store.
+
+class InlineMiddlewareMixin():
+    """
+    Runs process_request and process_response on the event loop.
+    """
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, 'process_request'):
+            response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, 'process_response'):
+            response = await self.aprocess_response(request, response)
+        return response
+
+    async def aprocess_response(self, request, response):
+        return self.process_response(request, response)
+
+class SecurityMiddleware(InlineMiddlewareMixin, security.SecurityMiddleware):
+    pass
+
+class SessionMiddleware(InlineMiddlewareMixin, sessions.SessionMiddleware):
+
+    async def aprocess_response(self, request, response):
+        session = request.session
+        if session.accessed or session.modified or settings.SESSION_SAVE_EVERY_REQUEST:
+            # saving or flushing the session is database I/O
+            return await sync_to_async(self.process_response, thread_sensitive=True)(request, response)
+        return self.process_response(request, response)
+
+class CommonMiddleware(InlineMiddlewareMixin, common.CommonMiddleware):
+    pass
+
+class CsrfViewMiddleware(InlineMiddlewareMixin, csrf.CsrfViewMiddleware):
+
+    def __init__(self, get_response):
+        if settings.CSRF_USE_SESSIONS:
+            raise ImproperlyConfigured("mainApp.asyncMiddleware.CsrfViewMiddleware keeps the CSRF secret in a cookie, "
+                                       "it can't be used with CSRF_USE_SESSIONS.")
+        super().__init__(get_response)
+
+    async def process_view(self, request, callback, callback_args, callback_kwargs):
+        # the handler runs the hooks that aren't coroutines in a thread
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+class AuthenticationMiddleware(InlineMiddlewareMixin, auth.AuthenticationMiddleware):
+    pass
+
+class MessageMiddleware(InlineMiddlewareMixin, messages.MessageMiddleware):
+
+    async def aprocess_response(self, request, response):
+        storage = getattr(request, '_messages', None)
+        if storage is not None and (storage.used or storage.added_new):
+            # the fallback storage keeps what doesn't fit in the cookie in the session
+            return await sync_to_async(self.process_response, thread_sensitive=True)(request, response)
+        return self.process_response(request, response)
+
+class XFrameOptionsMiddleware(InlineMiddlewareMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
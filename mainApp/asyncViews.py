@@ -0,0 +1,117 @@
+import datetime
+import math
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from mainApp.api import get_constells, aget_constell_by_id, aget_constells_by_ids
+from mainApp.cache import session_cache
+from mainApp.catalog import aget_catalog
+from mainApp.httpcache import cache_policy, content_version, remember_version, wiki_key
+from mainApp.tracking import ENCODERS, SkyTracker, track_events, tracking_conf
+from mainApp.responses import FastJsonResponse, compressed
+from mainApp.views import by_ids_data, by_ids_params, constell_validator, constells_by_ids_validator, page_time_date, page_validator, session_context, wiki_validator
+from mainApp.wiki import aget_wiki_cached, wiki_suffix
+
+# Async versions of the I/O-bound views in views.py, routed instead of them when settings.ASYNC_VIEWS is on.
+# Under an ASGI server (uvicorn) a single worker then keeps serving while wiki lookups wait on the network.
+# track has no sync version: without ASYNC_VIEWS views.track answers 501, a stream would hold a WSGI thread.
+
+@cache_policy('session', vary=('Cookie',))
+async def session(request):
+	"""
+	Async version of views.session.
+	"""
+	post = request.POST
+	# the catalog is refreshed off the event loop, the rest is in-memory computation
+	await aget_catalog()
+	args = (post['long'], post['lat'], post['time'], post['date'])
+	if session_cache.conf['ENABLED']:
+		# the response cache may talk to Redis, keep it off the event loop
+		context = await sync_to_async(session_context, thread_sensitive=False)(*args)
+	else:
+		context = session_context(*args)
+	return render(request, 'mainApp/session.html', context)
+
+@cache_policy('page', page_validator, weak=True, vary=('Cookie',))
+async def constells(request):
+	"""
+	Async version of views.constells.
+	"""
+	await aget_catalog()
+	constells = get_constells()
+	d,t = page_time_date()
+	return render(request, 'mainApp/constellations.html', {"constells": constells, "DATE":d, "TIME":t})
+
+@cache_policy('catalog', constell_validator)
+async def get_by_id(request):
+	"""
+	Async version of views.get_by_id.
+	"""
+	constell_id = request.GET.get('constell_id')
+	constell = await aget_constell_by_id(int(constell_id))
+	return JsonResponse(constell)
+
+@compressed
+@cache_policy('catalog', constells_by_ids_validator, weak=True, vary=('Accept-Encoding',))
+async def get_by_ids(request):
+	"""
+	Async version of views.get_by_ids.
+	"""
+	# require_GET only wraps async views from Django 5.0 on
+	if request.method != 'GET':
+		return HttpResponseNotAllowed(['GET'])
+	try:
+		ids, fields = by_ids_params(request.GET)
+	except ValueError as exc:
+		return FastJsonResponse({'error': str(exc)}, status=400)
+	return FastJsonResponse(by_ids_data(*await aget_constells_by_ids(ids, fields)))
+
+@cache_policy('wiki', wiki_validator)
+async def get_wiki_page(request):
+	"""
+	Async version of views.get_wiki_page, backed by redis.asyncio, AsyncMongoClient and httpx.AsyncClient.
+	"""
+	constell_id = request.GET.get('constell_id')
+	constell = await aget_constell_by_id(int(constell_id))
+	suffix = wiki_suffix(constell)
+	const_data = dict(await aget_wiki_cached(suffix))
+	remember_version(wiki_key(suffix), const_data.get('revid') or content_version(const_data))
+	const_data.update({"name": constell['name'], "wiki":constell['wiki']})
+	return JsonResponse(const_data)
+
+async def track(request):
+	"""
+	Stream az/alt of the visible constellations for a site as server-sent events or NDJSON.
+
+	Args:
+		request: http request with "long" and "lat", and optionally "interval" (seconds between frames),
+			"duration" (seconds) and "format" ("sse" or "ndjson") in GET-method dictionary.
+
+	Returns:
+		StreamingHttpResponse: A 'catalog' event with constellation ids and names, then a 'frame' event
+		with the time, LST and parallel constell_ids/az/alt lists of the visible ones every interval.
+	"""
+	conf = tracking_conf()
+	try:
+		long = float(request.GET['long'])
+		lat = float(request.GET['lat'])
+		interval = float(request.GET.get('interval', conf['INTERVAL']))
+		duration = float(request.GET.get('duration', conf['MAX_DURATION']))
+		encode, content_type = ENCODERS[request.GET.get('format', 'sse')]
+	except (ValueError, KeyError) as exc:
+		return JsonResponse({'error': f'Malformed request: {exc}'}, status=400)
+	# nan would get past the bounds below and stream without pauses
+	if not math.isfinite(interval) or not math.isfinite(duration):
+		return JsonResponse({'error': '"interval" and "duration" must be finite numbers.'}, status=400)
+	interval = max(interval, conf['MIN_INTERVAL'])
+	duration = min(duration, conf['MAX_DURATION'])
+	if not -180 <= long <= 180 or not -90 <= lat <= 90:
+		return JsonResponse({'error': 'Longtitude must be within [-180, 180] and latitude within [-90, 90].'}, status=400)
+
+	now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+	tracker = SkyTracker(await aget_catalog(), long, lat, now)
+	response = StreamingHttpResponse(track_events(tracker, interval, duration, encode), content_type=content_type)
+	response['Cache-Control'] = 'no-cache'
+	# keep reverse proxies from buffering the stream
+	response['X-Accel-Buffering'] = 'no'
+	return response
@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import quote, unquote
+from django.conf import settings
+from mainApp.instrumentation import timed
+
+# Border images of the constellations, mirrored from Wikimedia so browsers don't hotlink them. File pages
+# linked from the infoboxes are resolved to image urls in batches with the MediaWiki imageinfo API, and the
+# images are kept in a local content-addressed store: a file is named after the SHA-256 of its bytes, so it
+# never changes and is served with a year of max-age. The store is bounded by size and evicts the least
+# recently served images; a sidecar with the source url of every image stays behind, so an evicted image is
+# downloaded again on its next request.
+
+BORDERS_DEFAULTS = {
+    # None to keep hotlinking the resolved Wikimedia urls
+    'ROOT': None,
+    # prefix of the links to mirrored images, views.border_image serves them under /borders/
+    'URL': '/borders/',
+    # least recently served images are evicted above this size
+    'MAX_BYTES': 64 * 2**20,
+    # width of the thumbnails asked from the imageinfo API
+    'WIDTH': 512,
+    # titles per imageinfo request, the API's limit for anonymous clients
+    'BATCH_SIZE': 50,
+}
+
+IMAGE_EXTENSIONS = ('png', 'jpg', 'gif', 'svg', 'webp')
+NAME_RE = re.compile(rf'^[0-9a-f]{{64}}\.({"|".join(IMAGE_EXTENSIONS)})$')
+# an image's access time is refreshed at most this often, not on every request
+TOUCH_INTERVAL = 60
+
+def borders_conf():
+    return {**BORDERS_DEFAULTS, **getattr(settings, 'BORDERS', {})}
+
+def file_title(href):
+    """
+    Get the title of a file page from its link, e.g. '/wiki/File:Orion_IAU.svg' -> 'File:Orion_IAU.svg'.
+    """
+    return unquote(href.rsplit('/', 1)[-1]).replace('_', ' ')
+
+def imageinfo_url(titles):
+    """
+    Get the MediaWiki imageinfo API url resolving file pages to thumbnail urls.
+    """
+    from mainApp.wiki import wiki_conf
+    titles = quote('|'.join(titles), safe='')
+    return (f"{wiki_conf()['BASE_URL']}/w/api.php?action=query&prop=imageinfo&iiprop=url"
+            f"&iiurlwidth={borders_conf()['WIDTH']}&titles={titles}&format=json&formatversion=2")
+
+def parse_imageinfo(data):
+    """
+    Read the image urls from an imageinfo API response.
+
+    Returns:
+        dict: Image url by requested title, the thumbnail if there is one. Missing files are left out.
+    """
+    query = data.get('query', {})
+    # the API answers with normalized titles, map them back to the requested ones
+    requested = {elem['to']: elem['from'] for elem in query.get('normalized', [])}
+    urls = {}
+    for page in query.get('pages', []):
+        info = page.get('imageinfo')
+        if info:
+            urls[requested.get(page['title'], page['title'])] = info[0].get('thumburl') or info[0]['url']
+    return urls
+
+def _batches(hrefs):
+    titles = list(dict.fromkeys(file_title(href) for href in hrefs))
+    size = borders_conf()['BATCH_SIZE']
+    return [titles[start:start + size] for start in range(0, len(titles), size)]
+
+@timed('http.imageinfo')
+def resolve_images(hrefs):
+    """
+    Resolve file page links to image urls, with one API request per BATCH_SIZE files.
+
+    Returns:
+        dict: Image url by file page link, None for files the API doesn't know.
+    """
+    import httpx
+    urls = {}
+    for titles in _batches(hrefs):
+        response = httpx.get(imageinfo_url(titles), follow_redirects=True)
+        response.raise_for_status()
+        urls.update(parse_imageinfo(response.json()))
+    return {href: urls.get(file_title(href)) for href in hrefs}
+
+async def aresolve_images(client, hrefs, retries):
+    """
+    Async counterpart of resolve_images, with the retries of wiki._get.
+    """
+    from mainApp.wiki import _get
+    urls = {}
+    responses = await asyncio.gather(*(_get(client, imageinfo_url(titles), retries) for titles in _batches(hrefs)))
+    for response in responses:
+        urls.update(parse_imageinfo(response.json()))
+    return {href: urls.get(file_title(href)) for href in hrefs}
+
+def absolute_url(url):
+    # imageinfo urls are absolute, file page <img> sources are protocol-relative
+    return f'https:{url}' if url.startswith('//') else url
+
+class BorderStore():
+    """
+    Size-bounded, content-addressed directory of images.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # image name by source url, read from the sidecars
+        self._names = {}
+
+    def path(self, name):
+        return self.root / name
+
+    def _sidecar(self, name):
+        return self.root / f'{name.rpartition(".")[0]}.json'
+
+    def source(self, name):
+        """
+        The url an image was downloaded from, None if it was never stored.
+        """
+        try:
+            return json.loads(self._sidecar(name).read_text())['url']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _read_sidecars(self):
+        names = {}
+        if self.root.exists():
+            for path in self.root.glob('*.json'):
+                try:
+                    url = json.loads(path.read_text())['url']
+                except (OSError, ValueError, KeyError):
+                    continue
+                # the sidecar doesn't know the extension, the image next to it does
+                for image in self.root.glob(f'{path.stem}.*'):
+                    if NAME_RE.match(image.name):
+                        names[url] = image.name
+        return names
+
+    def lookup(self, url):
+        """
+        The name of the stored image downloaded from url, None if there is none (or it was evicted).
+        """
+        name = self._names.get(url)
+        if name is None:
+            # stored by another worker since, or never read
+            names = self._read_sidecars()
+            with self._lock:
+                self._names.update(names)
+            name = names.get(url)
+        if name is None or not self.path(name).exists():
+            return None
+        return name
+
+    def _write(self, path, data):
+        # readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def put(self, data, url, content_type=None):
+        """
+        Store an image, then evict the least recently used ones above MAX_BYTES.
+
+        Returns:
+            str: The name of the stored file.
+        """
+        extension = (mimetypes.guess_extension((content_type or '').split(';')[0]) or Path(url.split('?')[0]).suffix).lower()
+        if extension.lstrip('.') not in IMAGE_EXTENSIONS:
+            raise ValueError(f"{url} is not an image ({content_type})")
+        name = f"{hashlib.sha256(data).hexdigest()}{extension}"
+        self.root.mkdir(parents=True, exist_ok=True)
+        if not self.path(name).exists():
+            self._write(self.path(name), data)
+        if self.source(name) != url:
+            self._write(self._sidecar(name), json.dumps({'url': url}).encode())
+        with self._lock:
+            self._names[url] = name
+        self.evict(keep=name)
+        return name
+
+    def touch(self, name):
+        """
+        Mark an image as used, for the LRU order of evict().
+        """
+        path = self.path(name)
+        try:
+            if path.stat().st_mtime < time.time() - TOUCH_INTERVAL:
+                os.utime(path)
+        except OSError:
+            pass
+
+    def _images(self):
+        return [path for path in self.root.iterdir() if NAME_RE.match(path.name)] if self.root.exists() else []
+
+    def evict(self, keep=None):
+        """
+        Delete the least recently used images until the store fits in MAX_BYTES.
+
+        Returns:
+            int: Number of deleted images.
+        """
+        with self._lock:
+            images = []
+            for path in self._images():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                images.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in images)
+            deleted = 0
+            for _, size, path in sorted(images):
+                if total <= self.max_bytes:
+                    break
+                if path.name == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                total -= size
+                deleted += 1
+            return deleted
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    Get the store at settings.BORDERS['ROOT'], None if mirroring is off.
+    """
+    global _store
+    conf = borders_conf()
+    if conf['ROOT'] is None:
+        return None
+    with _store_lock:
+        if _store is None or _store.root != Path(conf['ROOT']) or _store.max_bytes != conf['MAX_BYTES']:
+            _store = BorderStore(conf['ROOT'], conf['MAX_BYTES'])
+        return _store
+
+def local_url(name):
+    return f"{borders_conf()['URL']}{name}"
+
+@timed('http.border_image')
+def mirror_image(url):
+    """
+    Download an image into the store, unless the image of that url is stored already.
+
+    Returns:
+        str: The local url of the image, or url itself if mirroring is off or the download failed.
+    """
+    import httpx
+    url = absolute_url(url)
+    store = get_store()
+    if store is None:
+        return url
+    name = store.lookup(url)
+    if name is not None:
+        return local_url(name)
+    try:
+        response = httpx.get(url, follow_redirects=True)
+        response.raise_for_status()
+        return local_url(store.put(response.content, url, response.headers.get('Content-Type')))
+    except (httpx.HTTPError, OSError, ValueError) as exc:
+        print(f"Unable to mirror {url}, linking to it instead: {exc!r}")
+        return url
+
+async def amirror_image(client, url, retries):
+    """
+    Async counterpart of mirror_image.
+    """
+    import httpx
+    from mainApp.wiki import _get
+    url = absolute_url(url)
+    store = get_store()
+    if store is None:
+        return url
+    name = await asyncio.to_thread(store.lookup, url)
+    if name is not None:
+        return local_url(name)
+    try:
+        response = await _get(client, url, retries)
+        name = await asyncio.to_thread(store.put, response.content, url, response.headers.get('Content-Type'))
+        return local_url(name)
+    except (httpx.HTTPError, OSError, ValueError) as exc:
+        print(f"Unable to mirror {url}, linking to it instead: {exc!r}")
+        return url
+
+def restore_image(name):
+    """
+    Download an evicted image again from the url recorded when it was stored.
+
+    Returns:
+        bool: True if the image is in the store again with the same content.
+    """
+    import httpx
+    store = get_store()
+    url = store.source(name) if store is not None else None
+    if url is None:
+        return False
+    try:
+        response = httpx.get(url, follow_redirects=True)
+        response.raise_for_status()
+        return store.put(response.content, url, response.headers.get('Content-Type')) == name
+    except (httpx.HTTPError, OSError, ValueError) as exc:
+        print(f"Unable to restore {name} from {url}: {exc!r}")
+        return False
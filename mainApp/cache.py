@@ -0,0 +1,394 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from redis.exceptions import RedisError
+from mainApp import pools
+from mainApp.instrumentation import timed
+
+CONSTELL_CACHE_DEFAULTS = {
+    # seconds every cached document lives in Redis
+    'TTL': 600,
+}
+
+SESSION_CACHE_DEFAULTS = {
+    'ENABLED': False,
+    # 'redis' (shared by all workers) or 'locmem' (per process)
+    'BACKEND': 'redis',
+    # decimal places of longtitude and latitude
+    'SITE_DECIMALS': 2,
+    # seconds of UTC time
+    'TIME_BUCKET': 60,
+    # seconds every cached response lives
+    'TTL': 300,
+    # entries of the locmem backend
+    'MAX_ENTRIES': 1024,
+}
+
+class ConstellCache():
+    """
+    Redis cache of constellation documents with one key per constell_id.
+
+    Every entry has its own TTL, so documents can be refreshed or dropped one by one. Bulk reads and writes
+    are a single pipeline round-trip. Hits and misses are counted in this process and in the
+    '<prefix>:stats' Redis hash, which is shared by all workers; the hash is updated in the pipeline of the
+    next read, so it lags this process by one read until stats() flushes it.
+    """
+
+    def __init__(self, prefix='constell'):
+        self.prefix = prefix
+        self.ids_key = f'{prefix}:ids'
+        self.stats_key = f'{prefix}:stats'
+        self.hits = 0
+        self.misses = 0
+        # counted here but not in the shared hash yet
+        self._pending = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return {**CONSTELL_CACHE_DEFAULTS, **getattr(settings, 'CONSTELL_CACHE', {})}['TTL']
+
+    def key(self, constell_id):
+        return f'{self.prefix}:{constell_id}'
+
+    def _count(self, hits, misses, shared=True):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            if shared:
+                self._pending['hits'] += hits
+                self._pending['misses'] += misses
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {'hits': 0, 'misses': 0}
+            return pending
+
+    def _queue_pending(self, pipe):
+        # add the counts of earlier reads to a pipeline
+        pending = self._take_pending()
+        for name, value in pending.items():
+            if value:
+                pipe.hincrby(self.stats_key, name, value)
+        return pending
+
+    def _restore_pending(self, pending):
+        with self._lock:
+            for name, value in pending.items():
+                self._pending[name] += value
+
+    def get(self, constell_id):
+        """
+        Get a single document from the cache.
+
+        Returns:
+            dict: The cached document, or None on a miss.
+        """
+        return self.get_many([constell_id]).get(constell_id)
+
+    @timed('cache.constell_get_many')
+    def get_many(self, constell_ids):
+        """
+        Get many documents with one round-trip.
+
+        Args:
+            constell_ids (list): The ids to look up.
+
+        Returns:
+            dict: Cached documents by constell_id, missing ids are left out.
+        """
+        constell_ids = list(constell_ids)
+        if not constell_ids:
+            return {}
+        redis_coll = pools.get_redis()
+        if redis_coll is None:
+            self._count(0, len(constell_ids), shared=False)
+            return {}
+        pipe = redis_coll.pipeline(transaction=False)
+        pipe.mget([self.key(constell_id) for constell_id in constell_ids])
+        pending = self._queue_pending(pipe)
+        try:
+            values = pipe.execute()[0]
+        except RedisError:
+            pools.mark_redis_down()
+            self._restore_pending(pending)
+            self._count(0, len(constell_ids), shared=False)
+            return {}
+        found = {constell_id: json.loads(value) for constell_id, value in zip(constell_ids, values) if value is not None}
+        self._count(len(found), len(constell_ids) - len(found))
+        return found
+
+    @timed('cache.constell_set_many')
+    def set_many(self, constells):
+        """
+        Store documents, each under its own key with a fresh TTL.
+
+        Args:
+            constells (list): Documents with constell_id and _id as a string.
+        """
+        constells = list(constells)
+        if not constells:
+            return
+        redis_coll = pools.get_redis()
+        if redis_coll is None:
+            return
+        ttl = self.ttl
+        try:
+            pipe = redis_coll.pipeline(transaction=False)
+            for constell in constells:
+                pipe.set(self.key(constell['constell_id']), json.dumps(constell), ex=ttl)
+            pipe.sadd(self.ids_key, *[constell['constell_id'] for constell in constells])
+            pipe.execute()
+        except RedisError:
+            pools.mark_redis_down()
+
+    def set(self, constell):
+        self.set_many([constell])
+
+    @timed('cache.constell_known_ids')
+    def known_ids(self):
+        """
+        Get the ids that have been cached at some point, their entries may have expired since.
+
+        Returns:
+            list: The ids as integers.
+        """
+        redis_coll = pools.get_redis()
+        if redis_coll is None:
+            return []
+        try:
+            return [int(constell_id) for constell_id in redis_coll.smembers(self.ids_key)]
+        except RedisError:
+            pools.mark_redis_down()
+            return []
+
+    def invalidate(self, constell_ids=None):
+        """
+        Drop the given entries, or the whole cache if no ids are given.
+        """
+        redis_coll = pools.get_redis()
+        if redis_coll is None:
+            return
+        try:
+            if constell_ids is None:
+                constell_ids = self.known_ids()
+                keys = [self.key(constell_id) for constell_id in constell_ids] + [self.ids_key]
+            else:
+                keys = [self.key(constell_id) for constell_id in constell_ids]
+            if keys:
+                redis_coll.delete(*keys)
+        except RedisError:
+            pools.mark_redis_down()
+
+    def stats(self):
+        """
+        Get hit/miss counters of this process and of all workers together.
+
+        Returns:
+            dict: {'hits', 'misses', 'hit_ratio', 'shared': {'hits', 'misses'}}
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        shared = {}
+        redis_coll = pools.get_redis()
+        if redis_coll is not None:
+            pipe = redis_coll.pipeline(transaction=False)
+            pending = self._queue_pending(pipe)
+            pipe.hgetall(self.stats_key)
+            try:
+                shared = {name: int(value) for name, value in pipe.execute()[-1].items()}
+            except RedisError:
+                pools.mark_redis_down()
+                self._restore_pending(pending)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            'shared': shared,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self._pending = {'hits': 0, 'misses': 0}
+
+constell_cache = ConstellCache()
+
+
+class LocMemStore():
+    """
+    Per-process LRU store with expiring entries.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisStore():
+    """
+    Store of JSON values in Redis, shared by all workers.
+    """
+
+    def get(self, key):
+        redis_coll = pools.get_redis()
+        if redis_coll is None:
+            return None
+        try:
+            value = redis_coll.get(key)
+        except RedisError:
+            pools.mark_redis_down()
+            return None
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        redis_coll = pools.get_redis()
+        if redis_coll is None:
+            return
+        try:
+            redis_coll.set(key, json.dumps(value), ex=ttl)
+        except RedisError:
+            pools.mark_redis_down()
+
+class SessionCache():
+    """
+    Cache of /session/ results by observation cell (rounded site, UTC time bucket and date).
+
+    Every entry holds the visible list and the rendered card grid. Hits and misses are counted with
+    the time spent serving them, in this process and in the '<prefix>:stats' Redis hash, like ConstellCache.
+    """
+
+    def __init__(self, prefix='session'):
+        self.prefix = prefix
+        self.stats_key = f'{prefix}:stats'
+        self.redis_store = RedisStore()
+        self.locmem_store = None
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def conf(self):
+        return {**SESSION_CACHE_DEFAULTS, **getattr(settings, 'SESSION_CACHE', {})}
+
+    @property
+    def store(self):
+        conf = self.conf
+        if conf['BACKEND'] == 'locmem':
+            if self.locmem_store is None:
+                with self._lock:
+                    if self.locmem_store is None:
+                        self.locmem_store = LocMemStore(conf['MAX_ENTRIES'])
+            return self.locmem_store
+        return self.redis_store
+
+    def key(self, version, long, lat, utc_time, date):
+        return f'{self.prefix}:{version}:{long}:{lat}:{date}:{utc_time}'
+
+    @timed('cache.session_get')
+    def get(self, key):
+        return self.store.get(key)
+
+    @timed('cache.session_set')
+    def set(self, key, value):
+        self.store.set(key, value, self.conf['TTL'])
+
+    def record(self, hit, seconds):
+        """
+        Count a served request with the time it took.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+        redis_coll = pools.get_redis()
+        if redis_coll is None:
+            return
+        kind = 'hits' if hit else 'misses'
+        try:
+            pipe = redis_coll.pipeline(transaction=False)
+            pipe.hincrby(self.stats_key, kind, 1)
+            pipe.hincrbyfloat(self.stats_key, f'{kind}_seconds', seconds)
+            pipe.execute()
+        except RedisError:
+            pools.mark_redis_down()
+
+    @staticmethod
+    def summary(hits, misses, hit_seconds, miss_seconds):
+        mean_hit = hit_seconds / hits if hits else 0.0
+        mean_miss = miss_seconds / misses if misses else 0.0
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            'mean_hit_ms': mean_hit * 1000,
+            'mean_miss_ms': mean_miss * 1000,
+            # what the hits would have cost as misses
+            'saved_ms': hits * (mean_miss - mean_hit) * 1000 if misses else 0.0,
+        }
+
+    def stats(self):
+        """
+        Get hit/miss counters and latency savings of this process and of all workers together.
+
+        Returns:
+            dict: {'hits', 'misses', 'hit_ratio', 'mean_hit_ms', 'mean_miss_ms', 'saved_ms', 'shared': {...same}}
+        """
+        with self._lock:
+            local = self.summary(self.hits, self.misses, self.hit_seconds, self.miss_seconds)
+        shared = {}
+        redis_coll = pools.get_redis()
+        if redis_coll is not None:
+            try:
+                counters = redis_coll.hgetall(self.stats_key)
+            except RedisError:
+                pools.mark_redis_down()
+            else:
+                if counters:
+                    shared = self.summary(int(counters.get('hits', 0)), int(counters.get('misses', 0)),
+                                          float(counters.get('hits_seconds', 0)), float(counters.get('misses_seconds', 0)))
+        return {**local, 'shared': shared}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.hit_seconds = 0.0
+            self.miss_seconds = 0.0
+
+session_cache = SessionCache()
@@ -0,0 +1,143 @@
+import threading
+import time
+from types import MappingProxyType
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from mainApp import pools
+from mainApp.cache import constell_cache
+from mainApp.engine import catalog_arrays
+from mainApp.httpcache import CATALOG_KEY, purge
+from mainApp.instrumentation import timed
+
+CATALOG_DEFAULTS = {
+    # seconds between checks of the catalog version in MongoDB
+    'VERSION_CHECK_INTERVAL': 30,
+}
+
+class Catalog():
+    """
+    Immutable in-process snapshot of the constellations collection.
+
+    Records are the documents from MongoDB (with _id as a string) sorted by constell_id. They are shared
+    by every request of the worker, so callers must treat them as read-only.
+    """
+    __slots__ = ('version', 'records', 'by_id', 'by_name', 'ra', 'dec')
+
+    def __init__(self, constells, version=0):
+        self.version = version
+        self.records = tuple(sorted(constells, key=lambda elem: elem['constell_id']))
+        self.by_id = MappingProxyType({elem['constell_id']: elem for elem in self.records})
+        self.by_name = MappingProxyType({elem['name']: elem for elem in self.records})
+        self.ra, self.dec = catalog_arrays(self.records)
+        self.ra.flags.writeable = False
+        self.dec.flags.writeable = False
+
+    def get(self, constell_id):
+        return self.by_id.get(constell_id)
+
+    def find(self, name):
+        return self.by_name.get(name)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+_lock = threading.Lock()
+_catalog = None
+_checked_at = 0.0
+
+def _check_interval():
+    return {**CATALOG_DEFAULTS, **getattr(settings, 'CATALOG', {})}['VERSION_CHECK_INTERVAL']
+
+@timed('db.catalog_version')
+def read_catalog_version(name='constellations'):
+    """
+    Read the current version of a catalog collection from MongoDB.
+
+    Args:
+        name (str): The catalog, 'constellations' or 'stars'.
+
+    Returns:
+        int: The version number, 0 if the collection was never bumped.
+    """
+    meta = pools.get_mongo_collection('catalog_meta').find_one({'_id': name})
+    return meta['version'] if meta is not None else 0
+
+def bump_catalog_version():
+    """
+    Mark the constellations collection as changed, so every worker reloads its catalog on the next version check.
+
+    Returns:
+        int: The new version number.
+    """
+    meta = pools.get_mongo_collection('catalog_meta').find_one_and_update({'_id': 'constellations'},
+                                                                          {'$inc': {'version': 1}},
+                                                                          upsert=True,
+                                                                          return_document=ReturnDocument.AFTER)
+    # cached documents are stale now as well
+    constell_cache.invalidate()
+    invalidate_catalog()
+    purge([CATALOG_KEY])
+    return meta['version']
+
+def load_catalog(version):
+    """
+    Build a fresh catalog from Redis/MongoDB.
+    """
+    from mainApp.api import load_constells
+    return Catalog(load_constells(), version)
+
+def invalidate_catalog():
+    """
+    Drop the catalog of this process, the next get_catalog() call loads it again.
+    """
+    global _catalog, _checked_at
+    with _lock:
+        _catalog = None
+        _checked_at = 0.0
+
+def get_catalog():
+    """
+    Get the catalog of this worker, loading it on first use.
+
+    The version in MongoDB is checked at most every settings.CATALOG['VERSION_CHECK_INTERVAL'] seconds, and
+    the catalog is reloaded only if it has changed. Every other call is a plain memory access.
+
+    Returns:
+        Catalog: The current catalog.
+    """
+    global _catalog, _checked_at
+    catalog = _catalog
+    if catalog is not None and time.monotonic() - _checked_at < _check_interval():
+        return catalog
+    with _lock:
+        if _catalog is not None and time.monotonic() - _checked_at < _check_interval():
+            return _catalog
+        try:
+            version = read_catalog_version()
+        except PyMongoError:
+            # keep serving what we have and try again after the next interval
+            if _catalog is None:
+                raise
+            _checked_at = time.monotonic()
+            return _catalog
+        if _catalog is None or _catalog.version != version:
+            _catalog = load_catalog(version)
+        _checked_at = time.monotonic()
+        return _catalog
+
+async def aget_catalog():
+    """
+    Async counterpart of get_catalog(), the rare version check and reload run in a worker thread.
+    """
+    catalog = _catalog
+    if catalog is not None and time.monotonic() - _checked_at < _check_interval():
+        return catalog
+    return await sync_to_async(get_catalog, thread_sensitive=False)()
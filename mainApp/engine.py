@@ -0,0 +1,106 @@
+import numpy as np
+
+def catalog_arrays(constells):
+    """
+    Build float64 arrays of right ascension and declination for a list of constellations.
+
+    Args:
+        constells (list): List of constellation documents with 'ra' (hours) and 'dec' (degrees) fields.
+
+    Returns:
+        tuple (numpy.ndarray, numpy.ndarray): Arrays of right ascensions and declinations.
+    """
+    ra = np.fromiter((elem['ra'] for elem in constells), dtype=np.float64, count=len(constells))
+    dec = np.fromiter((elem['dec'] for elem in constells), dtype=np.float64, count=len(constells))
+    return ra, dec
+
+def calculate_lst_many(gmst, long):
+    """
+    Vectorized version of api.calculate_lst.
+
+    Args:
+        gmst (numpy.ndarray): Greenwich Mean Sidereal Times in hours.
+        long (numpy.ndarray): Longitudes of the locations in degrees.
+
+    Returns:
+        numpy.ndarray: Local Sidereal Times in hours, broadcast over both arguments.
+    """
+    return (np.asarray(gmst, dtype=np.float64) + np.asarray(long, dtype=np.float64) / 15) % 24
+
+def equatorial_to_horizontal_many(ra, dec, lat, lst):
+    """
+    Vectorized version of api.equatorial_to_horizontal.
+
+    Args:
+        ra (numpy.ndarray): Right ascensions in hours.
+        dec (numpy.ndarray): Declinations in degrees.
+        lat (float | numpy.ndarray): The latitude of the location in degrees.
+        lst (float | numpy.ndarray): The Local Sidereal Time (LST) in hours.
+
+    Every argument is broadcast against the others, so a column of latitudes and
+    a row of sidereal times give a whole grid of observers in a single pass.
+
+    Returns:
+        tuple (numpy.ndarray, numpy.ndarray): Arrays of azimuths and altitudes in degrees.
+    """
+    ra = np.radians(np.asarray(ra, dtype=np.float64) * 15)
+    dec = np.radians(np.asarray(dec, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lst = np.radians(np.asarray(lst, dtype=np.float64) * 15)
+
+    hour_angle = lst - ra
+    hour_angle = (hour_angle + np.pi) % (2 * np.pi) - np.pi
+
+    sin_dec, cos_dec = np.sin(dec), np.cos(dec)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+
+    alt = np.arcsin(sin_dec * sin_lat + cos_dec * cos_lat * np.cos(hour_angle))
+    # rounding may push the cosine a hair outside of [-1, 1] near the zenith
+    cos_az = np.clip((sin_dec - sin_lat * np.sin(alt)) / (cos_lat * np.cos(alt)), -1.0, 1.0)
+    az = np.arccos(cos_az)
+    az = np.where(np.sin(hour_angle) > 0, 2 * np.pi - az, az)
+
+    return np.degrees(az), np.degrees(alt)
+
+def visible_mask(az, alt):
+    """
+    Mask of the objects that are above the horizon, using the same rule as api.are_visible_many.
+    """
+    return (az > 0) & (alt > 0)
+
+def rise_transit_set_many(ra, dec, lat, lst0, sidereal_rate):
+    """
+    Analytical rising, upper transit and setting of objects for one observer, using the same horizon
+    (altitude 0, no refraction) as visible_mask.
+
+    Args:
+        ra (numpy.ndarray): Right ascensions in hours.
+        dec (numpy.ndarray): Declinations in degrees.
+        lat (float): The latitude of the location in degrees.
+        lst0 (float): The Local Sidereal Time (LST) at the start of the time window, in hours.
+        sidereal_rate (float): Sidereal hours per solar hour.
+
+    Returns:
+        dict: Arrays with an entry per object:
+            - 'transit' (numpy.ndarray): Solar hours from the start of the window to the first transit.
+            - 'half_arc' (numpy.ndarray): Solar hours from rising to transit (and from transit to setting),
+              NaN for objects that never cross the horizon.
+            - 'max_alt' (numpy.ndarray): Altitude at transit in degrees.
+            - 'circumpolar' (numpy.ndarray): Mask of the objects that never set.
+            - 'never_rises' (numpy.ndarray): Mask of the objects that never rise.
+    """
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    transit = ((ra - lst0) % 24) / sidereal_rate
+    # hour angle of the horizon crossings: cos(H0) = -tan(lat) * tan(dec)
+    cos_h0 = -np.tan(np.radians(lat)) * np.tan(np.radians(dec))
+    circumpolar = cos_h0 < -1
+    never_rises = cos_h0 > 1
+    half_arc = np.degrees(np.arccos(np.where(circumpolar | never_rises, np.nan, cos_h0))) / 15 / sidereal_rate
+    return {
+        'transit': transit,
+        'half_arc': half_arc,
+        'max_alt': 90 - np.abs(lat - dec),
+        'circumpolar': circumpolar,
+        'never_rises': never_rises,
+    }
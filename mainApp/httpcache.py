@@ -0,0 +1,197 @@
+import hashlib
+import inspect
+import json
+from functools import wraps
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.module_loading import import_string
+from mainApp.cache import LocMemStore
+
+# HTTP caching of the views. Every cached view names a policy (its Cache-Control) and a validator that builds
+# the ETag from versions this worker already holds in memory: the catalog version, and the revision of the
+# wiki pages it served recently. A conditional GET whose If-None-Match matches is answered 304 before the
+# view runs, without reaching MongoDB or Redis. Public responses carry surrogate keys, and purge() tells edge
+# caches (through the PURGE_HOOKS) which keys changed.
+
+HTTP_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    # Cache-Control by policy name
+    'POLICIES': {
+        # JSON of the catalog, changes only with bump_catalog
+        'catalog': 'public, max-age=300, stale-while-revalidate=3600',
+        # scraped Wikipedia pages, refreshed weekly at most
+        'wiki': 'public, max-age=3600, stale-while-revalidate=86400',
+        # html pages embed the CSRF token of the visitor, shared caches must not keep them
+        'page': 'private, no-cache',
+        'session': 'private, no-cache',
+    },
+    # header edge caches read the purge keys of a response from (Cache-Tag for Cloudflare), None to leave it out
+    'SURROGATE_KEY_HEADER': 'Surrogate-Key',
+    # dotted paths of callables called with the list of keys whenever purge() is
+    'PURGE_HOOKS': [],
+    # seconds a worker trusts the revision of a page it served, before asking Redis/MongoDB again
+    'VALIDATOR_TTL': 60,
+}
+
+_versions = LocMemStore(4096)
+
+def http_cache_conf():
+    conf = {**HTTP_CACHE_DEFAULTS, **getattr(settings, 'HTTP_CACHE', {})}
+    conf['POLICIES'] = {**HTTP_CACHE_DEFAULTS['POLICIES'], **conf['POLICIES']}
+    return conf
+
+def make_etag(parts, weak=False):
+    """
+    Build an ETag from the versions a response depends on.
+
+    Args:
+        parts (tuple): JSON-serializable values, e.g. ('constell', catalog version, constell_id).
+        weak (bool): For responses that differ byte by byte but mean the same, like pages with a CSRF token.
+
+    Returns:
+        str: The quoted tag.
+    """
+    digest = hashlib.blake2b(json.dumps(parts, default=str).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+def etag_matches(request, etag):
+    """
+    Check the If-None-Match header of a request against an ETag, with the weak comparison of RFC 9110.
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    opaque = etag.removeprefix('W/')
+    return any(tag == '*' or tag.removeprefix('W/') == opaque for tag in parse_etags(header))
+
+def content_version(data):
+    """
+    Digest of a JSON-serializable value, the version of data that has no revision of its own.
+    """
+    return hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+def remember_version(key, version):
+    """
+    Keep the version of a resource this worker just served, for the validators of the next requests.
+    """
+    _versions.set(key, version, http_cache_conf()['VALIDATOR_TTL'])
+
+def known_version(key):
+    """
+    Get the version of a resource remembered by this worker.
+
+    Returns:
+        The version, or None if it wasn't served within VALIDATOR_TTL or was purged since.
+    """
+    return _versions.get(key)
+
+# surrogate keys
+CATALOG_KEY = 'catalog'
+
+def constell_key(constell_id):
+    return f'constell-{constell_id}'
+
+def wiki_key(suffix):
+    return f'wiki-{suffix}'
+
+def purge(keys):
+    """
+    Tell this worker and the edge caches that the resources of some surrogate keys changed.
+
+    Args:
+        keys (list): Surrogate keys, e.g. ['catalog'] or ['wiki-Orion_(constellation)'].
+    """
+    keys = list(keys)
+    for key in keys:
+        _versions.delete(key)
+    for path in http_cache_conf()['PURGE_HOOKS']:
+        try:
+            import_string(path)(keys)
+        except Exception as exc:
+            # a CDN being down must not fail the write that triggered the purge
+            print(f"Purge hook {path} failed for {keys}: {exc!r}")
+
+def _validate(request, validator, weak):
+    # (etag, keys), or (None, []) when the response has no validator (yet)
+    if validator is None or request.method not in ('GET', 'HEAD'):
+        return None, []
+    try:
+        validated = validator(request)
+    except (KeyError, ValueError, TypeError):
+        # malformed requests are the view's to answer
+        return None, []
+    if validated is None:
+        return None, []
+    parts, keys = validated
+    return make_etag(parts, weak), keys
+
+def _patch(response, conf, policy, etag, keys, vary):
+    response['Cache-Control'] = conf['POLICIES'][policy]
+    if etag is not None:
+        response['ETag'] = etag
+    if keys and conf['SURROGATE_KEY_HEADER'] and conf['POLICIES'][policy].startswith('public'):
+        response[conf['SURROGATE_KEY_HEADER']] = ' '.join(dict.fromkeys(keys))
+    if vary:
+        patch_vary_headers(response, vary)
+    return response
+
+def _before(request, conf, policy, validator, weak, vary):
+    etag, keys = _validate(request, validator, weak)
+    if etag is not None and etag_matches(request, etag):
+        return _patch(HttpResponseNotModified(), conf, policy, etag, keys, vary), etag, keys
+    return None, etag, keys
+
+def _after(request, response, conf, policy, validator, weak, vary, etag, keys):
+    if response.status_code != 200:
+        return response
+    if etag is None:
+        # the view may have taught the validator what it needed, e.g. the revision of a wiki page
+        etag, keys = _validate(request, validator, weak)
+    return _patch(response, conf, policy, etag, keys, vary)
+
+def cache_policy(policy, validator=None, weak=False, vary=()):
+    """
+    View decorator applying a policy of settings.HTTP_CACHE['POLICIES'] and answering conditional GETs.
+
+    Put it below @compressed and make it weak there: @compressed weakens the ETag of the bodies it compresses,
+    and the 304s answered here must carry the same tag as the 200s.
+
+    Args:
+        policy (str): Name of the Cache-Control policy.
+        validator (callable): validator(request) returns (parts, keys), the ETag parts and the surrogate keys
+            of the response, or None when they aren't known without running the view. It must not touch
+            MongoDB or Redis.
+        weak (bool): Use weak ETags.
+        vary (tuple): Request headers the response depends on.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                conf = http_cache_conf()
+                if not conf['ENABLED']:
+                    return await view(request, *args, **kwargs)
+                # the validators read the catalog, keep its rare reload off the event loop
+                from mainApp.catalog import aget_catalog
+                await aget_catalog()
+                not_modified, etag, keys = _before(request, conf, policy, validator, weak, vary)
+                if not_modified is not None:
+                    return not_modified
+                response = await view(request, *args, **kwargs)
+                return _after(request, response, conf, policy, validator, weak, vary, etag, keys)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            conf = http_cache_conf()
+            if not conf['ENABLED']:
+                return view(request, *args, **kwargs)
+            not_modified, etag, keys = _before(request, conf, policy, validator, weak, vary)
+            if not_modified is not None:
+                return not_modified
+            response = view(request, *args, **kwargs)
+            return _after(request, response, conf, policy, validator, weak, vary, etag, keys)
+        return wrapper
+    return decorator
@@ -0,0 +1,215 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from mainApp import responses
+
+# Responsive variants of the constellation pictures. build_images resizes every source PNG to a few widths,
+# encodes them as AVIF, WebP and PNG under content-hashed names (so they can be cached forever) and writes a
+# manifest that the constell_picture template tag turns into <picture> srcsets. Pillow is optional: it's only
+# needed to build, serving reads the manifest.
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+IMAGES_DEFAULTS = {
+    'ROOT': None,
+    # directories within ROOT, which is served under STATIC_URL
+    'SOURCE': 'constells',
+    'OUTPUT': 'img',
+    'WIDTHS': (240, 360, 480, 720),
+    # modern formats, best first; a PNG fallback is always written
+    'FORMATS': ('avif', 'webp'),
+    'QUALITY': {'avif': 50, 'webp': 75},
+    # 0 (slowest, smallest) to 10, 8 is about 3x faster than the default for 5% larger files
+    'AVIF_SPEED': 8,
+}
+
+# text assets precompressed next to the originals for static_file
+PRECOMPRESS_SUFFIXES = ('.css', '.js', '.json', '.svg', '.html', '.txt')
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'png': 'image/png'}
+
+def images_conf():
+    conf = {**IMAGES_DEFAULTS, **getattr(settings, 'IMAGES', {})}
+    if conf['ROOT'] is None:
+        conf['ROOT'] = Path(settings.STATICFILES_DIRS[0])
+    return conf
+
+def manifest_path(conf=None):
+    conf = conf or images_conf()
+    return Path(conf['ROOT']) / conf['OUTPUT'] / 'manifest.json'
+
+def supported_formats(formats):
+    """
+    The formats of the list this Pillow build can encode.
+    """
+    return [name for name in formats if features.check(name)]
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=6).hexdigest()
+
+def _encode(image, fmt, conf):
+    buffer = io.BytesIO()
+    if fmt == 'avif':
+        image.save(buffer, 'AVIF', quality=conf['QUALITY']['avif'], speed=conf['AVIF_SPEED'])
+    elif fmt == 'png':
+        # the fallback of old browsers only, optimize=True takes 6x longer for 3% less
+        image.save(buffer, 'PNG')
+    else:
+        image.save(buffer, fmt.upper(), quality=conf['QUALITY'].get(fmt))
+    return buffer.getvalue()
+
+def build_variants(source, conf, formats):
+    """
+    Encode every width and format of one source picture.
+
+    Args:
+        source (Path): The source PNG.
+        conf (dict): Settings as returned by images_conf().
+        formats (list): Formats to encode, besides the PNG fallback.
+
+    Returns:
+        tuple (dict, dict): The manifest entry of the picture and the encoded files by path relative to ROOT.
+    """
+    files = {}
+    with Image.open(source) as original:
+        original.load()
+        width, height = original.size
+        variants = {}
+        for fmt in [*formats, 'png']:
+            variants[fmt] = []
+            # a width above the original is only upscaled noise
+            for target in sorted({min(w, width) for w in conf['WIDTHS']}):
+                resized = original.resize((target, round(height * target / width)), Image.LANCZOS) if target != width else original
+                data = _encode(resized, fmt, conf)
+                name = f"{conf['OUTPUT']}/{source.stem}-{target}.{_digest(data)}.{fmt}"
+                files[name] = data
+                variants[fmt].append({'width': target, 'file': name})
+    return {'width': width, 'height': height, 'variants': variants}, files
+
+def load_manifest(path=None):
+    with open(path or manifest_path(), encoding='utf-8') as f:
+        return json.load(f)
+
+def build_manifest(conf=None, formats=None, force=False, jobs=None, log=print):
+    """
+    Build the variants of every source picture that changed since the last build, write the manifest and
+    delete the variants it doesn't reference anymore.
+
+    Args:
+        conf (dict): Settings, images_conf() by default.
+        formats (list): Formats to encode, the supported ones of settings.IMAGES['FORMATS'] by default.
+        force (bool): Encode every picture, even the unchanged ones.
+        jobs (int): Pictures encoded at once, one per CPU by default. Pillow encodes outside the GIL.
+        log (callable): Called with a line of progress for every picture.
+
+    Returns:
+        dict: The manifest written.
+    """
+    conf = conf or images_conf()
+    root = Path(conf['ROOT'])
+    formats = supported_formats(conf['FORMATS']) if formats is None else formats
+    output = root / conf['OUTPUT']
+    output.mkdir(parents=True, exist_ok=True)
+    try:
+        previous = load_manifest(manifest_path(conf))['images']
+    except (OSError, ValueError, KeyError):
+        previous = {}
+    # the settings of the build are part of every picture's key, a change re-encodes all of them
+    settings_digest = _digest(json.dumps([formats, sorted(conf['WIDTHS']), conf['QUALITY'], conf['AVIF_SPEED']],
+                                         sort_keys=True).encode())
+
+    images = {}
+    pending = []
+    for source in sorted((root / conf['SOURCE']).glob('*.png')):
+        digest = f"{_digest(source.read_bytes())}{settings_digest}"
+        entry = previous.get(source.stem)
+        if not force and entry is not None and entry.get('source') == digest and all(
+                (root / variant['file']).exists() for variants in entry['variants'].values() for variant in variants):
+            images[source.stem] = entry
+        else:
+            pending.append((source, digest))
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        futures = [(source, digest, executor.submit(build_variants, source, conf, formats)) for source, digest in pending]
+        for source, digest, future in futures:
+            entry, files = future.result()
+            for name, data in files.items():
+                (root / name).write_bytes(data)
+            images[source.stem] = {**entry, 'source': digest}
+            log(f"{source.name}: {len(files)} variants, {sum(map(len, files.values())) / 1024:.0f} KiB")
+    images = dict(sorted(images.items()))
+
+    manifest = {'formats': [*formats, 'png'], 'images': images}
+    manifest_path(conf).write_text(json.dumps(manifest, indent=1), encoding='utf-8')
+    referenced = {variant['file'] for entry in images.values() for variants in entry['variants'].values() for variant in variants}
+    for path in output.iterdir():
+        if not path.name.startswith('manifest.json') and f"{conf['OUTPUT']}/{path.name}" not in referenced:
+            path.unlink()
+    reset_manifest()
+    return manifest
+
+def precompress(directory):
+    """
+    Write .gz (and .br if brotli is installed) siblings of the text assets of a directory tree, for static_file.
+
+    Returns:
+        int: Number of files written.
+    """
+    written = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if not filename.endswith(PRECOMPRESS_SUFFIXES):
+                continue
+            path = Path(dirpath) / filename
+            data = path.read_bytes()
+            encoders = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+            if responses.brotli is not None:
+                encoders.append(('.br', lambda data: responses.brotli.compress(data, quality=11)))
+            for suffix, encode in encoders:
+                target = path.with_name(filename + suffix)
+                if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+                    continue
+                content = encode(data)
+                # not worth a second file
+                if len(content) < len(data) * 0.9:
+                    target.write_bytes(content)
+                    written += 1
+    return written
+
+_lock = threading.Lock()
+_manifest = None
+_loaded = False
+
+def get_manifest():
+    """
+    Get the manifest written by build_images, reading it on first use.
+
+    Returns:
+        dict: The manifest, or None if the images weren't built.
+    """
+    global _manifest, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                try:
+                    _manifest = load_manifest()
+                except FileNotFoundError:
+                    pass
+                except (OSError, ValueError) as exc:
+                    print(f"Unable to load the image manifest, serving the original pictures: {exc!r}")
+                _loaded = True
+    return _manifest
+
+def reset_manifest():
+    global _manifest, _loaded
+    with _lock:
+        _manifest = None
+        _loaded = False
@@ -0,0 +1,212 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Timing of the hot paths: Mongo ('db'), Redis ('cache'), outgoing HTTP ('http'), html parsing ('parse')
+# and astronomy math ('compute'). Spans are named '<category>.<operation>'.
+#
+# The switch is read once at import: when it's off, timed() returns the function untouched and span()
+# returns a shared no-op context manager, so the disabled layer costs nothing per call.
+
+INSTRUMENTATION_DEFAULTS = {
+    'ENABLED': False,
+    # log every request's spans as one JSON line on the 'mainApp.instrumentation' logger
+    'LOG_SPANS': False,
+}
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def instrumentation_conf():
+    return {**INSTRUMENTATION_DEFAULTS, **getattr(settings, 'INSTRUMENTATION', {})}
+
+ENABLED = instrumentation_conf()['ENABLED']
+
+logger = logging.getLogger(__name__)
+
+# spans of the request being served, None outside of InstrumentationMiddleware
+_spans = contextvars.ContextVar('skygaze_spans', default=None)
+_NOOP = nullcontext()
+
+class Histogram():
+    """
+    Cumulative histogram with fixed bucket bounds, in Prometheus' layout.
+    """
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+_histograms = {}
+_lock = threading.Lock()
+
+def observe(metric, labels, seconds):
+    """
+    Add a duration to the histogram of a metric with the given labels (a tuple of (name, value) pairs).
+    """
+    with _lock:
+        histogram = _histograms.get((metric, labels))
+        if histogram is None:
+            histogram = _histograms[(metric, labels)] = Histogram()
+        histogram.observe(seconds)
+
+def record(name, seconds):
+    """
+    Record a finished span in the current request and in the span histograms.
+    """
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+    observe('skygaze_span_seconds', (('span', name),), seconds)
+
+def timed(name):
+    """
+    Decorator recording every call of a (sync or async) function as a span.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+@contextmanager
+def _span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def span(name):
+    """
+    Context manager recording the enclosed block as a span.
+    """
+    return _span(name) if ENABLED else _NOOP
+
+def server_timing(spans, total):
+    """
+    Build a Server-Timing header value with the time spent per category, in milliseconds.
+    """
+    by_category = {}
+    for name, seconds in spans:
+        category = name.split('.', 1)[0]
+        by_category[category] = by_category.get(category, 0.0) + seconds
+    entries = [f'{category};dur={seconds * 1000:.3f}' for category, seconds in by_category.items()]
+    entries.append(f'total;dur={total * 1000:.3f}')
+    return ', '.join(entries)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_prometheus():
+    """
+    Export all histograms in the Prometheus text format.
+    """
+    with _lock:
+        snapshot = [(metric, labels, list(h.counts), h.sum, h.count) for (metric, labels), h in _histograms.items()]
+    lines = []
+    seen = set()
+    for metric, labels, counts, total, count in sorted(snapshot):
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f'# TYPE {metric} histogram')
+        label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+        prefix = f'{label_text},' if label_text else ''
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ('+Inf',), counts):
+            cumulative += bucket
+            lines.append(f'{metric}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{{label_text}}} {total}')
+        lines.append(f'{metric}_count{{{label_text}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+class InstrumentationMiddleware():
+    """
+    Collects the spans of every request, adds a Server-Timing header and records request durations.
+
+    Removed from the middleware chain when settings.INSTRUMENTATION['ENABLED'] is off.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log_spans = instrumentation_conf()['LOG_SPANS']
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        spans = []
+        token = _spans.set(spans)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _spans.reset(token)
+        return self.finish(request, response, spans, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        spans = []
+        token = _spans.set(spans)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _spans.reset(token)
+        return self.finish(request, response, spans, time.perf_counter() - start)
+
+    def finish(self, request, response, spans, total):
+        response['Server-Timing'] = server_timing(spans, total)
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        observe('skygaze_request_seconds', (('method', request.method), ('route', route)), total)
+        if self.log_spans:
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 3),
+                'spans': [{'name': name, 'ms': round(seconds * 1000, 3)} for name, seconds in spans],
+            }))
+        return response
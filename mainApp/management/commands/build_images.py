@@ -0,0 +1,46 @@
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from mainApp import images
+
+class Command(BaseCommand):
+    help = "Build resized AVIF/WebP/PNG variants of the constellation pictures with a manifest, and precompress the text assets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Encode every picture, even the unchanged ones.")
+        parser.add_argument('--formats', help="Comma-separated formats besides the PNG fallback (default: settings.IMAGES['FORMATS']).")
+        parser.add_argument('--jobs', type=int, help="Pictures encoded at once (default: one per CPU).")
+        parser.add_argument('--no-precompress', action='store_true', help="Skip writing .gz/.br siblings of CSS, JS and other text files.")
+
+    def handle(self, *args, **options):
+        if images.Image is None:
+            raise CommandError("Pillow is required to build the images: pip install Pillow")
+        conf = images.images_conf()
+        wanted = options['formats'].split(',') if options['formats'] else conf['FORMATS']
+        formats = images.supported_formats(wanted)
+        for name in set(wanted) - set(formats):
+            self.stderr.write(self.style.WARNING(f"This Pillow build can't encode {name}, skipping it."))
+
+        root = Path(conf['ROOT'])
+        sources = list((root / conf['SOURCE']).glob('*.png'))
+        start = time.perf_counter()
+        manifest = images.build_manifest(conf, formats, options['force'], options['jobs'], log=self.stdout.write)
+        elapsed = time.perf_counter() - start
+
+        original = sum(path.stat().st_size for path in sources)
+        self.stdout.write(f"Pictures: {len(manifest['images'])}, originals {original / 2**20:.1f} MiB")
+        # what a browser downloads for the whole catalog at every width, pictures narrower than it included
+        for fmt in manifest['formats']:
+            sizes = []
+            for width in sorted(conf['WIDTHS']):
+                chosen = [min(entry['variants'][fmt], key=lambda variant: abs(variant['width'] - min(width, entry['width'])))
+                          for entry in manifest['images'].values()]
+                sizes.append(f"{width}w {sum((root / variant['file']).stat().st_size for variant in chosen) / 2**20:.2f}")
+            self.stdout.write(f"  {fmt:<5} MiB: {', '.join(sizes)}")
+        self.stdout.write(f"Build time: {elapsed:.1f}s")
+
+        if not options['no_precompress']:
+            written = sum(images.precompress(directory) for directory in settings.STATICFILES_DIRS)
+            self.stdout.write(f"Precompressed files written: {written}")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {images.manifest_path(conf)}."))
@@ -0,0 +1,36 @@
+import os
+import random
+import time
+from django.core.management.base import BaseCommand
+from mainApp.catalog import get_catalog
+from mainApp.skyIndex import reset_sky_index, sky_index_conf, write_sky_index
+
+class Command(BaseCommand):
+    help = "Precompute which constellations may be visible in every (latitude, sidereal time) cell and write the memory-mapped index."
+
+    def add_arguments(self, parser):
+        conf = sky_index_conf()
+        parser.add_argument('--lat-step', type=float, default=conf['LAT_STEP'], help="Cell size in degrees of latitude.")
+        parser.add_argument('--lst-step', type=float, default=conf['LST_STEP'], help="Cell size in minutes of sidereal time.")
+        parser.add_argument('-o', '--output', default=conf['PATH'], help="Index file (default: settings.SKY_INDEX['PATH']).")
+        parser.add_argument('--lookups', type=int, default=10000, help="Random lookups used to measure the latency.")
+
+    def handle(self, *args, **options):
+        catalog = get_catalog()
+        start = time.perf_counter()
+        index = write_sky_index(options['output'], catalog, options['lat_step'], options['lst_step'] / 60)
+        elapsed = time.perf_counter() - start
+        reset_sky_index()
+
+        samples = [(random.uniform(-90, 90), random.uniform(0, 24)) for _ in range(options['lookups'])]
+        candidates = 0
+        start = time.perf_counter()
+        for lat, lst in samples:
+            candidates += len(index.candidates(lat, lst))
+        lookup = (time.perf_counter() - start) / len(samples)
+
+        self.stdout.write(f"Cells: {index.n_lat} x {index.n_lst} of {len(catalog)} constellations")
+        self.stdout.write(f"Size: {os.path.getsize(options['output']) / 1024:.1f} KiB")
+        self.stdout.write(f"Build time: {elapsed:.2f}s")
+        self.stdout.write(f"Lookup: {lookup * 1e6:.2f} us, {candidates / len(samples):.1f} candidates on average")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from mainApp.catalog import bump_catalog_version
+
+class Command(BaseCommand):
+    help = "Mark the constellations collection as changed, so every worker reloads its in-process catalog."
+
+    def handle(self, *args, **options):
+        version = bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Catalog version is now {version}."))
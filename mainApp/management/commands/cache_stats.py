@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from mainApp.cache import constell_cache, session_cache
+
+class Command(BaseCommand):
+    help = "Print hit ratios of the constellation and session caches, counted by all workers in Redis."
+
+    def handle(self, *args, **options):
+        constells = constell_cache.stats()['shared']
+        hits, misses = constells.get('hits', 0), constells.get('misses', 0)
+        ratio = hits / (hits + misses) if hits + misses else 0.0
+        self.stdout.write(f"Constellation cache: {hits} hits, {misses} misses, hit ratio {ratio:.1%}")
+
+        sessions = session_cache.stats()['shared']
+        if not sessions:
+            self.stdout.write("Session cache: no requests counted")
+            return
+        self.stdout.write(f"Session cache: {sessions['hits']} hits, {sessions['misses']} misses, hit ratio {sessions['hit_ratio']:.1%}")
+        self.stdout.write(f"  mean hit {sessions['mean_hit_ms']:.3f} ms, mean miss {sessions['mean_miss_ms']:.3f} ms, "
+                          f"saved {sessions['saved_ms'] / 1000:.1f} s")
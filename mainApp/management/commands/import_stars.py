@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from mainApp.stars import import_stars, read_star_csv
+
+class Command(BaseCommand):
+    help = "Import a star catalog (e.g. the HYG database, Messier/NGC lists) from a CSV file into MongoDB."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row and 'ra' and 'dec' columns.")
+        parser.add_argument('--replace', action='store_true', help="Drop the objects imported before.")
+        parser.add_argument('--ra-unit', choices=('hours', 'degrees'), default='hours', help="Unit of the 'ra' column.")
+        parser.add_argument('--id-col', default='id', help="Column with the object id.")
+        parser.add_argument('--name-col', default='proper', help="Column with the object name.")
+        parser.add_argument('--mag-col', default='mag', help="Column with the visual magnitude.")
+        parser.add_argument('--batch-size', type=int, help="Documents per insert (default: settings.STARS['BATCH_SIZE']).")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        objects = read_star_csv(options['path'], options['id_col'], options['name_col'], options['mag_col'], options['ra_unit'])
+        try:
+            count = import_stars(objects, options['replace'], options['batch_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Unable to import {options['path']}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {count} objects in {time.perf_counter() - start:.1f}s."))
@@ -0,0 +1,100 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, so every import and connection is cold like in a new worker. The WSGI
+# application is loaded the way gunicorn does it and called directly, without a socket in between.
+CHILD = '''
+import io, json, sys, time
+started = time.time()
+from stargazing.wsgi import application
+booted = time.time()
+
+def get(path, host):
+    path, _, query = path.partition('?')
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': host,
+               'SERVER_PORT': '80', 'HTTP_HOST': host, 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+               'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': False,
+               'wsgi.multiprocess': True, 'wsgi.run_once': False}
+    status = []
+    b''.join(application(environ, lambda line, headers, exc_info=None: status.append(line)))
+    return status[0]
+
+status = get(sys.argv[1], sys.argv[2])
+first = time.time()
+get(sys.argv[1], sys.argv[2])
+second = time.time()
+print(json.dumps({'started': started, 'booted': booted, 'first': first, 'second': second, 'status': status}))
+'''
+
+class Command(BaseCommand):
+    help = "Measure the cold start of a worker: import time per package and time to the first response."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='/', help="Path of the first request, with an optional query string.")
+        parser.add_argument('--runs', type=int, default=5, help="Fresh processes started, medians are reported.")
+        parser.add_argument('--top', type=int, default=15, help="Packages listed by import time.")
+        parser.add_argument('--warmup', choices=('on', 'off', 'settings'), default='settings',
+                            help="Force the startup warmup (SKYGAZE_WARMUP) on or off in the measured processes.")
+
+    def child_env(self, warmup):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'stargazing.settings')}
+        if warmup != 'settings':
+            env['SKYGAZE_WARMUP'] = '1' if warmup == 'on' else '0'
+        return env
+
+    def import_times(self, env):
+        # -X importtime slows imports down, so it gets a run of its own
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from stargazing.wsgi import application'],
+                                env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"Unable to load the application:\n{result.stderr[-2000:]}")
+        packages = defaultdict(int)
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, _, name = line[len('import time:'):].split('|')
+            packages[name.strip().split('.')[0]] += int(own)
+            total += int(own)
+        return total, sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+    def first_response(self, env, path, host):
+        spawned = time.time()
+        result = subprocess.run([sys.executable, '-c', CHILD, path, host],
+                                env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"The first request failed:\n{result.stderr[-2000:]}")
+        times = json.loads(result.stdout.splitlines()[-1])
+        return {
+            'interpreter': times['started'] - spawned,
+            'boot': times['booted'] - times['started'],
+            'first': times['first'] - times['booted'],
+            'second': times['second'] - times['first'],
+            'total': times['first'] - spawned,
+            'status': times['status'],
+        }
+
+    def handle(self, *args, **options):
+        env = self.child_env(options['warmup'])
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+
+        total, packages = self.import_times(env)
+        self.stdout.write(f"Imports: {total / 1000:.1f} ms to load the application")
+        for name, own in packages[:options['top']]:
+            self.stdout.write(f"  {name:<24} {own / 1000:8.1f} ms")
+
+        runs = [self.first_response(env, options['path'], host) for _ in range(options['runs'])]
+        median = lambda key: statistics.median(run[key] for run in runs) * 1000
+        self.stdout.write(f"GET {options['path']}: {runs[0]['status']}, median of {len(runs)} fresh processes")
+        self.stdout.write(f"  interpreter start          {median('interpreter'):8.1f} ms")
+        self.stdout.write(f"  application load (+warmup) {median('boot'):8.1f} ms")
+        self.stdout.write(f"  first response             {median('first'):8.1f} ms")
+        self.stdout.write(f"  second response            {median('second'):8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Time to first response: {median('total'):.1f} ms"))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from mainApp.api import get_constells
+from mainApp.wiki import warm_wiki_pages, wiki_suffix
+
+class Command(BaseCommand):
+    help = "Scrape the Wikipedia pages of all constellations concurrently and store them in MongoDB."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help="Maximum number of pages in flight (default: settings.WIKI['CONCURRENCY']).")
+        parser.add_argument('--retries', type=int, help="Attempts per request (default: settings.WIKI['RETRIES']).")
+        parser.add_argument('--full', action='store_true', help="Scrape every page, not only the ones whose revision changed since they were stored.")
+        parser.add_argument('--every', type=int, metavar='SECONDS', help="Keep running and warm the pages again every SECONDS.")
+        parser.add_argument('names', nargs='*', help="Only warm these constellations.")
+
+    def handle(self, *args, **options):
+        while True:
+            self.warm(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def warm(self, options):
+        constells = get_constells()
+        if options['names']:
+            constells = [elem for elem in constells if elem['name'] in options['names']]
+        start = time.perf_counter()
+        results = warm_wiki_pages([wiki_suffix(elem) for elem in constells], options['concurrency'], options['retries'],
+                                  incremental=not options['full'])
+        failed = {suffix: exc for suffix, exc in results.items() if isinstance(exc, Exception)}
+        unchanged = sum(scraped is None for scraped in results.values())
+        for suffix, exc in failed.items():
+            self.stderr.write(f"{suffix}: {exc!r}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {len(results) - len(failed)}/{len(results)} pages ({unchanged} unchanged) in {time.perf_counter() - start:.1f}s."))
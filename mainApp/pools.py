@@ -0,0 +1,235 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+import redis
+import redis.asyncio
+from django.conf import settings
+from pymongo import AsyncMongoClient, MongoClient
+
+MONGO_DEFAULTS = {
+    'URI': 'mongodb://localhost:27017',
+    'DB': 'stargazeNow',
+    'MAX_POOL_SIZE': 50,
+    'MIN_POOL_SIZE': 0,
+    # server selection and connect timeout
+    'TIMEOUT_MS': 2000,
+    # seconds the reads that can do without MongoDB skip it after it was found unreachable
+    'DOWN_BACKOFF': 30,
+}
+
+REDIS_DEFAULTS = {
+    'HOST': 'localhost',
+    'PORT': 6379,
+    'DB': 0,
+    'MAX_CONNECTIONS': 50,
+    # seconds to wait for a free connection in the pool
+    'POOL_TIMEOUT': 1,
+    'SOCKET_TIMEOUT': 0.5,
+    'CONNECT_TIMEOUT': 0.5,
+    # seconds to skip Redis entirely after it was found unreachable
+    'DOWN_BACKOFF': 30,
+}
+
+_lock = threading.Lock()
+_mongo_client = None
+_redis_pool = None
+_redis_checked = False
+_redis_down_until = 0.0
+_mongo_down_until = 0.0
+# async clients are bound to the event loop they were created in
+_async_clients = weakref.WeakKeyDictionary()
+
+def _conf(name, defaults):
+    return {**defaults, **getattr(settings, name, {})}
+
+def _reset_after_fork():
+    """
+    Forget every handle inherited from the parent process.
+
+    Sockets of a pool are shared with the parent after fork(), so a child (e.g. a Gunicorn worker)
+    must build its own pools instead of reusing them.
+    """
+    global _lock, _mongo_client, _redis_pool, _redis_checked, _redis_down_until, _mongo_down_until, _async_clients
+    _lock = threading.Lock()
+    _async_clients = weakref.WeakKeyDictionary()
+    _mongo_client = None
+    _redis_pool = None
+    _redis_checked = False
+    _redis_down_until = 0.0
+    _mongo_down_until = 0.0
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_mongo_client():
+    """
+    Get the process-wide MongoClient, creating it on first use.
+
+    Returns:
+        MongoClient: A client with its own connection pool sized by settings.MONGO.
+    """
+    global _mongo_client
+    if _mongo_client is None:
+        with _lock:
+            if _mongo_client is None:
+                conf = _conf('MONGO', MONGO_DEFAULTS)
+                _mongo_client = MongoClient(conf['URI'],
+                                            maxPoolSize=conf['MAX_POOL_SIZE'],
+                                            minPoolSize=conf['MIN_POOL_SIZE'],
+                                            serverSelectionTimeoutMS=conf['TIMEOUT_MS'],
+                                            connectTimeoutMS=conf['TIMEOUT_MS'],
+                                            connect=False)
+    return _mongo_client
+
+def get_mongo_collection(name):
+    """
+    Get a collection of the application's database from the shared client.
+
+    Args:
+        name (str): The name of the collection.
+
+    Returns:
+        pymongo.collection.Collection: The requested collection.
+    """
+    return get_mongo_client()[_conf('MONGO', MONGO_DEFAULTS)['DB']][name]
+
+def mark_mongo_down():
+    """
+    Remember that MongoDB is unreachable, so mongo_is_down() is true for the next settings.MONGO['DOWN_BACKOFF'] seconds.
+    """
+    global _mongo_down_until
+    _mongo_down_until = time.monotonic() + _conf('MONGO', MONGO_DEFAULTS)['DOWN_BACKOFF']
+
+def mongo_is_down():
+    """
+    Check whether MongoDB was reported unreachable within the backoff window, for reads that have a fallback
+    (e.g. scraping a page again) and shouldn't wait for the server selection timeout on every request.
+    """
+    return bool(_mongo_down_until) and time.monotonic() < _mongo_down_until
+
+def get_redis():
+    """
+    Get a Redis client backed by the process-wide connection pool.
+
+    The server is pinged once when the pool is created. If it's unreachable, or a caller reported it
+    with mark_redis_down(), None is returned without any network I/O until the backoff window passes.
+
+    Returns:
+        Redis: A Redis client object, or None if Redis is considered down.
+    """
+    global _redis_pool, _redis_checked, _redis_down_until
+    if _redis_down_until and time.monotonic() < _redis_down_until:
+        return None
+    if _redis_pool is None:
+        with _lock:
+            if _redis_pool is None:
+                conf = _conf('REDIS', REDIS_DEFAULTS)
+                _redis_pool = redis.BlockingConnectionPool(host=conf['HOST'],
+                                                           port=conf['PORT'],
+                                                           db=conf['DB'],
+                                                           max_connections=conf['MAX_CONNECTIONS'],
+                                                           timeout=conf['POOL_TIMEOUT'],
+                                                           socket_timeout=conf['SOCKET_TIMEOUT'],
+                                                           socket_connect_timeout=conf['CONNECT_TIMEOUT'],
+                                                           decode_responses=True)
+    client = redis.Redis(connection_pool=_redis_pool)
+    if not _redis_checked:
+        try:
+            client.ping()
+        except redis.RedisError:
+            mark_redis_down()
+            print("Unable to reach Redis, working with MongoDB exclusively.")
+            return None
+        _redis_checked = True
+        _redis_down_until = 0.0
+    return client
+
+def mark_redis_down():
+    """
+    Remember that Redis is unreachable, so get_redis() returns None for the next settings.REDIS['DOWN_BACKOFF'] seconds.
+    """
+    global _redis_checked, _redis_down_until
+    _redis_checked = False
+    _redis_down_until = time.monotonic() + _conf('REDIS', REDIS_DEFAULTS)['DOWN_BACKOFF']
+
+def _loop_clients():
+    return _async_clients.setdefault(asyncio.get_running_loop(), {})
+
+def get_async_mongo_collection(name):
+    """
+    Get a collection of the application's database from the AsyncMongoClient of the running event loop.
+
+    Args:
+        name (str): The name of the collection.
+
+    Returns:
+        pymongo.asynchronous.collection.AsyncCollection: The requested collection.
+    """
+    clients = _loop_clients()
+    conf = _conf('MONGO', MONGO_DEFAULTS)
+    if 'mongo' not in clients:
+        clients['mongo'] = AsyncMongoClient(conf['URI'],
+                                            maxPoolSize=conf['MAX_POOL_SIZE'],
+                                            minPoolSize=conf['MIN_POOL_SIZE'],
+                                            serverSelectionTimeoutMS=conf['TIMEOUT_MS'],
+                                            connectTimeoutMS=conf['TIMEOUT_MS'],
+                                            connect=False)
+    return clients['mongo'][conf['DB']][name]
+
+async def get_async_redis():
+    """
+    Async counterpart of get_redis(), sharing its down/backoff state.
+
+    Returns:
+        redis.asyncio.Redis: A client backed by the pool of the running event loop, or None if Redis is considered down.
+    """
+    if _redis_down_until and time.monotonic() < _redis_down_until:
+        return None
+    clients = _loop_clients()
+    if 'redis' not in clients:
+        conf = _conf('REDIS', REDIS_DEFAULTS)
+        pool = redis.asyncio.BlockingConnectionPool(host=conf['HOST'],
+                                                    port=conf['PORT'],
+                                                    db=conf['DB'],
+                                                    max_connections=conf['MAX_CONNECTIONS'],
+                                                    timeout=conf['POOL_TIMEOUT'],
+                                                    socket_timeout=conf['SOCKET_TIMEOUT'],
+                                                    socket_connect_timeout=conf['CONNECT_TIMEOUT'],
+                                                    decode_responses=True)
+        client = redis.asyncio.Redis(connection_pool=pool)
+        try:
+            await client.ping()
+        except redis.RedisError:
+            mark_redis_down()
+            print("Unable to reach Redis, working with MongoDB exclusively.")
+            return None
+        clients['redis'] = client
+    return clients['redis']
+
+def get_async_http_client():
+    """
+    Get the httpx.AsyncClient of the running event loop, so outgoing requests reuse their connections.
+    """
+    clients = _loop_clients()
+    if 'http' not in clients:
+        import httpx
+        from mainApp.wiki import wiki_conf
+        clients['http'] = httpx.AsyncClient(timeout=wiki_conf()['TIMEOUT'], follow_redirects=True)
+    return clients['http']
+
+def close_pools():
+    """
+    Close the shared clients, e.g. on worker shutdown.
+    """
+    global _mongo_client, _redis_pool, _redis_checked, _redis_down_until
+    with _lock:
+        if _mongo_client is not None:
+            _mongo_client.close()
+        if _redis_pool is not None:
+            _redis_pool.disconnect()
+        _mongo_client = None
+        _redis_pool = None
+        _redis_checked = False
+        _redis_down_until = 0.0
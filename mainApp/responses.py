@@ -0,0 +1,93 @@
+import gzip
+import inspect
+import json
+from functools import wraps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+# Fast JSON and compressed responses for the JSON API. orjson and brotli are optional: without them
+# responses are encoded with the standard json module and compressed with gzip only.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# bodies shorter than this are sent as they are, same threshold as Django's GZipMiddleware
+COMPRESS_MIN_LENGTH = 200
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+def dumps(data):
+    """
+    Serialize data to JSON bytes, with orjson if it's installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+class FastJsonResponse(HttpResponse):
+    """
+    Drop-in replacement of JsonResponse encoding with dumps(), for dict data only.
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+def accepted_encodings(request):
+    """
+    Content codings of the Accept-Encoding header, without the ones refused with q=0.
+    """
+    accepted = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+def compress_response(request, response):
+    """
+    Compress a response with brotli or gzip, whichever the client accepts (brotli first).
+    """
+    if response.streaming or response.has_header('Content-Encoding') or len(response.content) < COMPRESS_MIN_LENGTH:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    accepted = accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        content, encoding = brotli.compress(response.content, quality=BROTLI_QUALITY), 'br'
+    elif 'gzip' in accepted or '*' in accepted:
+        content, encoding = gzip.compress(response.content, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'
+    else:
+        return response
+    if len(content) >= len(response.content):
+        return response
+    response.content = content
+    response['Content-Length'] = str(len(content))
+    response['Content-Encoding'] = encoding
+    # the compressed body differs byte by byte, a strong ETag would be wrong for it
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = f'W/{etag}'
+    return response
+
+def compressed(view):
+    """
+    View decorator compressing the response according to Accept-Encoding, for sync and async views.
+    """
+    if inspect.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            return compress_response(request, await view(request, *args, **kwargs))
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return compress_response(request, view(request, *args, **kwargs))
+    return wrapper
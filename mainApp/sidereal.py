@@ -0,0 +1,85 @@
+import datetime
+from functools import lru_cache
+
+J2000 = 2451545.0
+# sidereal hours per solar hour
+SIDEREAL_RATE = 1.00273790935
+
+# GMST at 0h UT by date ordinal, filled by precompute_gmst_table
+_gmst0_table = {}
+
+def julian_date(year, month, day, hour=0, minute=0, second=0):
+    """
+    Calculate the Julian Date (JD) from the UT date and time, valid for years 1901-2099.
+
+    Returns:
+        float: The calculated Julian Date (JD).
+    """
+    return 367 * year - 7 * (year + (month + 9) // 12) // 4 + 275 * month // 9 + day + 1721013.5 \
+        + (hour + minute / 60 + second / 3600) / 24
+
+def _gmst0(date):
+    # GMST at 0h UT of the date, not reduced to 0-24
+    gmst0 = _gmst0_table.get(date.toordinal())
+    if gmst0 is None:
+        gmst0 = 6.697374558 + 0.06570982441908 * (julian_date(date.year, date.month, date.day) - J2000)
+    return gmst0
+
+def precompute_gmst_table(start, days):
+    """
+    Precompute GMST at 0h UT for a range of dates.
+
+    Args:
+        start (datetime.date): The first date of the range.
+        days (int): How many days to precompute.
+    """
+    for offset in range(days):
+        date = start + datetime.timedelta(days=offset)
+        _gmst0_table[date.toordinal()] = 6.697374558 + 0.06570982441908 * (julian_date(date.year, date.month, date.day) - J2000)
+
+def clear_gmst_table():
+    _gmst0_table.clear()
+    gmst.cache_clear()
+
+def gmst_at(moment):
+    """
+    Calculate the Greenwich Mean Sidereal Time (GMST) at a moment.
+
+    Args:
+        moment (datetime.datetime): A naive UT date and time.
+
+    Returns:
+        float: GMST in hours, within 0-24.
+    """
+    hours = moment.hour + moment.minute / 60 + (moment.second + moment.microsecond / 1e6) / 3600
+    centuries = (julian_date(moment.year, moment.month, moment.day) + hours / 24 - J2000) / 36525
+    return (_gmst0(moment.date()) + SIDEREAL_RATE * hours + 0.000026 * centuries ** 2) % 24
+
+@lru_cache(maxsize=4096)
+def gmst(date, time):
+    """
+    Calculate the Greenwich Mean Sidereal Time (GMST), memoized by date and second.
+
+    Args:
+        date (str): UT date in 'YYYY-MM-DD' format.
+        time (str): UT time in 'HH:MM:SS' format.
+
+    Returns:
+        float: GMST in hours, within 0-24.
+    """
+    year, month, day = (int(part) for part in date.split('-'))
+    hour, minute, second = (int(part) for part in time.split(':'))
+    return gmst_at(datetime.datetime(year, month, day, hour, minute, second))
+
+def lst(gmst_hours, long):
+    """
+    Calculate the Local Sidereal Time (LST).
+
+    Args:
+        gmst_hours (float): GMST in hours.
+        long (float): The longitude of the location in degrees.
+
+    Returns:
+        float: LST in hours, within 0-24.
+    """
+    return (gmst_hours + long / 15) % 24
@@ -0,0 +1,174 @@
+import hashlib
+import struct
+import threading
+import numpy as np
+from django.conf import settings
+from mainApp.engine import equatorial_to_horizontal_many
+
+# Which constellations can be above the horizon depends on latitude and local sidereal time only. The index
+# splits both into buckets and stores, for every (lat, LST) cell, a bitset of the constellations that may be
+# visible somewhere in the cell. A lookup is one memory-mapped read; exact az/alt are then computed for
+# those candidates only.
+#
+# Moving the observer by dlat degrees of latitude or dlst hours of sidereal time moves the zenith, and so
+# every altitude, by at most dlat + 15 * dlst degrees. A constellation is marked in a cell if its altitude at
+# the cell center is above minus that distance to the corners, so the bitset is a superset of the visible ones.
+
+SKY_INDEX_DEFAULTS = {
+    'PATH': None,
+    # cell size in degrees of latitude
+    'LAT_STEP': 0.5,
+    # cell size in minutes of sidereal time
+    'LST_STEP': 4,
+}
+
+MAGIC = b'SKYIDX\x00\x01'
+# magic, number of constellations, lat step (degrees), LST step (hours), lat buckets, LST buckets, catalog digest
+HEADER = struct.Struct('<8sIddII16s')
+
+def sky_index_conf():
+    return {**SKY_INDEX_DEFAULTS, **getattr(settings, 'SKY_INDEX', {})}
+
+def catalog_digest(catalog):
+    """
+    Fingerprint of the ids and coordinates of a catalog, an index only serves the catalog it was built from.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.array([elem['constell_id'] for elem in catalog], dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(catalog.ra, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(catalog.dec, dtype=np.float64).tobytes())
+    return digest.digest()
+
+def build_sky_index(catalog, lat_step, lst_step, chunk=32):
+    """
+    Compute the candidate bitsets of every cell.
+
+    Args:
+        catalog (Catalog): The constellations to index.
+        lat_step (float): Height of a cell in degrees of latitude.
+        lst_step (float): Width of a cell in hours of sidereal time.
+        chunk (int): Latitude rows computed at once, bounds the memory used by the intermediate arrays.
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (lat buckets, LST buckets, bytes per bitset).
+    """
+    n_lat = int(np.ceil(180 / lat_step))
+    n_lst = int(np.ceil(24 / lst_step))
+    lat_centers = -90 + (np.arange(n_lat) + 0.5) * lat_step
+    lst_centers = (np.arange(n_lst) + 0.5) * lst_step
+    margin = lat_step / 2 + lst_step * 15 / 2 + 1e-9
+
+    bits = np.empty((n_lat, n_lst, (len(catalog) + 7) // 8), dtype=np.uint8)
+    for start in range(0, n_lat, chunk):
+        lat = lat_centers[start:start + chunk, np.newaxis, np.newaxis]
+        _, alt = equatorial_to_horizontal_many(catalog.ra, catalog.dec, lat, lst_centers[np.newaxis, :, np.newaxis])
+        bits[start:start + chunk] = np.packbits(alt > -margin, axis=-1)
+    return bits
+
+def write_sky_index(path, catalog, lat_step, lst_step):
+    """
+    Build the index of a catalog and write it to a file.
+
+    Returns:
+        SkyIndex: The index, memory-mapped from the written file.
+    """
+    bits = build_sky_index(catalog, lat_step, lst_step)
+    n_lat, n_lst, _ = bits.shape
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(catalog), lat_step, lst_step, n_lat, n_lst, catalog_digest(catalog)))
+        f.write(bits.tobytes())
+    return SkyIndex(path)
+
+class SkyIndex():
+    """
+    Read-only, memory-mapped visibility index written by write_sky_index().
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} is not a sky index")
+        magic, self.count, self.lat_step, self.lst_step, self.n_lat, self.n_lst, self.digest = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a sky index")
+        self.path = path
+        # a plain ndarray view of the mapping, indexing a np.memmap subclass is several times slower
+        self.bits = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size,
+                              shape=(self.n_lat, self.n_lst, (self.count + 7) // 8)).view(np.ndarray)
+        # the last catalog checked and the result, so the digest is computed once per catalog
+        self._checked = (None, False)
+
+    def matches(self, catalog):
+        checked, matches = self._checked
+        if catalog is not checked:
+            matches = len(catalog) == self.count and catalog_digest(catalog) == self.digest
+            self._checked = (catalog, matches)
+        return matches
+
+    def candidates(self, lat, lst):
+        """
+        Indices (in catalog order) of the constellations that may be visible.
+
+        Args:
+            lat (float): The latitude of the location in degrees, within -90..90.
+            lst (float): The Local Sidereal Time (LST) in hours.
+
+        Returns:
+            numpy.ndarray: Sorted indices into the catalog records.
+        """
+        lat_bucket = min(int((lat + 90) / self.lat_step), self.n_lat - 1)
+        lst_bucket = int((lst % 24) / self.lst_step) % self.n_lst
+        return np.flatnonzero(np.unpackbits(self.bits[lat_bucket, lst_bucket], count=self.count))
+
+    @property
+    def size(self):
+        return HEADER.size + self.bits.nbytes
+
+_lock = threading.Lock()
+_index = None
+_loaded = False
+
+def get_sky_index():
+    """
+    Get the index at settings.SKY_INDEX['PATH'], mapping it on first use.
+
+    Returns:
+        SkyIndex: The index, or None if no path is configured or the file wasn't built.
+    """
+    global _index, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                path = sky_index_conf()['PATH']
+                if path is not None:
+                    try:
+                        _index = SkyIndex(path)
+                    except FileNotFoundError:
+                        pass
+                    except (OSError, ValueError) as exc:
+                        print(f"Unable to load the sky index, computing visibility of every constellation: {exc!r}")
+                _loaded = True
+    return _index
+
+def reset_sky_index():
+    """
+    Forget the mapped index, the next get_sky_index() call maps the file again (e.g. after a rebuild).
+    """
+    global _index, _loaded
+    with _lock:
+        _index = None
+        _loaded = False
+
+def visible_candidates(catalog, lat, lst):
+    """
+    Look up the constellations of a catalog that may be visible.
+
+    Returns:
+        numpy.ndarray: Indices into the catalog records, or None if there is no usable index for this catalog
+        and every constellation has to be checked.
+    """
+    index = get_sky_index()
+    if index is None or not -90 <= lat <= 90 or not index.matches(catalog):
+        return None
+    return index.candidates(lat, lst)
@@ -0,0 +1,305 @@
+import csv
+import math
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import PyMongoError
+from mainApp import pools
+from mainApp.catalog import CATALOG_DEFAULTS, read_catalog_version
+from mainApp.engine import equatorial_to_horizontal_many
+from mainApp.instrumentation import timed
+
+# Star-level catalogs (bright stars, Messier/NGC objects...) with thousands to hundreds of thousands of
+# entries. They are imported from a CSV file into a bulk MongoDB collection and served from an in-memory
+# index of declination bands: objects are sorted by band and by right ascension inside a band, so a query
+# only computes the bands (and RA ranges) its region can reach.
+
+STARS_DEFAULTS = {
+    'COLLECTION': 'stars',
+    # degrees of declination per band
+    'BAND_HEIGHT': 1.0,
+    # documents per insert_many
+    'BATCH_SIZE': 5000,
+    # most objects returned by a query, brightest first
+    'MAX_RESULTS': 10000,
+}
+
+def stars_conf():
+    return {**STARS_DEFAULTS, **getattr(settings, 'STARS', {})}
+
+def _unit_vectors(ra, dec):
+    # ra in hours, dec in degrees
+    ra, dec = np.radians(ra * 15), np.radians(dec)
+    return np.column_stack((np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)))
+
+class StarIndex():
+    """
+    In-memory declination-band index of a star catalog.
+    """
+
+    def __init__(self, star_ids, names, ra, dec, mag, band_height=1.0):
+        """
+        Args:
+            star_ids (list): Ids of the objects.
+            names (list): Names of the objects, None for unnamed ones.
+            ra (list): Right ascensions in hours.
+            dec (list): Declinations in degrees.
+            mag (list): Visual magnitudes, NaN where unknown.
+            band_height (float): Degrees of declination per band.
+        """
+        ra = np.asarray(ra, dtype=np.float64) % 24
+        dec = np.asarray(dec, dtype=np.float64)
+        self.band_height = band_height
+        self.n_bands = int(math.ceil(180 / band_height))
+        bands = np.minimum(((dec + 90) / band_height).astype(np.int64), self.n_bands - 1)
+        order = np.lexsort((ra, bands))
+        self.ra = ra[order]
+        self.dec = dec[order]
+        self.mag = np.asarray(mag, dtype=np.float64)[order]
+        self.star_ids = [star_ids[i] for i in order.tolist()]
+        self.names = [names[i] for i in order.tolist()]
+        self.xyz = _unit_vectors(self.ra, self.dec)
+        # objects of band b are self.ra[band_starts[b]:band_starts[b + 1]], sorted by RA
+        self.band_starts = np.searchsorted(bands[order], np.arange(self.n_bands + 1))
+
+    def __len__(self):
+        return len(self.ra)
+
+    def _band(self, dec):
+        return min(max(int((dec + 90) / self.band_height), 0), self.n_bands - 1)
+
+    def _dec_slice(self, dec_min, dec_max):
+        # bands are contiguous, so a declination range is a single slice
+        return self.band_starts[self._band(dec_min)], self.band_starts[self._band(dec_max) + 1]
+
+    def _ra_ranges(self, band, ra, half_width):
+        # index ranges of band whose RA is within half_width hours of ra, wrapping around 0h
+        start, end = self.band_starts[band], self.band_starts[band + 1]
+        if half_width >= 12:
+            return [(start, end)]
+        band_ra = self.ra[start:end]
+        low, high = ra - half_width, ra + half_width
+        ranges = [(start + np.searchsorted(band_ra, max(low, 0)), start + np.searchsorted(band_ra, min(high, 24), side='right'))]
+        if low < 0:
+            ranges.append((start + np.searchsorted(band_ra, low + 24), end))
+        if high > 24:
+            ranges.append((start, start + np.searchsorted(band_ra, high - 24, side='right')))
+        return ranges
+
+    def _filter_mag(self, indices, max_mag):
+        if max_mag is None:
+            return indices
+        return indices[self.mag[indices] <= max_mag]
+
+    @timed('compute.stars_above_horizon')
+    def above_horizon(self, lat, lst, min_alt=0.0, max_mag=None):
+        """
+        Objects above an altitude for an observer, with the same rule as the constellations' visible_mask.
+
+        Only the declination bands that can reach above min_alt at this latitude are computed.
+
+        Args:
+            lat (float): The latitude of the location in degrees.
+            lst (float): The Local Sidereal Time (LST) in hours.
+            min_alt (float): Minimum altitude in degrees.
+            max_mag (float): Only objects at least this bright, None for all.
+
+        Returns:
+            tuple (numpy.ndarray, numpy.ndarray, numpy.ndarray): Indices of the objects, their azimuths and altitudes.
+        """
+        radius = 90 - min_alt
+        start, end = self._dec_slice(lat - radius, lat + radius)
+        zenith = _unit_vectors(np.array([lst]), np.array([lat]))[0]
+        # angular distance from the zenith below 90 - min_alt, with some slack for rounding
+        candidates = start + np.flatnonzero(self.xyz[start:end] @ zenith > math.sin(math.radians(min_alt)) - 1e-9)
+        candidates = self._filter_mag(candidates, max_mag)
+        az, alt = equatorial_to_horizontal_many(self.ra[candidates], self.dec[candidates], lat, lst)
+        mask = (az > 0) & (alt > min_alt)
+        return candidates[mask], az[mask], alt[mask]
+
+    @timed('compute.stars_cone')
+    def cone(self, ra, dec, radius, max_mag=None):
+        """
+        Objects within a field of view.
+
+        Args:
+            ra (float): Right ascension of the center in hours.
+            dec (float): Declination of the center in degrees.
+            radius (float): Radius of the field in degrees.
+            max_mag (float): Only objects at least this bright, None for all.
+
+        Returns:
+            tuple (numpy.ndarray, numpy.ndarray): Indices of the objects sorted by separation, and the separations in degrees.
+        """
+        ranges = []
+        for band in range(self._band(dec - radius), self._band(dec + radius) + 1):
+            band_low = -90 + band * self.band_height
+            farthest = max(abs(band_low), abs(band_low + self.band_height))
+            if farthest + radius >= 90 or abs(dec) + radius >= 90:
+                half_width = 12
+            else:
+                # widest RA offset of a point within radius, at the band's edge nearest to a pole
+                half_width = math.degrees(math.asin(min(1.0, math.sin(math.radians(radius)) / math.cos(math.radians(farthest))))) / 15
+            ranges.extend(self._ra_ranges(band, ra % 24, half_width))
+        ranges = [(start, end) for start, end in ranges if end > start]
+        if not ranges:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        candidates = np.concatenate([np.arange(start, end) for start, end in ranges])
+        candidates = self._filter_mag(candidates, max_mag)
+        center = _unit_vectors(np.array([ra]), np.array([dec]))[0]
+        separation = np.degrees(np.arccos(np.clip(self.xyz[candidates] @ center, -1.0, 1.0)))
+        mask = separation <= radius
+        candidates, separation = candidates[mask], separation[mask]
+        order = np.argsort(separation, kind='stable')
+        return candidates[order], separation[order]
+
+def _number(value):
+    value = (value or '').strip()
+    return float(value) if value else None
+
+def read_star_csv(path, id_col='id', name_col='proper', mag_col='mag', ra_unit='hours'):
+    """
+    Read objects from a CSV file with a header row (HYG database column names by default).
+
+    Args:
+        path (str): The CSV file.
+        id_col (str): Column with the object id, the row number if the file has no such column.
+        name_col (str): Column with the name.
+        mag_col (str): Column with the visual magnitude.
+        ra_unit (str): 'hours' or 'degrees', unit of the 'ra' column. 'dec' is always in degrees.
+
+    Yields:
+        dict: {'star_id', 'name', 'ra' (hours), 'dec', 'mag'} for every row with coordinates.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        for number, row in enumerate(csv.DictReader(f), start=1):
+            ra, dec = _number(row.get('ra')), _number(row.get('dec'))
+            if ra is None or dec is None:
+                continue
+            if ra_unit == 'degrees':
+                ra /= 15
+            star_id = (row.get(id_col) or '').strip() or number
+            yield {
+                'star_id': int(star_id) if str(star_id).isdigit() else star_id,
+                'name': (row.get(name_col) or '').strip() or None,
+                'ra': ra % 24,
+                'dec': dec,
+                'mag': _number(row.get(mag_col)),
+            }
+
+def import_stars(objects, replace=False, batch_size=None):
+    """
+    Bulk-insert objects into the stars collection and bump its version, so workers reload their index.
+
+    Args:
+        objects (iterable): Documents as yielded by read_star_csv.
+        replace (bool): Drop the current objects first.
+        batch_size (int): Documents per insert_many, settings.STARS['BATCH_SIZE'] by default.
+
+    Returns:
+        int: Number of inserted documents.
+    """
+    conf = stars_conf()
+    batch_size = batch_size or conf['BATCH_SIZE']
+    collection = pools.get_mongo_collection(conf['COLLECTION'])
+    if replace:
+        collection.drop()
+    inserted = 0
+    batch = []
+    for elem in objects:
+        batch.append(elem)
+        if len(batch) >= batch_size:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+            batch = []
+    if batch:
+        inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+    collection.create_index([('star_id', ASCENDING)])
+    bump_stars_version()
+    return inserted
+
+def bump_stars_version():
+    meta = pools.get_mongo_collection('catalog_meta').find_one_and_update({'_id': 'stars'},
+                                                                          {'$inc': {'version': 1}},
+                                                                          upsert=True,
+                                                                          return_document=ReturnDocument.AFTER)
+    invalidate_star_index()
+    return meta['version']
+
+def load_star_index():
+    """
+    Build the index from the stars collection.
+    """
+    conf = stars_conf()
+    docs = list(pools.get_mongo_collection(conf['COLLECTION']).find({}, {'_id': 0, 'star_id': 1, 'name': 1, 'ra': 1, 'dec': 1, 'mag': 1}))
+    return StarIndex([elem['star_id'] for elem in docs],
+                     [elem.get('name') for elem in docs],
+                     [elem['ra'] for elem in docs],
+                     [elem['dec'] for elem in docs],
+                     [np.nan if elem.get('mag') is None else elem['mag'] for elem in docs],
+                     conf['BAND_HEIGHT'])
+
+_lock = threading.Lock()
+_index = None
+_version = None
+_checked_at = 0.0
+
+def invalidate_star_index():
+    global _index, _version, _checked_at
+    with _lock:
+        _index = None
+        _version = None
+        _checked_at = 0.0
+
+def get_star_index():
+    """
+    Get the star index of this worker, loading it on first use and reloading it when the stars version in
+    MongoDB changes, checked like the constellation catalog's.
+
+    Returns:
+        StarIndex: The current index.
+    """
+    global _index, _version, _checked_at
+    interval = {**CATALOG_DEFAULTS, **getattr(settings, 'CATALOG', {})}['VERSION_CHECK_INTERVAL']
+    index = _index
+    if index is not None and time.monotonic() - _checked_at < interval:
+        return index
+    with _lock:
+        if _index is not None and time.monotonic() - _checked_at < interval:
+            return _index
+        try:
+            version = read_catalog_version('stars')
+        except PyMongoError:
+            if _index is None:
+                raise
+            _checked_at = time.monotonic()
+            return _index
+        if _index is None or _version != version:
+            _index = load_star_index()
+            _version = version
+        _checked_at = time.monotonic()
+        return _index
+
+def star_columns(index, indices, limit):
+    """
+    Columnar JSON-serializable description of query results, brightest first.
+
+    Args:
+        index (StarIndex): The index queried.
+        indices (numpy.ndarray): Result of the query.
+        limit (int): Most objects to return.
+
+    Returns:
+        tuple (dict, numpy.ndarray): 'star_ids', 'names' and 'mag' lists (None for unknown magnitudes),
+        and the positions of the returned objects within indices.
+    """
+    # NaN magnitudes sort last
+    order = np.argsort(index.mag[indices], kind='stable')[:limit]
+    chosen = indices[order].tolist()
+    mag = index.mag[indices[order]]
+    return {
+        'star_ids': [index.star_ids[i] for i in chosen],
+        'names': [index.names[i] for i in chosen],
+        'mag': [None if math.isnan(value) else value for value in mag.tolist()],
+    }, order
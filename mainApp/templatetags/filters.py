@@ -1,5 +1,7 @@
 from django import template
-from mainApp import visibleConstell
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from mainApp import images, visibleConstell
 
 register = template.Library()
 
@@ -11,4 +13,26 @@ def replace(value, args):
 
 @register.filter
 def is_VisibleConstell(value):
-    return isinstance(value,visibleConstell.VisibleConstell)
\ No newline at end of file
+    return isinstance(value,visibleConstell.VisibleConstell)
+
+@register.simple_tag
+def constell_picture(name, sizes='18rem', css_class='card-img-top', loading='lazy'):
+    """
+    <picture> of a constellation with AVIF/WebP/PNG srcsets from the build_images manifest,
+    or the original PNG if the images weren't built.
+    """
+    stem = name.replace(' ', '_')
+    manifest = images.get_manifest()
+    entry = manifest['images'].get(stem) if manifest is not None else None
+    if entry is None:
+        return format_html('<img src="{}" class="{}" alt="{}" loading="{}" decoding="async">',
+                           static(f'constells/{stem}.png'), css_class, name, loading)
+
+    def srcset(fmt):
+        return ', '.join(f"{static(variant['file'])} {variant['width']}w" for variant in entry['variants'][fmt])
+
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">',
+                               ((images.MIME_TYPES[fmt], srcset(fmt), sizes) for fmt in manifest['formats'] if fmt != 'png'))
+    fallback = entry['variants']['png']
+    return format_html('<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" alt="{}" loading="{}" decoding="async"></picture>',
+                       sources, static(fallback[0]['file']), srcset('png'), sizes, entry['width'], entry['height'], css_class, name, loading)
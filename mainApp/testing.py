@@ -0,0 +1,114 @@
+import bson
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from django.conf import settings
+
+# Stand-ins for MongoDB data and Wikipedia shared by the tests and the benchmarks.
+
+def load_dump():
+    """
+    Load the constellations collection from the mongorestore dump shipped with the repo.
+    """
+    with open(settings.BASE_DIR / 'dump' / 'constellations.bson', 'rb') as f:
+        constells = bson.decode_all(f.read())
+    for elem in constells:
+        elem['_id'] = str(elem['_id'])
+    return sorted(constells, key=lambda elem: elem['constell_id'])
+
+TESTDATA = settings.BASE_DIR / 'mainApp' / 'testdata'
+
+# what the stub serves for every border image
+STUB_IMAGE = b'\x89PNG\r\n\x1a\n' + b'stub border image' * 16
+# revision id of the pages unless StubWikipedia is given others
+STUB_REVID = 1000
+
+class StubWikipediaHandler(BaseHTTPRequestHandler):
+    """
+    Answers like Wikipedia with the saved Orion pages, whatever page is asked for. Files of imageinfo
+    queries resolve to /upload/ urls of the stub, which serve STUB_IMAGE, info queries answer with the
+    revision ids of server.revids.
+    """
+
+    def info(self, titles):
+        normalized = [{'from': title, 'to': title.replace('_', ' ')} for title in titles.split('|') if '_' in title]
+        pages = [{'title': title.replace('_', ' '), 'lastrevid': self.server.revids.get(title, STUB_REVID)}
+                 for title in titles.split('|')]
+        return {'query': {'normalized': normalized, 'pages': pages}}
+
+    def imageinfo(self, titles):
+        base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        pages = [{'title': title, 'imageinfo': [{
+            'url': f"{base}/upload/{quote(title.split(':', 1)[1])}",
+            'thumburl': f"{base}/upload/thumb/512px-{quote(title.split(':', 1)[1])}.png",
+        }]} for title in titles.split('|')]
+        return {'query': {'pages': pages}}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path != '/w/api.php':
+            page = unquote(url.path)
+        elif query.get('action') == ['query']:
+            page = f"{query['prop'][0]}:{query['titles'][0]}"
+        else:
+            page = query['page'][0]
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.requests.append(page)
+            pending = self.server.statuses.get(page)
+            status = pending.pop(0) if pending else 200
+        if status != 200:
+            body, content_type = b'{}', 'application/json'
+        elif page.startswith('imageinfo:'):
+            body, content_type = json.dumps(self.imageinfo(query['titles'][0])).encode(), 'application/json'
+        elif page.startswith('info:'):
+            body, content_type = json.dumps(self.info(query['titles'][0])).encode(), 'application/json'
+        elif url.path.startswith('/upload/'):
+            body, content_type = STUB_IMAGE, 'image/png'
+        elif url.path == '/w/api.php':
+            body = json.dumps({'parse': {'title': page, 'revid': self.server.revids.get(page, STUB_REVID),
+                                         'text': {'*': (TESTDATA / 'wiki_orion.html').read_text()}}}).encode()
+            content_type = 'application/json'
+        else:
+            body, content_type = (TESTDATA / 'wiki_orion_file.html').read_bytes(), 'text/html'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class StubWikipedia():
+    """
+    Local Wikipedia stand-in running in a background thread, use as a context manager.
+
+    statuses maps a page title (or a file page path) to the status codes of its next responses, revids a page
+    title to its current revision id. delay is slept before every answer, like the round trip to Wikipedia.
+    """
+
+    def __init__(self, statuses=None, revids=None, delay=0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubWikipediaHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.statuses = statuses or {}
+        self.server.revids = revids or {}
+        self.server.delay = delay
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,3 +1,1392 @@
-from django.test import TestCase
+import asyncio
+import httpx
+import datetime
+import gzip
+import hashlib
+import json
+import numpy as np
+import os
+import subprocess
+import sys
+import threading
+import redis
+import tempfile
+import time
+from decimal import Decimal, getcontext, localcontext
+from unittest import mock, skipUnless
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import CommandError, call_command
+from django.template import Context, Template
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, SimpleTestCase
+from django.utils.http import http_date
+from mainApp import api, asyncMiddleware, asyncViews, borders, catalog, engine, httpcache, images, instrumentation, pools, responses, sidereal, skyIndex, stars, tracking, views, warmup, wiki
+from mainApp.cache import ConstellCache, LocMemStore, SessionCache
+from mainApp.testing import STUB_IMAGE, STUB_REVID, TESTDATA, StubWikipedia, load_dump
+from asgiref import sync
+from pymongo.errors import PyMongoError
 
-# Create your tests here.
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+def use_dump_catalog(testcase):
+    """
+    Serve the in-process catalog from the dump, without reaching MongoDB or Redis.
+    """
+    catalog.invalidate_catalog()
+    testcase.addCleanup(catalog.invalidate_catalog)
+    for target, kwargs in (('mainApp.catalog.read_catalog_version', {'return_value': 0}),
+                           ('mainApp.catalog.load_catalog', {'side_effect': lambda version: catalog.Catalog(load_dump(), version)})):
+        patcher = mock.patch(target, **kwargs)
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
+
+def use_fake_redis(testcase):
+    """
+    Point the Redis pool at a fresh in-memory server.
+    """
+    server = fakeredis.FakeRedis(decode_responses=True)
+    patcher = mock.patch('mainApp.pools.get_redis', return_value=server)
+    patcher.start()
+    testcase.addCleanup(patcher.stop)
+    return server
+
+def use_border_store(testcase, **conf):
+    """
+    Mirror border images into a temporary directory.
+    """
+    tmp = tempfile.TemporaryDirectory()
+    testcase.addCleanup(tmp.cleanup)
+    override = testcase.settings(BORDERS={'ROOT': tmp.name, **conf})
+    override.enable()
+    testcase.addCleanup(override.disable)
+    return tmp.name
+
+STUB_BORDER = f'/borders/{hashlib.sha256(STUB_IMAGE).hexdigest()}.png'
+# the stub resolves every file page to this thumbnail
+STUB_REQUESTS = ['Orion_(constellation)', 'imageinfo:File:Orion IAU.svg', '/upload/thumb/512px-Orion IAU.svg.png']
+
+ORION_SCRAPED = {
+    'shortdesc': 'Constellation on the celestial equator',
+    'symbolism': 'The Hunter',
+    'neighbours': '<ul><li>Gemini</li><li>Taurus</li><li>Eridanus</li><li>Lepus</li><li>Monoceros</li>',
+    'visibility': 'Visible at latitudes between +85° and −75°.Best visible at 21:00 (9 p.m.) during the month of January.',
+    'flavor_text': 'Orion is a prominent set of stars visible during winter in the northern celestial sphere. '
+                   'It is one of the 88 modern constellations; it was among the 48 constellations listed by the '
+                   '2nd-century astronomer Ptolemy. It is named after a hunter in Greek mythology. Orion is most prominent during',
+    'border_img': '//upload.wikimedia.org/wikipedia/commons/thumb/0/0b/Orion_IAU.svg/512px-Orion_IAU.svg.png',
+}
+# what scraping the stub gives
+STUB_SCRAPED = {**ORION_SCRAPED, 'border_img': STUB_BORDER, 'revid': STUB_REVID}
+
+def are_visible_many_scalar(lat, lst, constells):
+    # the original per-constellation Decimal loop, kept as a reference for parity checks
+    visible = []
+    with localcontext() as ctx:
+        ctx.prec = 10
+        for elem in constells:
+            ra = Decimal(elem['ra'])
+            dec = Decimal(elem['dec'])
+            az, alt = api.equatorial_to_horizontal(ra, dec, lat, lst)
+            if az > 0 and alt > 0:
+                visible.append((elem['name'], round(az, 3), round(alt, 3)))
+    return visible
+
+class VisibilityEngineTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.constells = load_dump()
+
+    def test_parity_with_scalar_path(self):
+        for lat in ('-89.5', '-45.25', '0.0', '12.5', '55.75', '89.9'):
+            for lst in ('0.0', '3.3', '7.25', '12.0', '18.9', '23.999'):
+                with self.subTest(lat=lat, lst=lst):
+                    expected = are_visible_many_scalar(Decimal(lat), Decimal(lst), self.constells)
+                    visible = api.are_visible_many(Decimal(lat), Decimal(lst), self.constells)
+                    self.assertEqual([v.db_info['name'] for v in visible], [name for name, _, _ in expected])
+                    for v, (_, az, alt) in zip(visible, expected):
+                        self.assertAlmostEqual(v.az, az, delta=1e-3)
+                        self.assertAlmostEqual(v.alt, alt, delta=1e-3)
+
+    def test_results_keep_rounding_and_documents(self):
+        visible = api.are_visible_many(Decimal('55.75'), Decimal('5.5'), self.constells)
+        self.assertTrue(visible)
+        for v in visible:
+            self.assertIsInstance(v.az, float)
+            self.assertEqual(v.az, round(v.az, 3))
+            self.assertEqual(v.alt, round(v.alt, 3))
+            self.assertGreater(v.alt, 0)
+            self.assertIn(v.db_info, self.constells)
+
+    def test_results_are_compact_and_serializable(self):
+        visible = api.are_visible_many(Decimal('55.75'), Decimal('5.5'), self.constells)
+        orion = next(v for v in visible if v.name == 'Orion')
+        self.assertFalse(hasattr(orion, '__dict__'))
+        self.assertIs(orion.db_info, next(elem for elem in self.constells if elem['name'] == 'Orion'))
+        self.assertEqual(json.loads(json.dumps(orion.to_dict())), {'constell_id': 60, 'name': 'Orion', 'az': orion.az, 'alt': orion.alt})
+
+class VisibleGridTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.constells = load_dump()
+
+    def setUp(self):
+        use_dump_catalog(self)
+
+    def test_grid_matches_single_observer_path(self):
+        sites = [(37.6173, 55.7558), (-70.4, -24.6), (151.2, -33.9)]
+        timestamps = [datetime.datetime(2023, 11, 4, 21, 30, 0), datetime.datetime(2024, 6, 21, 3, 15, 42)]
+        grid = api.get_visible_grid(sites, timestamps)
+        self.assertEqual(grid['az'].shape, (3, 2, 88))
+        for i, (long, lat) in enumerate(sites):
+            for j, moment in enumerate(timestamps):
+                gmst = api.calculate_GMST_alt(moment.strftime('%H:%M:%S'), moment.strftime('%Y-%m-%d'))
+                lst = api.calculate_lst(gmst, Decimal(str(long)))
+                expected = api.are_visible_many(Decimal(str(lat)), lst, self.constells)
+                names = [elem['name'] for elem, seen in zip(self.constells, grid['visible'][i, j]) if seen]
+                self.assertEqual(names, [v.db_info['name'] for v in expected])
+
+    def test_batch_endpoint(self):
+        body = {'sites': [[37.6173, 55.7558], [-70.4, -24.6]], 'timestamps': ['2023-11-04T21:30:00', '2023-11-05T00:30:00+03:00']}
+        response = self.client.post('/api/get_visible_batch/', json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['constells']), 88)
+        self.assertEqual(data['timestamps'], ['2023-11-04T21:30:00', '2023-11-04T21:30:00'])
+        self.assertEqual(data['visible'][0][0], data['visible'][0][1])
+        self.assertNotIn('az', data)
+        grid = api.get_visible_grid([(-70.4, -24.6)], [datetime.datetime(2023, 11, 4, 21, 30)])
+        self.assertEqual(data['visible'][1][0], np.flatnonzero(grid['visible'][0, 0]).tolist())
+        body['positions'] = True
+        data = self.client.post('/api/get_visible_batch/', json.dumps(body), content_type='application/json').json()
+        self.assertEqual(len(data['alt'][1][0]), len(data['visible'][1][0]))
+        self.assertEqual(data['az'][1][0][0], round(float(grid['az'][0, 0, data['visible'][1][0][0]]), 3))
+        self.assertTrue(all(alt > 0 for alt in data['alt'][1][0]))
+
+    def test_batch_endpoint_rejects_bad_input(self):
+        for body in ({'sites': [[200, 10]], 'timestamps': ['2023-11-04T21:30:00']},
+                     {'sites': [[20, 10]], 'timestamps': []},
+                     {'sites': [[20, 10]], 'timestamps': ['yesterday']},
+                     {'sites': [[20, 10]], 'timestamps': ['2023-11-04T21:30:00'], 'positions': 'yes'},
+                     # 10001 cells of the 88 constellations
+                     {'sites': [[20, 10]] * 10001, 'timestamps': ['2023-11-04T21:30:00']}):
+            response = self.client.post('/api/get_visible_batch/', json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/get_visible_batch/').status_code, 405)
+
+class SkyIndexTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.catalog = catalog.Catalog(load_dump())
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = f'{tmp.name}/skyindex.bin'
+        skyIndex.reset_sky_index()
+        self.addCleanup(skyIndex.reset_sky_index)
+
+    def test_candidates_contain_every_visible_constellation(self):
+        # coarse cells make the margin matter
+        index = skyIndex.write_sky_index(self.path, self.catalog, 5, 0.5)
+        self.assertEqual(index.bits.shape, (36, 48, 11))
+        rng = np.random.default_rng(0)
+        for lat, lst in zip(rng.uniform(-90, 90, 500), rng.uniform(0, 24, 500)):
+            visible = {self.catalog.records.index(v.db_info) for v in api.are_visible_many(lat, lst, self.catalog.records)}
+            self.assertLessEqual(visible, set(index.candidates(lat, lst)))
+        self.assertLess(len(index.candidates(89.9, 0)), len(self.catalog))
+
+    def test_session_lookup_matches_full_computation(self):
+        skyIndex.write_sky_index(self.path, self.catalog, 0.5, 4 / 60)
+        expected = [api.are_visible_many(lat, lst, self.catalog.records) for lat, lst in ((55.75, 3.25), (-33.9, 20.1), (90, 23.999))]
+        with self.settings(SKY_INDEX={'PATH': self.path}):
+            self.assertIsNotNone(skyIndex.visible_candidates(self.catalog, 55.75, 3.25))
+            for (lat, lst), visible in zip(((55.75, 3.25), (-33.9, 20.1), (90, 23.999)), expected):
+                result = api.are_visible_many(lat, lst, self.catalog)
+                self.assertEqual([(v.db_info['name'], v.az, v.alt) for v in result],
+                                 [(v.db_info['name'], v.az, v.alt) for v in visible])
+
+    def test_index_of_another_catalog_is_ignored(self):
+        skyIndex.write_sky_index(self.path, self.catalog, 10, 1)
+        moved = catalog.Catalog([{**elem, 'dec': elem['dec'] + 1} for elem in self.catalog])
+        with self.settings(SKY_INDEX={'PATH': self.path}):
+            self.assertIsNone(skyIndex.visible_candidates(moved, 55.75, 3.25))
+            self.assertEqual(len(api.are_visible_many(55.75, 3.25, moved)), len(api.are_visible_many(55.75, 3.25, moved.records)))
+        with self.settings(SKY_INDEX={'PATH': f'{self.path}.missing'}):
+            skyIndex.reset_sky_index()
+            self.assertIsNone(skyIndex.get_sky_index())
+
+class StarIndexTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(1)
+        size = 20000
+        # the poles and 0h get objects of their own, the edge cases of bands and RA ranges
+        ra = np.concatenate((rng.uniform(0, 24, size), [0.0, 23.9999, 6.0, 18.0]))
+        dec = np.concatenate((np.degrees(np.arcsin(rng.uniform(-1, 1, size))), [0.0, -0.5, 90.0, -90.0]))
+        mag = np.concatenate((rng.uniform(-1, 12, size), [np.nan, 3.0, 2.0, 5.0]))
+        cls.index = stars.StarIndex(list(range(len(ra))), [None] * len(ra), ra, dec, mag)
+
+    def brute_force_cone(self, ra, dec, radius):
+        center = stars._unit_vectors(np.array([ra]), np.array([dec]))[0]
+        separation = np.degrees(np.arccos(np.clip(self.index.xyz @ center, -1.0, 1.0)))
+        return set(np.flatnonzero(separation <= radius).tolist())
+
+    def test_above_horizon_matches_full_computation(self):
+        for lat, lst, min_alt in ((55.75, 3.25, 0), (-33.9, 23.9, 10), (90, 0, 0), (-89.5, 12, 45), (0, 0, -5)):
+            with self.subTest(lat=lat, lst=lst, min_alt=min_alt):
+                indices, az, alt = self.index.above_horizon(lat, lst, min_alt)
+                all_az, all_alt = engine.equatorial_to_horizontal_many(self.index.ra, self.index.dec, lat, lst)
+                self.assertEqual(set(indices.tolist()), set(np.flatnonzero((all_az > 0) & (all_alt > min_alt)).tolist()))
+                np.testing.assert_array_equal(alt, all_alt[indices])
+                np.testing.assert_array_equal(az, all_az[indices])
+
+    def test_cone_matches_full_computation(self):
+        for ra, dec, radius in ((0.01, 0.2, 3), (23.95, -40, 10), (6, 89, 5), (12, -88.5, 2), (5.5, -1, 0.5), (3, 30, 120)):
+            with self.subTest(ra=ra, dec=dec, radius=radius):
+                indices, separation = self.index.cone(ra, dec, radius)
+                self.assertEqual(set(indices.tolist()), self.brute_force_cone(ra, dec, radius))
+                self.assertTrue(np.all(np.diff(separation) >= 0))
+
+    def test_magnitude_filter_and_brightest_first(self):
+        indices, _ = self.index.cone(0, 0, 30, max_mag=4)
+        self.assertTrue(np.all(self.index.mag[indices] <= 4))
+        columns, order = stars.star_columns(self.index, self.index.cone(0, 0, 1)[0], 10)
+        mags = [value for value in columns['mag'] if value is not None]
+        self.assertEqual(mags, sorted(mags))
+        self.assertEqual(len(order), len(columns['star_ids']))
+        self.assertIsNone(columns['mag'][-1])
+
+    def test_read_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('id,proper,ra,dec,mag\n32263,Sirius,101.287,-16.716,-1.44\n,,1.5,2.5,\n7,Nothing,,,\n')
+        self.addCleanup(os.unlink, f.name)
+        self.assertEqual(list(stars.read_star_csv(f.name, ra_unit='degrees')), [
+            {'star_id': 32263, 'name': 'Sirius', 'ra': 101.287 / 15, 'dec': -16.716, 'mag': -1.44},
+            {'star_id': 2, 'name': None, 'ra': 0.1, 'dec': 2.5, 'mag': None},
+        ])
+
+    @skipUnless(mongomock, "mongomock is not installed")
+    def test_imported_objects_are_served_from_the_index(self):
+        db = mongomock.MongoClient().db
+        mock.patch('mainApp.pools.get_mongo_collection', side_effect=lambda name: db[name]).start()
+        self.addCleanup(mock.patch.stopall)
+        stars.invalidate_star_index()
+        self.addCleanup(stars.invalidate_star_index)
+        objects = [{'star_id': 1, 'name': 'Betelgeuse', 'ra': 5.919, 'dec': 7.407, 'mag': 0.45},
+                   {'star_id': 2, 'name': 'Rigel', 'ra': 5.242, 'dec': -8.202, 'mag': 0.13},
+                   {'star_id': 3, 'name': None, 'ra': 17.0, 'dec': -60.0, 'mag': None}]
+        with self.settings(STARS={'BATCH_SIZE': 2}):
+            self.assertEqual(stars.import_stars(iter(objects)), 3)
+        self.assertEqual(len(stars.get_star_index()), 3)
+        self.assertEqual(db.catalog_meta.find_one({'_id': 'stars'})['version'], 1)
+
+        response = self.client.get('/api/stars/cone/', {'ra': '5.5', 'dec': '0', 'radius': '15'})
+        self.assertEqual(response.json()['names'], ['Rigel', 'Betelgeuse'])
+        self.assertEqual(stars.import_stars(objects[:1], replace=True), 1)
+        self.assertEqual(len(stars.get_star_index()), 1)
+
+    def test_endpoints(self):
+        with mock.patch('mainApp.api.get_star_index', return_value=self.index):
+            use_dump_catalog(self)
+            response = self.client.get('/api/stars/visible/', {'long': '37.6173', 'lat': '55.7558', 'time': '21:30',
+                                                               'date': '2023-11-04', 'max_mag': '5', 'limit': '100'})
+            data = response.json()
+            self.assertEqual(data['observation']['utc_time'], '19:30:00')
+            self.assertEqual(len(data['star_ids']), 100)
+            self.assertGreater(data['count'], 100)
+            self.assertTrue(all(alt > 0 for alt in data['alt']))
+            field = self.client.get('/api/stars/cone/', {'ra': '0', 'dec': '0', 'radius': '2'}).json()
+            self.assertEqual(field['count'], len(self.brute_force_cone(0, 0, 2)))
+            self.assertIn(20000, field['star_ids'])
+            for params in ({'ra': '0', 'dec': '0'}, {'ra': '25', 'dec': '0', 'radius': '1'}, {'ra': 'x', 'dec': '0', 'radius': '1'}):
+                with self.subTest(**params):
+                    self.assertEqual(self.client.get('/api/stars/cone/', params).status_code, 400)
+
+class RiseSetTests(SimpleTestCase):
+
+    def setUp(self):
+        use_dump_catalog(self)
+        self.catalog = catalog.get_catalog()
+
+    def altitude(self, elem, moment, long, lat):
+        lst = sidereal.lst(sidereal.gmst_at(datetime.datetime.fromisoformat(moment.rstrip('Z'))), long)
+        _, alt = engine.equatorial_to_horizontal_many(elem['ra'], elem['dec'], lat, lst)
+        return float(alt)
+
+    def test_events_match_the_horizontal_coordinates(self):
+        result = api.calculate_rise_set(self.catalog, 37.6, 55.8, datetime.date(2023, 11, 4))
+        self.assertEqual(result['utc_offset'], 2)
+        self.assertEqual(result['window'], {'start': '2023-11-04T10:00:00Z', 'end': '2023-11-05T10:00:00Z'})
+        self.assertEqual(len(result['constells']), 88)
+        for elem, events in zip(self.catalog, result['constells']):
+            with self.subTest(name=elem['name']):
+                self.assertTrue(result['window']['start'] <= events['transit'] < result['window']['end'])
+                self.assertAlmostEqual(self.altitude(elem, events['transit'], 37.6, 55.8), events['max_alt'], delta=0.01)
+                if events['rise'] is not None:
+                    self.assertLess(events['rise'], events['transit'])
+                    self.assertLess(events['transit'], events['set'])
+                    self.assertAlmostEqual(self.altitude(elem, events['rise'], 37.6, 55.8), 0, delta=0.01)
+                    self.assertAlmostEqual(self.altitude(elem, events['set'], 37.6, 55.8), 0, delta=0.01)
+
+    def test_circumpolar_and_never_rising(self):
+        by_name = {events['name']: events for events in api.calculate_rise_set(self.catalog, 37.6, 55.8, datetime.date(2023, 11, 4))['constells']}
+        self.assertTrue(by_name['Ursa Minor']['circumpolar'])
+        self.assertIsNone(by_name['Ursa Minor']['rise'])
+        self.assertTrue(by_name['Octans']['never_rises'])
+        self.assertLess(by_name['Octans']['max_alt'], 0)
+        self.assertFalse(by_name['Orion']['circumpolar'] or by_name['Orion']['never_rises'])
+
+    def test_endpoint_rounds_the_site(self):
+        with mock.patch('mainApp.pools.get_redis', return_value=None):
+            response = self.client.get('/api/get_rise_set/', {'long': '37.6173', 'lat': '55.7558', 'date': '2023-11-04'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['site'], {'long': 37.6, 'lat': 55.8})
+            for params in ({'long': '37.6', 'lat': '95', 'date': '2023-11-04'},
+                           {'long': '37.6', 'lat': '55.8', 'date': 'tonight'},
+                           {'long': '37.6', 'date': '2023-11-04'}):
+                self.assertEqual(self.client.get('/api/get_rise_set/', params).status_code, 400)
+            self.assertEqual(self.client.post('/api/get_rise_set/', {'long': '37.6', 'lat': '55.8', 'date': '2023-11-04'}).status_code, 405)
+
+    @skipUnless(fakeredis, "fakeredis is not installed")
+    def test_result_is_cached_per_cell(self):
+        server = use_fake_redis(self)
+        first = api.get_rise_set(37.6173, 55.7558, datetime.date(2023, 11, 4))
+        self.assertEqual(server.keys('riseset:*'), ['riseset:0:37.6:55.8:2023-11-04'])
+        with mock.patch('mainApp.api.calculate_rise_set') as calculate:
+            self.assertEqual(api.get_rise_set(37.62, 55.76, datetime.date(2023, 11, 4)), first)
+        calculate.assert_not_called()
+
+class PoolTests(SimpleTestCase):
+
+    def setUp(self):
+        pools.close_pools()
+        self.addCleanup(pools.close_pools)
+
+    def test_mongo_client_is_shared(self):
+        self.assertIs(pools.get_mongo_client(), pools.get_mongo_client())
+        self.assertEqual(api.connect_to_db().name, 'constellations')
+
+    def test_redis_pinged_once_and_reused(self):
+        with mock.patch('redis.Redis.ping', return_value=True) as ping:
+            first, second = api.connect_to_redis(), api.connect_to_redis()
+        self.assertEqual(ping.call_count, 1)
+        self.assertIs(first.connection_pool, second.connection_pool)
+
+    def test_redis_down_is_remembered_for_backoff(self):
+        with mock.patch('redis.Redis.ping', side_effect=redis.ConnectionError) as ping, \
+             mock.patch('mainApp.pools.print'):
+            self.assertIsNone(api.connect_to_redis())
+            self.assertIsNone(api.connect_to_redis())
+        self.assertEqual(ping.call_count, 1)
+        with mock.patch('mainApp.pools.time.monotonic', return_value=time.monotonic() + 3600), \
+             mock.patch('redis.Redis.ping', return_value=True):
+            self.assertIsNotNone(api.connect_to_redis())
+
+    def test_pools_are_rebuilt_after_fork(self):
+        client = pools.get_mongo_client()
+        pools._reset_after_fork()
+        self.assertIsNot(pools.get_mongo_client(), client)
+        client.close()
+
+class CatalogTests(SimpleTestCase):
+
+    def setUp(self):
+        catalog.invalidate_catalog()
+        self.addCleanup(catalog.invalidate_catalog)
+
+    def test_indexes_and_arrays(self):
+        snapshot = catalog.Catalog(reversed(load_dump()), version=3)
+        self.assertEqual(len(snapshot), 88)
+        self.assertEqual([elem['constell_id'] for elem in snapshot], list(range(1, 89)))
+        self.assertEqual(snapshot.get(60)['name'], 'Orion')
+        self.assertEqual(snapshot.find('Orion')['constell_id'], 60)
+        self.assertIsNone(snapshot.get(1000))
+        self.assertEqual(snapshot.ra[59], snapshot.get(60)['ra'])
+        with self.assertRaises(ValueError):
+            snapshot.dec[0] = 0.0
+        with self.assertRaises(TypeError):
+            snapshot.by_id[1000] = {}
+
+    def test_loaded_once_and_reloaded_on_version_change(self):
+        version = mock.patch('mainApp.catalog.read_catalog_version', return_value=1).start()
+        self.addCleanup(mock.patch.stopall)
+        loader = mock.patch('mainApp.api.load_constells', side_effect=load_dump).start()
+        self.assertEqual(api.get_constell_by_id(60)['name'], 'Orion')
+        self.assertEqual(len(api.get_constells()), 88)
+        self.assertEqual((loader.call_count, version.call_count), (1, 1))
+
+        now = time.monotonic() + 3600
+        with mock.patch('mainApp.catalog.time.monotonic', return_value=now):
+            api.get_constells()
+            self.assertEqual((loader.call_count, version.call_count), (1, 2))
+        version.return_value = 2
+        with mock.patch('mainApp.catalog.time.monotonic', return_value=now + 3600):
+            self.assertEqual(catalog.get_catalog().version, 2)
+        self.assertEqual(loader.call_count, 2)
+
+    def test_unknown_id_falls_back_to_storage(self):
+        use_dump_catalog(self)
+        with mock.patch('mainApp.api.load_constell_by_id', return_value=None) as loader:
+            self.assertIsNone(api.get_constell_by_id(1000))
+        loader.assert_called_once_with(1000)
+
+@skipUnless(fakeredis, "fakeredis is not installed")
+class ConstellCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = use_fake_redis(self)
+        self.cache = ConstellCache(prefix='test')
+        self.constells = load_dump()
+
+    def test_bulk_roundtrip_and_counters(self):
+        self.cache.set_many(self.constells[:10])
+        with mock.patch.object(self.redis, 'pipeline', wraps=self.redis.pipeline) as pipeline:
+            self.cache.get_many([4])
+            found = self.cache.get_many([1, 2, 50, 3])
+        self.assertEqual(pipeline.call_count, 2)
+        # the first read's counter rode along with the second one
+        self.assertEqual(self.redis.hgetall('test:stats'), {'hits': '1'})
+        self.cache.reset_stats()
+        self.redis.delete('test:stats')
+        found = self.cache.get_many([1, 2, 50, 3])
+        self.assertEqual(sorted(found), [1, 2, 3])
+        self.assertEqual(found[2], self.constells[1])
+        self.assertEqual(sorted(self.cache.known_ids()), list(range(1, 11)))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (3, 1))
+        self.assertEqual(stats['shared'], {'hits': 3, 'misses': 1})
+        self.assertAlmostEqual(stats['hit_ratio'], 0.75)
+
+    def test_entries_expire_and_refresh_independently(self):
+        with self.settings(CONSTELL_CACHE={'TTL': 100}):
+            self.cache.set_many(self.constells[:2])
+        self.assertLessEqual(self.redis.ttl('test:1'), 100)
+        self.redis.expire('test:1', 5)
+        with self.settings(CONSTELL_CACHE={'TTL': 1000}):
+            self.cache.set(self.constells[0])
+        self.assertGreater(self.redis.ttl('test:1'), 100)
+        self.assertLessEqual(self.redis.ttl('test:2'), 100)
+        self.cache.invalidate([2])
+        self.assertEqual(list(self.cache.get_many([1, 2])), [1])
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get_many([1, 2]), {})
+        self.assertEqual(self.cache.known_ids(), [])
+
+    def test_redis_down_counts_misses(self):
+        with mock.patch('mainApp.pools.get_redis', return_value=None):
+            self.cache.set_many(self.constells)
+            self.assertEqual(self.cache.get_many([1, 2]), {})
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    @skipUnless(mongomock, "mongomock is not installed")
+    def test_load_constells_reads_only_misses_from_db(self):
+        collection = mongomock.MongoClient().db.constellations
+        collection.insert_many([{k: v for k, v in elem.items() if k != '_id'} for elem in self.constells])
+        with mock.patch('mainApp.api.connect_to_db', return_value=collection), \
+             mock.patch('mainApp.api.constell_cache', self.cache):
+            first = api.load_constells()
+            self.redis.delete('test:5')
+            with mock.patch.object(collection, 'find', wraps=collection.find) as find:
+                second = api.load_constells()
+            self.assertEqual(api.refresh_constell(7)['constell_id'], 7)
+        self.assertEqual([elem['constell_id'] for elem in first], list(range(1, 89)))
+        self.assertEqual(first, second)
+        self.assertEqual(len(find.call_args.args[0]['constell_id']['$nin']), 87)
+
+    @skipUnless(mongomock, "mongomock is not installed")
+    def test_get_by_ids_reads_each_layer_once(self):
+        collection = mongomock.MongoClient().db.constellations
+        collection.insert_many([{k: v for k, v in elem.items() if k != '_id'} for elem in self.constells])
+        self.cache.set_many(self.constells[10:20])
+        with mock.patch('mainApp.api.connect_to_db', return_value=collection), \
+             mock.patch('mainApp.api.constell_cache', self.cache), \
+             mock.patch('mainApp.api.get_catalog', return_value=catalog.Catalog(self.constells[:10])), \
+             mock.patch.object(self.redis, 'pipeline', wraps=self.redis.pipeline) as pipeline, \
+             mock.patch.object(collection, 'find', wraps=collection.find) as find:
+            constells, errors = api.get_constells_by_ids([60, 1, 15, 60, 999, 2], ['name', 'constell_id'])
+            # one round-trip to read from Redis, one to cache the misses of MongoDB
+            self.assertEqual(pipeline.call_count, 2)
+            self.assertEqual(find.call_args.args[0], {'constell_id': {'$in': [60, 999]}})
+            # the misses are cached for the next batch
+            api.get_constells_by_ids([60, 999])
+            self.assertEqual(find.call_args.args[0], {'constell_id': {'$in': [999]}})
+            with mock.patch.object(collection, 'find', side_effect=PyMongoError('down')), mock.patch('builtins.print'):
+                self.assertEqual(api.get_constells_by_ids([1, 999]), ([self.constells[0], None], {999: 'database unavailable'}))
+        self.assertEqual([elem and elem['constell_id'] for elem in constells], [60, 1, 15, 60, None, 2])
+        self.assertEqual(constells[0], {'name': 'Orion', 'constell_id': 60})
+        self.assertEqual(errors, {999: 'not found'})
+
+class VisibleApiTests(SimpleTestCase):
+
+    params = {'long': '37.6173', 'lat': '55.7558', 'time': '21:30', 'date': '2023-11-04'}
+
+    def setUp(self):
+        use_dump_catalog(self)
+
+    def test_rows_and_columnar_formats_agree(self):
+        rows = self.client.get('/api/visible/', self.params).json()
+        columns = self.client.get('/api/visible/', {**self.params, 'format': 'columnar'}).json()
+        self.assertEqual(rows['observation'], {'long': 37.6173, 'lat': 55.7558, 'local_time': '21:30:00',
+                                               'utc_time': '19:30:00', 'date': '2023-11-04'})
+        self.assertEqual(rows['count'], len(rows['visible']))
+        self.assertEqual(columns['constell_ids'], [elem['constell_id'] for elem in rows['visible']])
+        self.assertEqual(columns['az'], [elem['az'] for elem in rows['visible']])
+        self.assertEqual(columns['alt'], [elem['alt'] for elem in rows['visible']])
+        visible, _ = api.get_visible_constells('37.6173', '55.7558', '21:30:00', '2023-11-04')
+        self.assertEqual(rows['visible'], [elem.to_dict() for elem in visible])
+
+    def test_whole_degrees_are_accepted(self):
+        self.assertEqual(api.fix_long_lat('147.3058', '60'), (Decimal('147.305800'), Decimal('60.000000')))
+        response = self.client.get('/api/visible/', {**self.params, 'long': '37', 'lat': '-5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['observation']['lat'], -5)
+
+    def test_malformed_parameters(self):
+        for changes in ({'long': ''}, {'lat': '1e3'}, {'lat': '91'}, {'time': '25:00'}, {'date': '2023-13-01'}, {'format': 'xml'}):
+            with self.subTest(**changes):
+                response = self.client.get('/api/visible/', {**self.params, **changes})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.client.post('/api/visible/', self.params).status_code, 405)
+
+    def test_compression_follows_accept_encoding(self):
+        plain = self.client.get('/api/visible/', self.params)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain['Vary'], 'Accept-Encoding')
+        packed = self.client.get('/api/visible/', self.params, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertLess(len(packed.content), len(plain.content))
+        self.assertEqual(gzip.decompress(packed.content), plain.content)
+        with mock.patch.object(responses, 'brotli', mock.Mock(compress=lambda content, quality: b'br' + content[:10])):
+            self.assertEqual(self.client.get('/api/visible/', self.params, HTTP_ACCEPT_ENCODING='gzip, br')['Content-Encoding'], 'br')
+
+    def test_get_by_ids(self):
+        data = self.client.get('/api/get_by_ids/', {'ids': '60,1,60', 'fields': 'name'}).json()
+        self.assertEqual(data, {'constells': [{'name': 'Orion'}, {'name': 'Andromeda'}, {'name': 'Orion'}], 'count': 3, 'errors': []})
+        full = self.client.get('/api/get_by_ids/?ids=88&ids=1').json()['constells']
+        self.assertEqual([elem['constell_id'] for elem in full], [88, 1])
+        self.assertEqual(full[1], catalog.get_catalog().get(1))
+        for params in ({}, {'ids': ''}, {'ids': '1,x'}, {'ids': ','.join(['1'] * (views.BATCH_MAX_IDS + 1))}):
+            with self.subTest(**params):
+                response = self.client.get('/api/get_by_ids/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_json_fallback_without_orjson(self):
+        data = {'count': 1, 'visible': [{'constell_id': 60, 'name': 'Orion', 'az': 10.5, 'alt': 0.001}]}
+        with mock.patch.object(responses, 'orjson', None):
+            self.assertEqual(json.loads(responses.dumps(data)), data)
+
+class SessionCacheTests(SimpleTestCase):
+
+    form = {'long': '37.6173', 'lat': '55.7558', 'time': '21:30:12', 'date': '2023-11-04'}
+
+    def setUp(self):
+        use_dump_catalog(self)
+        self.cache = SessionCache(prefix='test-session')
+        patcher = mock.patch('mainApp.views.session_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, **changes):
+        response = self.client.post('/session/', {**self.form, **changes})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_observations_of_a_cell_share_one_computation(self):
+        with mock.patch('mainApp.pools.get_redis', return_value=None), \
+             self.settings(SESSION_CACHE={'ENABLED': True, 'BACKEND': 'locmem'}), \
+             mock.patch('mainApp.views.get_visible_at', wraps=api.get_visible_at) as compute:
+            first = self.post()
+            second = self.post(long='37.6190', time='21:30:48')
+            self.assertEqual(compute.call_count, 1)
+            self.post(long='37.6290')
+            self.post(time='21:31:00')
+            self.assertEqual(compute.call_count, 3)
+        cards = first.content.split(b'<!--Card grid-->')[1]
+        self.assertEqual(cards, second.content.split(b'<!--Card grid-->')[1])
+        self.assertIn(b'37.619000', second.content)
+        # the cell is computed for its rounded site and time bucket
+        expected = api.get_visible_at(Decimal('37.62'), Decimal('55.76'), '19:30:00', '2023-11-04')
+        self.assertEqual(second.context['visible'], [{'constell_id': elem.db_info['constell_id'], 'name': elem.db_info['name'],
+                                                     'az': elem.az, 'alt': elem.alt} for elem in expected])
+        with mock.patch('mainApp.pools.get_redis', return_value=None):
+            stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 3))
+        self.assertEqual(stats['shared'], {})
+
+    def test_disabled_cache_renders_every_request(self):
+        with mock.patch.object(self.cache, 'record') as record:
+            response = self.post()
+        record.assert_not_called()
+        self.assertNotIn('cards', response.context)
+        self.assertIn(b'Orion', response.content)
+
+    @skipUnless(fakeredis, "fakeredis is not installed")
+    def test_redis_backend_counts_for_all_workers(self):
+        server = use_fake_redis(self)
+        with self.settings(SESSION_CACHE={'ENABLED': True, 'BACKEND': 'redis'}):
+            for _ in range(3):
+                self.post()
+        self.assertEqual(len(server.keys('test-session:0:*')), 1)
+        shared = self.cache.stats()['shared']
+        self.assertEqual((shared['hits'], shared['misses']), (2, 1))
+        self.assertAlmostEqual(shared['hit_ratio'], 2 / 3)
+        self.assertGreater(shared['mean_miss_ms'], 0)
+
+    def test_locmem_store_evicts_and_expires(self):
+        store = LocMemStore(max_entries=2)
+        store.set('a', 1, 60)
+        store.set('b', 2, 60)
+        store.get('a')
+        store.set('c', 3, 60)
+        self.assertEqual((store.get('a'), store.get('b'), store.get('c')), (1, None, 3))
+        with mock.patch('mainApp.cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(store.get('a'))
+
+class SiderealTests(SimpleTestCase):
+    # outputs of the former Decimal implementation of calculate_GMST_alt, which truncated GMST to whole seconds
+    LEGACY_GMST = {
+        ('2023-11-04', '21:30:00'): 0.4244444445,
+        ('2024-02-29', '00:00:00'): 10.55361111,
+        ('2024-06-21', '03:15:42'): 21.24944444,
+        ('1999-12-31', '23:59:59'): 6.664166667,
+        ('2031-07-15', '18:45:07'): 14.31333333,
+        ('2010-03-20', '06:00:30'): 17.8525,
+        ('2023-01-01', '00:00:01'): 6.692777777,
+        ('2050-12-31', '11:11:11'): 17.85833333,
+    }
+
+    def setUp(self):
+        sidereal.clear_gmst_table()
+        self.addCleanup(sidereal.clear_gmst_table)
+
+    def test_matches_legacy_outputs(self):
+        for (date, time_), legacy in self.LEGACY_GMST.items():
+            with self.subTest(date=date, time=time_):
+                self.assertAlmostEqual(api.calculate_GMST_alt(time_, date), legacy, delta=1 / 3600)
+
+    def test_legacy_negative_gmst_was_a_minute_early(self):
+        # the old truncation floored the minutes of a negative raw GMST, which cost it one minute
+        self.assertAlmostEqual(api.calculate_GMST_alt('12:00:00', '2000-01-01'), 18.697374558, delta=1e-8)
+        self.assertAlmostEqual(api.calculate_GMST_alt('12:00:00', '2000-01-01') - 18.68083333, 1 / 60, delta=1 / 3600)
+
+    def test_julian_date(self):
+        self.assertEqual(api.calculate_JD({'year': '2000', 'month': '1', 'day': '1', 'hour': '12', 'minute': '0', 'second': '0'}), sidereal.J2000)
+        self.assertAlmostEqual(sidereal.julian_date(2024, 6, 21, 3, 15, 42), 2460482.635902778, delta=1e-8)
+
+    def test_table_and_memoization_agree_with_direct_path(self):
+        direct = [sidereal.gmst_at(datetime.datetime(2024, 3, day, 20, 15, 9)) for day in range(1, 29)]
+        sidereal.precompute_gmst_table(datetime.date(2024, 3, 1), 28)
+        tabled = [sidereal.gmst('2024-03-%02d' % day, '20:15:09') for day in range(1, 29)]
+        for a, b in zip(direct, tabled):
+            self.assertAlmostEqual(a, b, delta=1e-9)
+        sidereal.gmst('2024-03-01', '20:15:09')
+        self.assertGreater(sidereal.gmst.cache_info().hits, 0)
+
+    def test_decimal_context_is_left_alone(self):
+        use_dump_catalog(self)
+        with localcontext() as ctx:
+            ctx.prec = 28
+            visible, _ = api.get_visible_constells('37.6173', '55.7558', '21:30:00', '2023-11-04')
+            self.assertTrue(visible)
+            self.assertEqual(getcontext().prec, 28)
+
+class WikiWarmerTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('mainApp.wiki.asyncio.sleep', new=mock.AsyncMock())
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scrape_wiki_page_against_stub(self):
+        root = use_border_store(self)
+        with StubWikipedia() as stub, self.settings(WIKI={'BASE_URL': stub.url}):
+            scraped = api.scrape_wiki_page(wiki.wiki_api_url('Orion_(constellation)'))
+        self.assertEqual(scraped, STUB_SCRAPED)
+        self.assertEqual(stub.requests, STUB_REQUESTS)
+        with open(f"{root}/{STUB_BORDER.split('/')[-1]}", 'rb') as f:
+            self.assertEqual(f.read(), STUB_IMAGE)
+
+    def test_warm_scrapes_concurrently_with_retries(self):
+        stored = {}
+        suffixes = [wiki.wiki_suffix(elem) for elem in load_dump()]
+        statuses = {'Lyra': [503, 429], 'Vulpecula': [404], 'Lupus_(constellation)': [500, 500, 500]}
+        use_border_store(self)
+        with StubWikipedia(statuses) as stub, self.settings(WIKI={'BASE_URL': stub.url}):
+            results = wiki.warm_wiki_pages(suffixes, concurrency=8, retries=3, store=stored.__setitem__)
+        self.assertEqual(len(results), 88)
+        self.assertEqual(results['Lyra'], STUB_SCRAPED)
+        # the stub links every page to the same file, resolved once for all of them
+        self.assertEqual(stub.requests.count('imageinfo:File:Orion IAU.svg'), 1)
+        self.assertIsInstance(results['Vulpecula'], httpx.HTTPStatusError)
+        self.assertIsInstance(results['Lupus_(constellation)'], httpx.HTTPStatusError)
+        self.assertEqual(len(stored), 86)
+        self.assertNotIn('Vulpecula', stored)
+        self.assertEqual(stub.requests.count('Lyra'), 3)
+        self.assertEqual(stub.requests.count('Vulpecula'), 1)
+
+    @skipUnless(mongomock, "mongomock is not installed")
+    def test_incremental_warm_scrapes_changed_pages_only(self):
+        collection = mongomock.MongoClient(tz_aware=True).db.wiki_pages
+        mock.patch('mainApp.pools.get_mongo_collection', return_value=collection).start()
+        self.addCleanup(mock.patch.stopall)
+        suffixes = [wiki.wiki_suffix(elem) for elem in load_dump()]
+        fetched_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+        collection.insert_many([{'_id': suffix, 'data': {**STUB_SCRAPED, 'suffix': suffix}, 'fetched_at': fetched_at}
+                                for suffix in suffixes if suffix != 'Vulpecula'])
+        use_border_store(self)
+        with StubWikipedia(revids={'Lyra': STUB_REVID + 1}) as stub, self.settings(WIKI={'BASE_URL': stub.url, 'STALE_AFTER': 3600}):
+            results = wiki.warm_wiki_pages(suffixes, incremental=True)
+            self.assertFalse(wiki.is_stale(collection.find_one({'_id': 'Orion_(constellation)'})))
+        # 88 revisions in two requests, then only the changed and the missing page are scraped
+        self.assertEqual([page.count('|') + 1 for page in stub.requests if page.startswith('info:')], [50, 38])
+        self.assertEqual(sorted(page for page in stub.requests if ':' not in page and '/' not in page), ['Lyra', 'Vulpecula'])
+        self.assertEqual(sum(scraped is None for scraped in results.values()), 86)
+        self.assertEqual(wiki.stored_revids(['Lyra', 'Vulpecula', 'Orion_(constellation)']),
+                         {'Lyra': STUB_REVID + 1, 'Vulpecula': STUB_REVID, 'Orion_(constellation)': STUB_REVID})
+        self.assertNotIn('suffix', collection.find_one({'_id': 'Lyra'})['data'])
+        self.assertEqual(collection.find_one({'_id': 'Orion_(constellation)'})['data']['suffix'], 'Orion_(constellation)')
+
+    def test_parse_revisions_maps_normalized_titles(self):
+        data = {'query': {'normalized': [{'from': 'Orion_(constellation)', 'to': 'Orion (constellation)'}],
+                          'pages': [{'title': 'Orion (constellation)', 'lastrevid': 7}, {'title': 'Nope', 'missing': True}]}}
+        self.assertEqual(wiki.parse_revisions(data), {'Orion_(constellation)': 7})
+
+
+def wiki_entry(age):
+    return {'_id': 'Orion_(constellation)', 'data': ORION_SCRAPED,
+            'fetched_at': datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=age)}
+
+class WikiStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        for target in ('mainApp.api.retreive_from_redis', 'mainApp.api.cache_in_redis', 'mainApp.api.save_wiki_page'):
+            mock.patch(target, return_value=None).start()
+        mock.patch('mainApp.wiki.claim_refresh', return_value=True).start()
+        self.addCleanup(mock.patch.stopall)
+        self.scrapes = 0
+
+    def slow_scrape(self, page_url):
+        self.scrapes += 1
+        time.sleep(0.1)
+        return {'scrape': self.scrapes}
+
+    def test_fresh_stored_page_is_served_without_scraping(self):
+        with mock.patch('mainApp.api.load_wiki_entry', return_value=wiki_entry(60)), \
+             mock.patch('mainApp.api.refresh_in_background') as refresh, \
+             mock.patch('mainApp.api.scrape_wiki_page') as scrape:
+            self.assertEqual(api.get_wiki_cached('unused', 'Orion_(constellation)'), ORION_SCRAPED)
+        scrape.assert_not_called()
+        refresh.assert_not_called()
+
+    def test_stale_page_is_served_and_refreshed_once(self):
+        threads = []
+        refresh = lambda key, func: threads.append(wiki.refresh_in_background(key, func))
+        with self.settings(WIKI={'STALE_AFTER': 3600}), \
+             mock.patch('mainApp.api.load_wiki_entry', return_value=wiki_entry(7200)), \
+             mock.patch('mainApp.api.refresh_in_background', side_effect=refresh), \
+             mock.patch('mainApp.api.scrape_wiki_page', side_effect=self.slow_scrape):
+            results = [api.get_wiki_cached('unused', 'Orion_(constellation)') for _ in range(20)]
+            for thread in threads:
+                if thread is not None:
+                    thread.join()
+        self.assertEqual(results, [ORION_SCRAPED] * 20)
+        self.assertEqual(self.scrapes, 1)
+        api.save_wiki_page.assert_called_once_with('Orion_(constellation)', {'scrape': 1})
+
+    def test_concurrent_misses_share_one_scrape(self):
+        results = []
+        with mock.patch('mainApp.api.load_wiki_entry', return_value=None), \
+             mock.patch('mainApp.api.scrape_wiki_page', side_effect=self.slow_scrape):
+            threads = [threading.Thread(target=lambda: results.append(api.get_wiki_cached('unused', 'Orion_(constellation)')))
+                       for _ in range(100)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.scrapes, 1)
+        self.assertEqual(results, [{'scrape': 1}] * 100)
+
+    def test_stale_page_at_same_revision_is_only_touched(self):
+        stored = {**wiki_entry(7200), 'data': {**ORION_SCRAPED, 'revid': STUB_REVID}}
+        with StubWikipedia() as stub, self.settings(WIKI={'BASE_URL': stub.url}), \
+             mock.patch('mainApp.api.touch_wiki_pages') as touch, \
+             mock.patch('mainApp.api.scrape_wiki_page', side_effect=self.slow_scrape):
+            self.assertEqual(api.refresh_wiki_page('unused', 'Orion_(constellation)', stored), stored['data'])
+            self.assertEqual(stub.requests, ['info:Orion_(constellation)'])
+            touch.assert_called_once_with(['Orion_(constellation)'])
+            stub.server.revids['Orion_(constellation)'] = STUB_REVID + 1
+            self.assertEqual(api.refresh_wiki_page('unused', 'Orion_(constellation)', stored), {'scrape': 1})
+        self.assertEqual(self.scrapes, 1)
+
+    def test_mongo_outage_falls_back_to_scraping(self):
+        collection = mock.Mock(find_one=mock.Mock(side_effect=PyMongoError('down')))
+        mock.patch.object(pools, '_mongo_down_until', 0.0).start()
+        with mock.patch('mainApp.pools.get_mongo_collection', return_value=collection), \
+             mock.patch('mainApp.api.scrape_wiki_page', side_effect=self.slow_scrape), \
+             mock.patch('builtins.print'):
+            self.assertEqual(api.get_wiki_cached('unused', 'Orion_(constellation)'), {'scrape': 1})
+            self.assertEqual(api.get_wiki_cached('unused', 'Orion_(constellation)'), {'scrape': 2})
+        # the second miss skipped MongoDB for the backoff window
+        collection.find_one.assert_called_once()
+
+    def test_coalesce_shares_exceptions(self):
+        with self.assertRaises(ValueError):
+            wiki.coalesce('key', mock.Mock(side_effect=ValueError))
+        self.assertEqual(wiki.coalesce('key', lambda: 42), 42)
+
+    @skipUnless(mongomock, "mongomock is not installed")
+    def test_store_roundtrip(self):
+        collection = mongomock.MongoClient(tz_aware=True).db.wiki_pages
+        mock.patch('mainApp.pools.get_mongo_collection', return_value=collection).start()
+        wiki.save_wiki_page('Orion_(constellation)', ORION_SCRAPED)
+        entry = wiki.load_wiki_entry('Orion_(constellation)')
+        self.assertEqual(entry['data'], ORION_SCRAPED)
+        self.assertFalse(wiki.is_stale(entry))
+        with self.settings(WIKI={'STALE_AFTER': -1}):
+            self.assertTrue(wiki.is_stale(entry))
+
+class AsyncMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        use_dump_catalog(self)
+        self.hops = []
+        init = sync.SyncToAsync.__init__
+        def record(hop, func, *args, **kwargs):
+            self.hops.append(func.__qualname__)
+            init(hop, func, *args, **kwargs)
+        mock.patch.object(sync.SyncToAsync, '__init__', record).start()
+        self.addCleanup(mock.patch.stopall)
+        override = self.settings(MIDDLEWARE=[f"mainApp.asyncMiddleware.{path.rpartition('.')[2]}" if path.startswith('django.') else path
+                                             for path in settings.MIDDLEWARE])
+        override.enable()
+        self.addCleanup(override.disable)
+
+    async def test_hooks_run_on_the_event_loop(self):
+        response = await AsyncClient().get('/api/get_by_id/', {'constell_id': 60})
+        self.assertEqual((response.status_code, response['X-Frame-Options']), (200, 'DENY'))
+        self.assertFalse([hop for hop in self.hops if 'Middleware' in hop], self.hops)
+
+    async def test_session_writes_go_to_a_thread(self):
+        async def view(request):
+            request.session['seen'] = True
+            return HttpResponse()
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'):
+            response = await asyncMiddleware.SessionMiddleware(view)(AsyncRequestFactory().get('/'))
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(self.hops, ['SessionMiddleware.process_response'])
+
+class AsyncViewTests(SimpleTestCase):
+
+    def setUp(self):
+        use_dump_catalog(self)
+        self.collection = mock.Mock(find_one=mock.AsyncMock(return_value=None), replace_one=mock.AsyncMock())
+        mock.patch('mainApp.pools.get_async_mongo_collection', return_value=self.collection).start()
+        mock.patch('mainApp.pools.get_async_redis', new=mock.AsyncMock(return_value=None)).start()
+        self.addCleanup(mock.patch.stopall)
+
+    async def test_get_by_id(self):
+        request = AsyncRequestFactory().get('/api/get_by_id/', {'constell_id': 60})
+        response = await asyncViews.get_by_id(request)
+        self.assertEqual(json.loads(response.content)['name'], 'Orion')
+        self.collection.find_one.assert_not_called()
+
+    async def test_get_by_ids_queries_misses_at_once(self):
+        cursor = mock.Mock(to_list=mock.AsyncMock(return_value=[]))
+        self.collection.find = mock.Mock(return_value=cursor)
+        request = AsyncRequestFactory().get('/api/get_by_ids/', {'ids': '999,60,998', 'fields': 'name'})
+        data = json.loads((await asyncViews.get_by_ids(request)).content)
+        self.assertEqual(data['constells'], [None, {'name': 'Orion'}, None])
+        self.assertEqual(data['errors'], [{'constell_id': 999, 'error': 'not found'}, {'constell_id': 998, 'error': 'not found'}])
+        self.collection.find.assert_called_once_with({'constell_id': {'$in': [999, 998]}})
+
+    async def test_concurrent_wiki_misses_share_one_scrape(self):
+        use_border_store(self)
+        with StubWikipedia() as stub, self.settings(WIKI={'BASE_URL': stub.url}):
+            request = AsyncRequestFactory().get('/api/get_wiki_page/', {'constell_id': 60})
+            responses = await asyncio.gather(*(asyncViews.get_wiki_page(request) for _ in range(50)))
+            await pools.get_async_http_client().aclose()
+        self.assertEqual(stub.requests, STUB_REQUESTS)
+        data = json.loads(responses[-1].content)
+        self.assertEqual(data, {**STUB_SCRAPED, 'name': 'Orion', 'wiki': 'https://en.wikipedia.org/wiki/Orion_(constellation)'})
+        self.collection.replace_one.assert_awaited_once()
+
+    async def test_stale_wiki_page_at_same_revision_is_only_touched(self):
+        stored = {**wiki_entry(7200), 'data': {**ORION_SCRAPED, 'revid': STUB_REVID}}
+        self.collection.update_one = mock.AsyncMock()
+        with StubWikipedia() as stub, self.settings(WIKI={'BASE_URL': stub.url}):
+            self.assertEqual(await wiki.arefresh_wiki_page('Orion_(constellation)', stored), stored['data'])
+            await pools.get_async_http_client().aclose()
+        self.assertEqual(stub.requests, ['info:Orion_(constellation)'])
+        self.collection.update_one.assert_awaited_once()
+        self.collection.replace_one.assert_not_called()
+
+    async def test_wiki_page_is_scraped_when_mongo_is_down(self):
+        use_border_store(self)
+        self.collection.find_one.side_effect = PyMongoError('down')
+        mock.patch.object(pools, '_mongo_down_until', 0.0).start()
+        with StubWikipedia() as stub, self.settings(WIKI={'BASE_URL': stub.url}), mock.patch('builtins.print'):
+            self.assertEqual(await wiki.aget_wiki_cached('Orion_(constellation)'), STUB_SCRAPED)
+            await pools.get_async_http_client().aclose()
+        self.assertEqual(stub.requests, STUB_REQUESTS)
+        self.assertTrue(pools.mongo_is_down())
+
+    async def test_stored_wiki_page_is_served_from_mongo(self):
+        self.collection.find_one.return_value = wiki_entry(60)
+        self.assertEqual(await wiki.aget_wiki_cached('Orion_(constellation)'), ORION_SCRAPED)
+        self.collection.replace_one.assert_not_called()
+
+class TrackingTests(SimpleTestCase):
+
+    def setUp(self):
+        use_dump_catalog(self)
+        self.catalog = catalog.get_catalog()
+
+    def test_incremental_lst_matches_recomputed(self):
+        start = datetime.datetime(2023, 11, 4, 19, 30)
+        tracker = tracking.SkyTracker(self.catalog, 37.6173, 55.7558, start)
+        for _ in range(3600):
+            tracker.advance(1)
+        moment = start + datetime.timedelta(hours=1)
+        self.assertEqual(tracker.moment, moment)
+        self.assertAlmostEqual(tracker.lst, sidereal.lst(sidereal.gmst_at(moment), 37.6173), places=6)
+        frame = tracker.frame()
+        expected = api.are_visible_many(55.7558, frame['lst'], self.catalog)
+        self.assertEqual(frame['constell_ids'], [v.db_info['constell_id'] for v in expected])
+        for az, v in zip(frame['az'], expected):
+            self.assertAlmostEqual(az, v.az, delta=2e-3)
+
+    async def consume(self, params):
+        request = AsyncRequestFactory().get('/api/track/', params)
+        with self.settings(TRACKING={'MIN_INTERVAL': 0}):
+            response = await asyncViews.track(request)
+            return response, ''.join([chunk.decode() async for chunk in response.streaming_content])
+
+    async def test_server_sent_events(self):
+        response, body = await self.consume({'long': '37.6', 'lat': '55.7', 'interval': '0.01', 'duration': '0.025'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = [event.split('\n') for event in body.strip().split('\n\n')]
+        self.assertEqual([lines[0] for lines in events], ['event: catalog'] + ['event: frame'] * 3)
+        catalog_event = json.loads(events[0][1][len('data: '):])
+        self.assertEqual(len(catalog_event['names']), 88)
+        frames = [json.loads(lines[1][len('data: '):]) for lines in events[1:]]
+        self.assertLess(frames[0]['time'], frames[-1]['time'])
+        self.assertEqual(len(frames[0]['az']), len(frames[0]['constell_ids']))
+
+    async def test_ndjson_and_bad_input(self):
+        response, body = await self.consume({'long': '37.6', 'lat': '55.7', 'format': 'ndjson', 'duration': '0'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['event'] for line in body.splitlines()], ['catalog', 'frame'])
+        for params in ({'long': '37.6', 'lat': '95'}, {'long': '37.6'}, {'long': '37.6', 'lat': '55.7', 'format': 'xml'},
+                       {'long': '37.6', 'lat': '55.7', 'interval': 'nan'}, {'long': '37.6', 'lat': '55.7', 'duration': 'inf'}):
+            response = await asyncViews.track(AsyncRequestFactory().get('/api/track/', params))
+            self.assertEqual(response.status_code, 400)
+
+    def test_not_streamed_under_wsgi(self):
+        self.assertEqual(views.track(RequestFactory().get('/api/track/', {'long': '37.6', 'lat': '55.7'})).status_code, 501)
+
+class BorderImageTests(SimpleTestCase):
+
+    def test_imageinfo_is_batched_and_normalized(self):
+        hrefs = [f'/wiki/File:Image_{number}.png' for number in range(120)] + ['/wiki/File:Image_0.png']
+        with StubWikipedia() as stub, self.settings(WIKI={'BASE_URL': stub.url}, BORDERS={'BATCH_SIZE': 50}):
+            urls = borders.resolve_images(hrefs)
+        self.assertEqual([page.count('|') + 1 for page in stub.requests], [50, 50, 20])
+        self.assertEqual(urls['/wiki/File:Image_7.png'], f'{stub.url}/upload/thumb/512px-Image%207.png.png')
+        data = {'query': {'normalized': [{'from': 'File:Orion_IAU.svg', 'to': 'File:Orion IAU.svg'}],
+                          'pages': [{'title': 'File:Orion IAU.svg', 'imageinfo': [{'url': 'https://x/Orion_IAU.svg'}]},
+                                    {'title': 'File:Gone.png', 'missing': True}]}}
+        self.assertEqual(borders.parse_imageinfo(data), {'File:Orion_IAU.svg': 'https://x/Orion_IAU.svg'})
+
+    def test_store_evicts_least_recently_used(self):
+        root = use_border_store(self, MAX_BYTES=250)
+        store = borders.get_store()
+        names = [store.put(bytes([number]) * 100, f'https://upload/{number}.png', 'image/png') for number in range(3)]
+        self.assertEqual(names[0], f'{hashlib.sha256(bytes([0]) * 100).hexdigest()}.png')
+        self.assertFalse(store.path(names[0]).exists())
+        self.assertEqual(store.source(names[0]), 'https://upload/0.png')
+        # serving the older one keeps it over the newer one
+        os.utime(store.path(names[1]), (time.time() - 3600, time.time() - 3600))
+        os.utime(store.path(names[2]), (time.time() - 1800, time.time() - 1800))
+        store.touch(names[1])
+        store.put(b'\x03' * 100, 'https://upload/3.png', 'image/png')
+        self.assertEqual(sorted(os.listdir(root)), sorted([names[1], f'{hashlib.sha256(bytes([3]) * 100).hexdigest()}.png'] +
+                                                          [f'{name[:64]}.json' for name in names[:3]] +
+                                                          [f'{hashlib.sha256(bytes([3]) * 100).hexdigest()}.json']))
+        with self.assertRaises(ValueError):
+            store.put(b'<html>', 'https://upload/page', 'text/html')
+
+    def test_served_with_long_cache_and_restored_after_eviction(self):
+        use_border_store(self)
+        with StubWikipedia() as stub, self.settings(WIKI={'BASE_URL': stub.url}):
+            url = borders.mirror_image(f'{stub.url}/upload/thumb/512px-Orion.png')
+            self.assertEqual(url, STUB_BORDER)
+            # a stored url is not downloaded again, by this worker or another one
+            self.assertEqual(borders.mirror_image(f'{stub.url}/upload/thumb/512px-Orion.png'), STUB_BORDER)
+            other = borders.BorderStore(borders.get_store().root, 2**20)
+            self.assertEqual(other.lookup(f'{stub.url}/upload/thumb/512px-Orion.png'), url.split('/')[-1])
+            response = self.client.get(url)
+            self.assertEqual(b''.join(response.streaming_content), STUB_IMAGE)
+            self.assertEqual((response['Content-Type'], response['Cache-Control']), ('image/png', 'public, max-age=31536000, immutable'))
+            os.remove(borders.get_store().path(url.split('/')[-1]))
+            self.assertEqual(b''.join(self.client.get(url).streaming_content), STUB_IMAGE)
+            self.assertEqual(stub.requests.count('/upload/thumb/512px-Orion.png'), 2)
+        self.assertEqual(self.client.get('/borders/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get(f'/borders/{"0" * 64}.png').status_code, 404)
+        with self.settings(BORDERS={'ROOT': None}):
+            self.assertEqual(borders.mirror_image('//upload.wikimedia.org/a.png'), 'https://upload.wikimedia.org/a.png')
+
+class WikiExtractorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.page = (TESTDATA / 'wiki_orion.html').read_text()
+
+    def test_only_lead_section_is_kept(self):
+        lead = wiki.lead_section(self.page)
+        self.assertLess(len(lead), len(self.page) // 10)
+        self.assertIn('infobox-below', lead)
+        self.assertNotIn('mw-heading', lead)
+        self.assertEqual(wiki.lead_section('<p>no headings</p>'), '<p>no headings</p>')
+
+    def test_extracts_same_fields_with_or_without_cut(self):
+        expected = {**ORION_SCRAPED, 'border_img_page': '/wiki/File:Orion_IAU.svg'}
+        del expected['border_img']
+        self.assertEqual(wiki.parse_wiki_page(self.page), expected)
+        with mock.patch('mainApp.wiki.lead_section', side_effect=lambda page: page):
+            self.assertEqual(wiki.parse_wiki_page(self.page), expected)
+
+    def test_citation_links_are_not_neighbours(self):
+        page = self.page.replace('<a href="/wiki/Monoceros" title="Monoceros">Monoceros</a>', '<a>Monoceros</a>')
+        self.assertNotIn('Monoceros', wiki.parse_wiki_page(page)['neighbours'])
+        self.assertNotIn('[4]', wiki.parse_wiki_page(self.page)['neighbours'])
+
+class WarmupTests(SimpleTestCase):
+
+    def test_only_serving_processes_warm_up(self):
+        with self.settings(WARMUP={'ENABLED': False}):
+            self.assertFalse(warmup.should_warm_up(['gunicorn', 'stargazing.wsgi']))
+        with self.settings(WARMUP={'ENABLED': True}), mock.patch.dict(os.environ, {'RUN_MAIN': ''}):
+            self.assertTrue(warmup.should_warm_up(['gunicorn', 'stargazing.wsgi']))
+            self.assertTrue(warmup.should_warm_up(['manage.py', 'runserver', '--noreload']))
+            self.assertFalse(warmup.should_warm_up(['manage.py', 'runserver']))
+            self.assertFalse(warmup.should_warm_up(['manage.py', 'migrate']))
+            os.environ['RUN_MAIN'] = 'true'
+            self.assertTrue(warmup.should_warm_up(['manage.py', 'runserver']))
+
+    def test_steps_fill_the_caches_and_survive_failures(self):
+        use_dump_catalog(self)
+        sidereal.clear_gmst_table()
+        self.addCleanup(sidereal.clear_gmst_table)
+        with mock.patch('mainApp.pools.get_mongo_client', side_effect=PyMongoError('down')), \
+             mock.patch('mainApp.warmup.get_sky_index') as sky_index, mock.patch('builtins.print') as report:
+            timings = warmup.warm_up({**warmup.WARMUP_DEFAULTS, 'SIDEREAL_DAYS': 3})
+        self.assertEqual(list(timings), ['pools', 'catalog', 'sidereal', 'sky_index', 'templates'])
+        self.assertIsNone(timings['pools'])
+        self.assertIn('pools', report.call_args.args[0])
+        self.assertTrue(all(seconds is not None for name, seconds in timings.items() if name != 'pools'))
+        sky_index.assert_called_once_with()
+        self.assertIs(catalog._catalog, catalog.get_catalog())
+        self.assertIn(datetime.date.today().toordinal(), sidereal._gmst0_table)
+
+    def test_scraper_libraries_are_not_imported_on_boot(self):
+        code = 'import sys; from stargazing.wsgi import application; import mainApp.urls; print(sorted({"httpx", "selectolax"} & set(sys.modules)))'
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                                env={**os.environ, 'SKYGAZE_WARMUP': '0'})
+        self.assertEqual(result.stdout.strip(), '[]', result.stderr)
+
+@skipUnless(images.Image, "Pillow is not installed")
+class ImagePipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        os.makedirs(f'{self.root}/constells')
+        for name, color in (('Orion', (200, 40, 40, 255)), ('Canis_Major', (40, 40, 200, 128))):
+            images.Image.new('RGBA', (100, 80), color).save(f'{self.root}/constells/{name}.png')
+        self.conf = {**images.IMAGES_DEFAULTS, 'ROOT': self.root, 'WIDTHS': (50, 200)}
+        images.reset_manifest()
+        self.addCleanup(images.reset_manifest)
+
+    def build(self):
+        return images.build_manifest(self.conf, ['webp'], log=lambda line: None)
+
+    def test_variants_are_hashed_and_rebuilt_only_when_changed(self):
+        manifest = self.build()
+        self.assertEqual(manifest['formats'], ['webp', 'png'])
+        orion = manifest['images']['Orion']
+        self.assertEqual((orion['width'], orion['height']), (100, 80))
+        self.assertEqual([variant['width'] for variant in orion['variants']['webp']], [50, 100])
+        for variant in orion['variants']['webp'] + orion['variants']['png']:
+            self.assertRegex(variant['file'], views.HASHED_NAME_RE)
+            self.assertTrue(os.path.isfile(f"{self.root}/{variant['file']}"))
+
+        with mock.patch('mainApp.images.build_variants', wraps=images.build_variants) as encode:
+            self.assertEqual(self.build(), manifest)
+            encode.assert_not_called()
+            images.Image.new('RGBA', (100, 80), (0, 0, 0, 255)).save(f'{self.root}/constells/Orion.png')
+            rebuilt = self.build()
+            self.assertEqual([call.args[0].stem for call in encode.call_args_list], ['Orion'])
+        self.assertEqual(rebuilt['images']['Canis_Major'], manifest['images']['Canis_Major'])
+        self.assertNotEqual(rebuilt['images']['Orion'], orion)
+        self.assertFalse(os.path.exists(f"{self.root}/{orion['variants']['webp'][0]['file']}"))
+        self.assertEqual(len(os.listdir(f'{self.root}/img')), 2 * 4 + 1)
+
+    def test_picture_tag(self):
+        template = Template('{% load filters %}{% constell_picture name %}')
+        with self.settings(IMAGES={'ROOT': self.root}):
+            fallback = template.render(Context({'name': 'Canis Major'}))
+            self.assertEqual(fallback, '<img src="/static/constells/Canis_Major.png" class="card-img-top" alt="Canis Major" '
+                                       'loading="lazy" decoding="async">')
+            self.build()
+            html = template.render(Context({'name': 'Canis Major'}))
+        webp = images.get_manifest()['images']['Canis_Major']['variants']['webp']
+        self.assertIn(f'<source type="image/webp" srcset="/static/{webp[0]["file"]} 50w, /static/{webp[1]["file"]} 100w" sizes="18rem">', html)
+        self.assertIn('width="100" height="80" class="card-img-top" alt="Canis Major" loading="lazy"', html)
+
+    def test_missing_pillow(self):
+        with mock.patch.object(images, 'Image', None), self.assertRaises(CommandError):
+            call_command('build_images')
+
+class StaticFileTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        os.makedirs(f'{tmp.name}/css')
+        self.css = b'body { color: white; }\n' * 50
+        with open(f'{tmp.name}/css/site.css', 'wb') as f:
+            f.write(self.css)
+        with open(f'{tmp.name}/Orion-360.0123456789ab.webp', 'wb') as f:
+            f.write(b'RIFF')
+        self.assertEqual(images.precompress(tmp.name), 1 + (responses.brotli is not None))
+        self.assertEqual(images.precompress(tmp.name), 0)
+        patcher = self.settings(STATICFILES_DIRS=[tmp.name])
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        finders.get_finder.cache_clear()
+        self.addCleanup(finders.get_finder.cache_clear)
+
+    def test_precompressed_sibling_is_served(self):
+        plain = self.client.get('/static/css/site.css')
+        self.assertEqual(b''.join(plain.streaming_content), self.css)
+        self.assertEqual((plain['Content-Type'], plain['Vary']), ('text/css', 'Accept-Encoding'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain['Cache-Control'], 'public, max-age=0, must-revalidate')
+        packed = self.client.get('/static/css/site.css', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(packed.streaming_content)), self.css)
+        self.assertEqual(self.client.get('/static/css/site.css', HTTP_IF_MODIFIED_SINCE=plain['Last-Modified']).status_code, 304)
+
+    def test_stale_sibling_is_not_served(self):
+        source = f'{self.root}/css/site.css'
+        edited = b'body { color: black; }\n'
+        with open(source, 'wb') as f:
+            f.write(edited)
+        mtime = os.stat(source + '.gz').st_mtime + 10
+        os.utime(source, (mtime, mtime))
+        response = self.client.get('/static/css/site.css', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), edited)
+        self.assertEqual(response['Last-Modified'], http_date(mtime))
+
+    def test_hashed_files_are_immutable(self):
+        response = self.client.get('/static/Orion-360.0123456789ab.webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertFalse(response.has_header('Vary'))
+        for path in ('/static/css/missing.css', '/static/../settings.py', '/static/css'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+# what the PURGE_HOOKS of HttpCacheTests were called with
+PURGED = []
+
+def record_purge(keys):
+    PURGED.append(keys)
+
+class HttpCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        use_dump_catalog(self)
+        httpcache._versions.clear()
+        PURGED.clear()
+        patcher = mock.patch('mainApp.views.get_time_date', return_value=('2023-11-04', '21:30:12'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def unreachable(self):
+        # a 304 must be answered from memory
+        for target in ('mainApp.pools.get_mongo_collection', 'mainApp.pools.get_redis', 'mainApp.views.get_constell_by_id',
+                       'mainApp.views.get_wiki_cached'):
+            patcher = mock.patch(target, side_effect=AssertionError(target))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_api_revalidates_without_db(self):
+        response = self.client.get('/api/get_by_id/', {'constell_id': 60})
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300, stale-while-revalidate=3600')
+        self.assertEqual(response['Surrogate-Key'], 'catalog constell-60')
+        batch = self.client.get('/api/get_by_ids/', {'ids': '60,1'})
+        self.unreachable()
+        response = self.client.get('/api/get_by_id/', {'constell_id': 60}, HTTP_IF_NONE_MATCH=f'"other", {etag}')
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        self.assertEqual(response['Surrogate-Key'], 'catalog constell-60')
+        response = self.client.get('/api/get_by_ids/', {'ids': '60,1'}, HTTP_IF_NONE_MATCH=batch['ETag'])
+        self.assertEqual(response.status_code, 304)
+        # compressed or not, the 200 and the 304 carry the same weak tag
+        self.assertTrue(batch['ETag'].startswith('W/"'))
+        packed = self.client.get('/api/get_by_ids/', {'ids': '60,1'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual((packed['Content-Encoding'], packed['ETag']), ('gzip', batch['ETag']))
+        response = self.client.get('/api/get_by_ids/', {'ids': '60,1'}, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=packed['ETag'])
+        self.assertEqual((response.status_code, response['ETag']), (304, packed['ETag']))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        # a new catalog version changes every tag
+        catalog.invalidate_catalog()
+        with mock.patch('mainApp.catalog.read_catalog_version', return_value=1):
+            self.assertEqual(views.constell_validator(RequestFactory().get('/', {'constell_id': 60}))[0], ('constell', 1, 60))
+
+    def test_wiki_page_tag_follows_the_revision(self):
+        data = {**ORION_SCRAPED, 'revid': 5}
+        with mock.patch('mainApp.views.get_wiki_cached', side_effect=lambda url, suffix: dict(data)):
+            first = self.client.get('/api/get_wiki_page/', {'constell_id': 60})
+        self.assertEqual(first['Surrogate-Key'], 'catalog constell-60 wiki-Orion_(constellation)')
+        self.assertEqual(first['Cache-Control'], 'public, max-age=3600, stale-while-revalidate=86400')
+        with mock.patch('mainApp.views.get_wiki_cached', side_effect=AssertionError):
+            response = self.client.get('/api/get_wiki_page/', {'constell_id': 60}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        # a rescrape purges what the worker knew of the page
+        with self.settings(HTTP_CACHE={'PURGE_HOOKS': ['mainApp.tests.record_purge']}), \
+             mock.patch('mainApp.pools.get_mongo_collection'):
+            wiki.save_wiki_page('Orion_(constellation)', data)
+        self.assertEqual(PURGED, [['wiki-Orion_(constellation)']])
+        data['revid'] = 6
+        with mock.patch('mainApp.views.get_wiki_cached', side_effect=lambda url, suffix: dict(data)):
+            response = self.client.get('/api/get_wiki_page/', {'constell_id': 60}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_shared_wiki_data_is_not_mutated(self):
+        shared = dict(ORION_SCRAPED)
+        with mock.patch('mainApp.views.get_wiki_cached', return_value=shared):
+            response = self.client.get('/api/get_wiki_page/', {'constell_id': 60})
+        self.assertEqual(json.loads(response.content)['name'], 'Orion')
+        self.assertEqual(shared, ORION_SCRAPED)
+
+    def test_pages_are_private_and_vary_on_cookie(self):
+        first = self.client.get('/constellations/')
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        self.assertIn('Cookie', first['Vary'])
+        self.assertTrue(first['ETag'].startswith('W/'))
+        self.assertFalse(first.has_header('Surrogate-Key'))
+        self.assertContains(first, 'value="21:30:00"')
+        # the first response set the CSRF cookie its token is bound to
+        second = self.client.get('/constellations/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.unreachable()
+        self.assertEqual(self.client.get('/constellations/', HTTP_IF_NONE_MATCH=second['ETag']).status_code, 304)
+        response = self.client.post('/session/', {'long': '37.6173', 'lat': '55.7558', 'time': '21:30:12', 'date': '2023-11-04'})
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertIn('Cookie', response['Vary'])
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_disabled_and_failing_hooks(self):
+        with self.settings(HTTP_CACHE={'ENABLED': False}):
+            response = self.client.get('/api/get_by_id/', {'constell_id': 60})
+        self.assertFalse(response.has_header('ETag') or response.has_header('Cache-Control'))
+        with self.settings(HTTP_CACHE={'PURGE_HOOKS': ['mainApp.tests.missing_hook', 'mainApp.tests.record_purge']}), \
+             mock.patch('builtins.print') as printed, \
+             mock.patch('mainApp.api.get_constell_by_id_db', return_value=None), \
+             mock.patch('mainApp.api.constell_cache'):
+            api.refresh_constell(7)
+        printed.assert_called_once()
+        self.assertEqual(PURGED, [['constell-7']])
+
+    async def test_async_views(self):
+        response = await asyncViews.get_by_id(AsyncRequestFactory().get('/api/get_by_id/', {'constell_id': 60}))
+        request = AsyncRequestFactory().get('/api/get_by_id/', {'constell_id': 60}, headers={'If-None-Match': response['ETag']})
+        self.assertEqual((await asyncViews.get_by_id(request)).status_code, 304)
+
+class InstrumentationTests(SimpleTestCase):
+
+    def setUp(self):
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+
+    def test_disabled_layer_leaves_functions_alone(self):
+        def func():
+            pass
+        with mock.patch.object(instrumentation, 'ENABLED', False):
+            self.assertIs(instrumentation.timed('compute.noop')(func), func)
+            self.assertIs(instrumentation.span('compute.noop'), instrumentation.span('compute.other'))
+            with self.assertRaises(MiddlewareNotUsed):
+                instrumentation.InstrumentationMiddleware(lambda request: HttpResponse())
+
+    def test_server_timing_groups_spans_by_category(self):
+        with mock.patch.object(instrumentation, 'ENABLED', True):
+            fetch = instrumentation.timed('db.fetch')(lambda: time.sleep(0.002))
+
+            def view(request):
+                fetch()
+                fetch()
+                with instrumentation.span('compute.math'):
+                    pass
+                return HttpResponse()
+
+            middleware = instrumentation.InstrumentationMiddleware(view)
+            response = middleware(RequestFactory().get('/session/'))
+        entries = dict(entry.split(';dur=') for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(list(entries), ['db', 'compute', 'total'])
+        self.assertGreaterEqual(float(entries['db']), 4)
+        self.assertGreaterEqual(float(entries['total']), float(entries['db']))
+        # spans outside of a request only reach the histograms
+        fetch()
+        text = instrumentation.render_prometheus()
+        self.assertIn('skygaze_span_seconds_count{span="db.fetch"} 3', text)
+        self.assertIn('skygaze_span_seconds_bucket{span="compute.math",le="+Inf"} 1', text)
+        self.assertIn('skygaze_request_seconds_count{method="GET",route="unmatched"} 1', text)
+
+    async def test_async_functions_and_views(self):
+        with mock.patch.object(instrumentation, 'ENABLED', True):
+            fetch = instrumentation.timed('http.fetch')(asyncio.sleep)
+
+            async def view(request):
+                await fetch(0)
+                return HttpResponse()
+
+            middleware = instrumentation.InstrumentationMiddleware(view)
+            response = await middleware(AsyncRequestFactory().get('/constellations/'))
+        self.assertTrue(response['Server-Timing'].startswith('http;dur='))
+
+    def test_metrics_view(self):
+        request = RequestFactory().get('/metrics')
+        with mock.patch.object(instrumentation, 'ENABLED', False):
+            self.assertEqual(views.metrics(request).status_code, 404)
+        instrumentation.observe('skygaze_span_seconds', (('span', 'cache.get'),), 0.003)
+        with mock.patch.object(instrumentation, 'ENABLED', True):
+            response = views.metrics(request)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'skygaze_span_seconds_bucket{span="cache.get",le="0.0025"} 0', response.content)
+        self.assertIn(b'skygaze_span_seconds_bucket{span="cache.get",le="0.005"} 1', response.content)
@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import json
+import numpy as np
+from django.conf import settings
+from mainApp import sidereal
+from mainApp.engine import equatorial_to_horizontal_many, visible_mask
+
+# Live az/alt of the catalog for one site, streamed by asyncViews.track. A stream costs one vectorized
+# pass over the catalog per tick and an asyncio.sleep in between, so a worker holds hundreds of them.
+
+TRACKING_DEFAULTS = {
+    # seconds between frames
+    'INTERVAL': 1.0,
+    'MIN_INTERVAL': 0.2,
+    # seconds after which a stream ends, clients reconnect to go on
+    'MAX_DURATION': 3600,
+}
+
+def tracking_conf():
+    return {**TRACKING_DEFAULTS, **getattr(settings, 'TRACKING', {})}
+
+class SkyTracker():
+    """
+    Horizontal coordinates of a catalog for one site, with the sidereal time advanced incrementally.
+
+    GMST is computed once, at the start; every later tick adds the elapsed time at the sidereal rate.
+    """
+
+    def __init__(self, catalog, long, lat, moment):
+        """
+        Args:
+            catalog (Catalog): The constellations to track.
+            long (float): The longitude of the location in degrees.
+            lat (float): The latitude of the location in degrees.
+            moment (datetime.datetime): A naive UTC start time.
+        """
+        self.catalog = catalog
+        self.lat = lat
+        self.moment = moment
+        self.lst = sidereal.lst(sidereal.gmst_at(moment), long)
+        self.ids = np.array([elem['constell_id'] for elem in catalog], dtype=np.int64)
+
+    def advance(self, seconds):
+        self.moment += datetime.timedelta(seconds=seconds)
+        self.lst = (self.lst + seconds * sidereal.SIDEREAL_RATE / 3600) % 24
+
+    def frame(self):
+        """
+        Current coordinates of the visible constellations.
+
+        Returns:
+            dict: {'time', 'lst', 'constell_ids', 'az', 'alt'}, with the last three as parallel lists.
+        """
+        az, alt = equatorial_to_horizontal_many(self.catalog.ra, self.catalog.dec, self.lat, self.lst)
+        mask = visible_mask(az, alt)
+        return {
+            'time': f"{self.moment.isoformat(timespec='milliseconds')}Z",
+            'lst': round(self.lst, 6),
+            'constell_ids': self.ids[mask].tolist(),
+            'az': np.round(az[mask], 3).tolist(),
+            'alt': np.round(alt[mask], 3).tolist(),
+        }
+
+def encode_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def encode_ndjson(event, data):
+    return json.dumps({'event': event, **data}, separators=(',', ':')) + '\n'
+
+ENCODERS = {
+    'sse': (encode_sse, 'text/event-stream'),
+    'ndjson': (encode_ndjson, 'application/x-ndjson'),
+}
+
+async def track_events(tracker, interval, duration, encode):
+    """
+    Async generator of the encoded stream: a 'catalog' event with the names, then a 'frame' every interval seconds.
+
+    The sidereal time is advanced by the measured time between frames, so a late tick does not make the
+    coordinates drift.
+    """
+    yield encode('catalog', {
+        'constell_ids': tracker.ids.tolist(),
+        'names': [elem['name'] for elem in tracker.catalog],
+    })
+    loop = asyncio.get_running_loop()
+    started = last = loop.time()
+    while True:
+        yield encode('frame', tracker.frame())
+        if last - started + interval > duration:
+            break
+        await asyncio.sleep(interval)
+        now = loop.time()
+        tracker.advance(now - last)
+        last = now
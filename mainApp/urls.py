@@ -1,11 +1,25 @@
-from django.urls import path
-from mainApp import views
+from django.conf import settings
+from django.urls import path, re_path
+from mainApp import asyncViews, views
+
+# the I/O-bound views have async versions for ASGI deployments
+io_views = asyncViews if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
 			   path('', views.index), # http://127.0.0.1:8000/
-               path('session/', views.session),
-               path('constellations/', views.constells),
+               path('session/', io_views.session),
+               path('constellations/', io_views.constells),
                path('wiki/<str:suffix>', views.wiki_redirect),
-               path('api/get_wiki_page/', views.get_wiki_page),
-               path('api/get_by_id/', views.get_by_id),
+               path('api/get_wiki_page/', io_views.get_wiki_page),
+               path('api/get_by_id/', io_views.get_by_id),
+               path('api/get_by_ids/', io_views.get_by_ids),
+               path('api/visible/', views.get_visible),
+               path('api/get_visible_batch/', views.get_visible_batch),
+               path('api/stars/visible/', views.visible_stars),
+               path('api/stars/cone/', views.stars_in_field),
+               path('api/get_rise_set/', views.get_rise_set_times),
+               path('api/track/', io_views.track),
+               path('metrics', views.metrics),
+               path('borders/<str:name>', views.border_image),
+               re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.+)$', views.static_file),
 ]
\ No newline at end of file
@@ -1,7 +1,72 @@
-from django.http import HttpResponseNotFound, JsonResponse #HttpResponse
+import datetime
+import json
+import mimetypes
+import os
+import re
+import numpy as np
+from time import perf_counter
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotFound, HttpResponseNotModified, JsonResponse
 from django.shortcuts import redirect, render
-from mainApp.api import get_visible_constells, get_constells, get_time_date, get_constell_by_id, scrape_wiki_page, get_wiki_cached
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.views.static import was_modified_since
+from mainApp import images, instrumentation
+from mainApp.borders import NAME_RE, get_store, restore_image
+from mainApp.cache import session_cache
+from mainApp.catalog import get_catalog
+from mainApp.httpcache import CATALOG_KEY, cache_policy, constell_key, content_version, known_version, remember_version, wiki_key
+from mainApp.responses import FastJsonResponse, accepted_encodings, compressed
+from mainApp.wiki import wiki_api_url, wiki_suffix
+from mainApp.api import get_observation, get_visible_at, session_cell, get_visible_constells, get_constells, get_time_date, get_constell_by_id, get_constells_by_ids, scrape_wiki_page, get_wiki_cached, get_visible_grid, get_rise_set, get_visible_stars, get_stars_in_field
 
+# upper bound for sites x timestamps x constellations in a single batch request, 10k cells of the 88 constellations
+BATCH_MAX_VALUES = 880_000
+# upper bound for ids in a single get_by_ids request
+BATCH_MAX_IDS = 500
+
+# build_images names its outputs after their content, e.g. Orion-360.3fa9c2d1e07b.avif
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+COORDINATE_RE = re.compile(r'^[+-]?\d{1,3}(\.\d{1,10})?$')
+TIME_RE = re.compile(r'^([01]\d|2[0-3]):[0-5]\d(:[0-5]\d)?$')
+
+def page_time_date():
+	"""
+	The date and time the observation form of the pages is prefilled with, the time rounded down to the minute
+	so a page stays the same for a minute.
+	"""
+	d, t = get_time_date()
+	return d, f'{t[:5]}:00'
+
+def page_validator(request):
+	# pages change with the catalog and the minute, and embed a CSRF token bound to the visitor's cookie
+	d, t = page_time_date()
+	return (request.path, get_catalog().version, d, t, request.COOKIES.get(settings.CSRF_COOKIE_NAME)), []
+
+def constell_validator(request):
+	constell_id = int(request.GET['constell_id'])
+	return ('constell', get_catalog().version, constell_id), [CATALOG_KEY, constell_key(constell_id)]
+
+def wiki_validator(request):
+	# known once this worker served the page, until HTTP_CACHE['VALIDATOR_TTL'] or a purge
+	constell_id = int(request.GET['constell_id'])
+	catalog = get_catalog()
+	constell = catalog.get(constell_id)
+	if constell is None:
+		return None
+	suffix = wiki_suffix(constell)
+	version = known_version(wiki_key(suffix))
+	if version is None:
+		return None
+	return ('wiki', catalog.version, constell_id, version), [CATALOG_KEY, constell_key(constell_id), wiki_key(suffix)]
+
+@cache_policy('page', page_validator, weak=True, vary=('Cookie',))
 def index(request):
 	"""
 	Render the index page with the current date and time.
@@ -12,9 +77,10 @@ def index(request):
 	Returns:
 		HttpResponse: The rendered index page.
 	"""
-	d,t = get_time_date()
+	d,t = page_time_date()
 	return render(request, 'mainApp/home.html', {"DATE":d, "TIME":t})
 
+@cache_policy('session', vary=('Cookie',))
 def session(request):
 	"""
 	Handle the session request to calculate and display the visible constellations based on user input.
@@ -26,9 +92,182 @@ def session(request):
 		HttpResponse: The rendered session page displaying the visible constellations and relevant information.
 	"""
 	post = request.POST
-	visible, post = get_visible_constells(post['long'], post['lat'], post['time'], post['date'])
-	return render(request, 'mainApp/session.html', {'visible': visible, 'how_many': len(visible), 'POST' : post})
+	return render(request, 'mainApp/session.html', session_context(post['long'], post['lat'], post['time'], post['date']))
+
+def session_context(long, lat, local_time, date):
+	"""
+	Build the context of the session page, through the response cache if settings.SESSION_CACHE['ENABLED'] is on.
+
+	With the cache on, the visible list and the rendered card grid are computed once per cell of
+	rounded site and UTC time bucket (see api.session_cell) and shared by every observation in it.
+
+	Returns:
+		dict: Context for session.html.
+	"""
+	conf = session_cache.conf
+	if not conf['ENABLED']:
+		visible, post = get_visible_constells(long, lat, local_time, date)
+		return {'visible': visible, 'how_many': len(visible), 'POST' : post}
+
+	start = perf_counter()
+	post = get_observation(long, lat, local_time, date)
+	cell = session_cell(post, conf['SITE_DECIMALS'], conf['TIME_BUCKET'])
+	key = session_cache.key(get_catalog().version, *cell)
+	cached = session_cache.get(key)
+	hit = cached is not None
+	if not hit:
+		visible = get_visible_at(*cell)
+		cached = {
+			'visible': [elem.to_dict() for elem in visible],
+			'cards': render_to_string('mainApp/session_cards.html', {'visible': visible}),
+		}
+		session_cache.set(key, cached)
+	session_cache.record(hit, perf_counter() - start)
+	return {'visible': cached['visible'], 'cards': mark_safe(cached['cards']), 'how_many': len(cached['visible']), 'POST': post}
 
+def observation_params(params):
+	"""
+	Validate the observation parameters of a request.
+
+	Args:
+		params (QueryDict): "long" and "lat" in decimal degrees, optional local "time" (HH:MM[:SS])
+			and "date" (YYYY-MM-DD), the current ones by default.
+
+	Returns:
+		tuple: (long, lat, time, date) as strings, time always with seconds.
+
+	Raises:
+		ValueError: With a message for the client if a parameter is missing or malformed.
+	"""
+	long, lat = params.get('long'), params.get('lat')
+	if long is None or lat is None:
+		raise ValueError('"long" and "lat" are required.')
+	if not COORDINATE_RE.match(long) or not COORDINATE_RE.match(lat):
+		raise ValueError('"long" and "lat" must be decimal numbers, e.g. 37.6173.')
+	if not -180 <= float(long) <= 180 or not -90 <= float(lat) <= 90:
+		raise ValueError('Longtitude must be within [-180, 180] and latitude within [-90, 90].')
+	d, t = get_time_date()
+	time, date = params.get('time') or t, params.get('date') or d
+	if not TIME_RE.match(time):
+		raise ValueError('"time" must be HH:MM or HH:MM:SS.')
+	if len(time) == 5:
+		time += ':00'
+	try:
+		datetime.date.fromisoformat(date)
+	except ValueError:
+		raise ValueError('"date" must be YYYY-MM-DD.')
+	return long, lat, time, date
+
+@require_GET
+@compressed
+def get_visible(request):
+	"""
+	JSON version of the session page.
+
+	Args:
+		request: http request with the parameters of observation_params and an optional "format"
+			("rows" by default, or "columnar") in GET-method dictionary.
+
+	Returns:
+		Json-object with fields {observation, count} and either "visible" (a list of {constell_id, name, az, alt})
+		or, in the columnar format, parallel "constell_ids", "az" and "alt" lists.
+	"""
+	try:
+		long, lat, time, date = observation_params(request.GET)
+	except ValueError as exc:
+		return FastJsonResponse({'error': str(exc)}, status=400)
+	layout = request.GET.get('format', 'rows')
+	if layout not in ('rows', 'columnar'):
+		return FastJsonResponse({'error': '"format" must be "rows" or "columnar".'}, status=400)
+
+	visible, observ_info = get_visible_constells(long, lat, time, date)
+	data = {
+		'observation': {
+			'long': float(observ_info['Longtitude']),
+			'lat': float(observ_info['Latitude']),
+			'local_time': observ_info['Local_Time'],
+			'utc_time': observ_info['UTC_Time'],
+			'date': observ_info['Date'],
+		},
+		'count': len(visible),
+	}
+	if layout == 'columnar':
+		data['constell_ids'] = [elem.constell_id for elem in visible]
+		data['az'] = [elem.az for elem in visible]
+		data['alt'] = [elem.alt for elem in visible]
+	else:
+		data['visible'] = [elem.to_dict() for elem in visible]
+	return FastJsonResponse(data)
+
+def optional_float(params, name, low, high):
+	"""
+	Read an optional number within [low, high] from request parameters.
+
+	Raises:
+		ValueError: With a message for the client if the parameter is malformed.
+	"""
+	value = params.get(name)
+	if value in (None, ''):
+		return None
+	try:
+		value = float(value)
+	except ValueError:
+		raise ValueError(f'"{name}" must be a number.')
+	if not low <= value <= high:
+		raise ValueError(f'"{name}" must be within [{low}, {high}].')
+	return value
+
+@require_GET
+@compressed
+def visible_stars(request):
+	"""
+	Objects of the star catalog above the horizon, brightest first.
+
+	Args:
+		request: http request with the parameters of observation_params and optional "min_alt" (degrees),
+			"max_mag" and "limit" in GET-method dictionary.
+
+	Returns:
+		Json-object with fields {observation, count, star_ids, names, mag, az, alt}, the last five as parallel lists.
+	"""
+	try:
+		long, lat, time, date = observation_params(request.GET)
+		min_alt = optional_float(request.GET, 'min_alt', -90, 90) or 0.0
+		max_mag = optional_float(request.GET, 'max_mag', -30, 30)
+		limit = optional_float(request.GET, 'limit', 1, 1_000_000)
+	except ValueError as exc:
+		return FastJsonResponse({'error': str(exc)}, status=400)
+	data, observ_info = get_visible_stars(long, lat, time, date, min_alt, max_mag, limit and int(limit))
+	observation = {'long': float(observ_info['Longtitude']), 'lat': float(observ_info['Latitude']),
+				   'local_time': observ_info['Local_Time'], 'utc_time': observ_info['UTC_Time'], 'date': observ_info['Date']}
+	return FastJsonResponse({'observation': observation, **data})
+
+@require_GET
+@compressed
+def stars_in_field(request):
+	"""
+	Objects of the star catalog within a field of view, brightest first.
+
+	Args:
+		request: http request with "ra" (hours), "dec" and "radius" (degrees), and optional "max_mag" and "limit"
+			in GET-method dictionary.
+
+	Returns:
+		Json-object with fields {count, star_ids, names, mag, ra, dec, separation}, the last six as parallel lists.
+	"""
+	try:
+		ra = optional_float(request.GET, 'ra', 0, 24)
+		dec = optional_float(request.GET, 'dec', -90, 90)
+		radius = optional_float(request.GET, 'radius', 0, 180)
+		if ra is None or dec is None or radius is None:
+			raise ValueError('"ra", "dec" and "radius" are required.')
+		max_mag = optional_float(request.GET, 'max_mag', -30, 30)
+		limit = optional_float(request.GET, 'limit', 1, 1_000_000)
+	except ValueError as exc:
+		return FastJsonResponse({'error': str(exc)}, status=400)
+	return FastJsonResponse(get_stars_in_field(ra, dec, radius, max_mag, limit and int(limit)))
+
+@cache_policy('page', page_validator, weak=True, vary=('Cookie',))
 def constells(request):
 	"""
 	Render the constellations page with the list of constellations and current date and time.
@@ -40,9 +279,10 @@ def constells(request):
 		HttpResponse: The rendered constellations page with the list of constellations and current date and time.
 	"""
 	constells = get_constells()
-	d,t = get_time_date()
+	d,t = page_time_date()
 	return render(request, 'mainApp/constellations.html', {"constells": constells, "DATE":d, "TIME":t})
 
+@cache_policy('catalog', constell_validator)
 def get_by_id(request):
 	"""
 	Find constellation in MongoDB using ObjectId's id-string (ex 65469404c1e20947088ca732)
@@ -57,6 +297,145 @@ def get_by_id(request):
 	constell = get_constell_by_id(int(constell_id))
 	return JsonResponse(constell)
 
+def by_ids_params(params):
+	"""
+	Validate the parameters of a get_by_ids request.
+
+	Args:
+		params (QueryDict): Comma-separated integer "ids", optional comma-separated "fields". Both may be repeated.
+
+	Returns:
+		tuple (list, list): The ids in request order and the fields, empty for all of them.
+
+	Raises:
+		ValueError: With a message for the client if a parameter is missing or malformed.
+	"""
+	ids = [elem for value in params.getlist('ids') for elem in value.split(',') if elem.strip()]
+	if not ids:
+		raise ValueError('"ids" is required, e.g. ids=1,2,60.')
+	if len(ids) > BATCH_MAX_IDS:
+		raise ValueError(f'At most {BATCH_MAX_IDS} ids are allowed.')
+	try:
+		ids = [int(elem) for elem in ids]
+	except ValueError:
+		raise ValueError('"ids" must be comma-separated integers.')
+	fields = [elem.strip() for value in params.getlist('fields') for elem in value.split(',') if elem.strip()]
+	return ids, fields
+
+def by_ids_data(constells, errors):
+	return {
+		'constells': constells,
+		'count': sum(constell is not None for constell in constells),
+		'errors': [{'constell_id': constell_id, 'error': error} for constell_id, error in errors.items()],
+	}
+
+def constells_by_ids_validator(request):
+	ids, fields = by_ids_params(request.GET)
+	return ('constells', get_catalog().version, ids, fields), [CATALOG_KEY, *map(constell_key, ids)]
+
+@require_GET
+@compressed
+@cache_policy('catalog', constells_by_ids_validator, weak=True, vary=('Accept-Encoding',))
+def get_by_ids(request):
+	"""
+	Find many constellations with one request, instead of one get_by_id per constellation.
+
+	Args:
+		request: http request with the parameters of by_ids_params in GET-method dictionary.
+
+	Returns:
+		Json-object with fields {constells, count, errors}: the objects in request order with the requested
+		fields (null for the ids that couldn't be resolved), how many were found, and a {constell_id, error}
+		of every unresolved id. A partial result is still a 200.
+	"""
+	try:
+		ids, fields = by_ids_params(request.GET)
+	except ValueError as exc:
+		return FastJsonResponse({'error': str(exc)}, status=400)
+	return FastJsonResponse(by_ids_data(*get_constells_by_ids(ids, fields)))
+
+@csrf_exempt
+@require_POST
+@compressed
+def get_visible_batch(request):
+	"""
+	Compute visibility of every constellation for N observation sites at M UTC timestamps.
+
+	Args:
+		request: http request with JSON body {"sites": [[long, lat], ...], "timestamps": ["YYYY-MM-DDTHH:MM:SS", ...]}
+			and an optional "positions": true.
+
+	Returns:
+		Json-object with fields {constells, sites, timestamps, visible}, where visible[site][timestamp] lists the
+		indexes in constells of the visible constellations. With positions, "az" and "alt" hold their coordinates
+		in the same nesting and order.
+	"""
+	try:
+		body = json.loads(request.body)
+		sites = [(float(long), float(lat)) for long, lat in body['sites']]
+		timestamps = [datetime.datetime.fromisoformat(moment) for moment in body['timestamps']]
+		# aware timestamps are moved to UTC, naive ones are taken as UTC already
+		timestamps = [moment.astimezone(datetime.timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+					  for moment in timestamps]
+		positions = body.get('positions', False)
+		if not isinstance(positions, bool):
+			raise TypeError('"positions" must be true or false')
+	except (ValueError, TypeError, KeyError, AttributeError) as exc:
+		return FastJsonResponse({'error': f'Malformed batch request: {exc}'}, status=400)
+	if not sites or not timestamps:
+		return FastJsonResponse({'error': 'Both "sites" and "timestamps" must be non-empty.'}, status=400)
+	max_cells = BATCH_MAX_VALUES // max(len(get_catalog()), 1)
+	if len(sites) * len(timestamps) > max_cells:
+		return FastJsonResponse({'error': f'At most {max_cells} site/timestamp pairs are allowed.'}, status=400)
+	if any(not -180 <= long <= 180 or not -90 <= lat <= 90 for long, lat in sites):
+		return FastJsonResponse({'error': 'Longtitude must be within [-180, 180] and latitude within [-90, 90].'}, status=400)
+
+	grid = get_visible_grid(sites, timestamps)
+	visible = [[np.flatnonzero(cell) for cell in row] for row in grid['visible']]
+	data = {
+		'constells': [{'constell_id': elem['constell_id'], 'name': elem['name']} for elem in grid['constells']],
+		'sites': sites,
+		'timestamps': [moment.isoformat() for moment in timestamps],
+		'visible': [[indexes.tolist() for indexes in row] for row in visible],
+	}
+	if positions:
+		for name in ('az', 'alt'):
+			values = np.round(grid[name], 3)
+			data[name] = [[values[i, j, indexes].tolist() for j, indexes in enumerate(row)] for i, row in enumerate(visible)]
+	return FastJsonResponse(data)
+
+@require_GET
+@compressed
+def get_rise_set_times(request):
+	"""
+	Compute rise, transit and set times and the maximum altitude of every constellation for a night.
+
+	Args:
+		request: http request with "long", "lat" and "date" (local date, YYYY-MM-DD) in GET-method dictionary.
+
+	Returns:
+		Json-object with fields {site, date, utc_offset, window, constells}, see api.calculate_rise_set.
+	"""
+	try:
+		long = float(request.GET['long'])
+		lat = float(request.GET['lat'])
+		date = datetime.date.fromisoformat(request.GET['date'])
+	except (ValueError, KeyError) as exc:
+		return FastJsonResponse({'error': f'Malformed request: {exc}'}, status=400)
+	if not -180 <= long <= 180 or not -90 <= lat <= 90:
+		return FastJsonResponse({'error': 'Longtitude must be within [-180, 180] and latitude within [-90, 90].'}, status=400)
+	return FastJsonResponse(get_rise_set(long, lat, date))
+
+def track(request):
+	"""
+	Stand-in for asyncViews.track under WSGI, where every stream would hold a worker thread for its duration.
+
+	Returns:
+		Json-object with an error and status 501.
+	"""
+	return FastJsonResponse({'error': 'Tracking streams need the async views, serve the project with ASGI and SKYGAZE_ASYNC_VIEWS=1.'}, status=501)
+
+@cache_policy('wiki', wiki_validator)
 def get_wiki_page(request):
 	"""
 	Retrieve and return data from a Wikipedia page related to a specific constellation.
@@ -69,12 +448,108 @@ def get_wiki_page(request):
 	"""
 	constell_id = request.GET.get('constell_id')
 	constell = get_constell_by_id(int(constell_id))
-	wiki_url_suffix = constell['wiki'].split('/')[-1]
-	wiki_url = f'https://en.wikipedia.org/w/api.php?action=parse&page={wiki_url_suffix}&format=json'
-	const_data = get_wiki_cached(wiki_url, wiki_url_suffix)
+	wiki_url_suffix = wiki_suffix(constell)
+	wiki_url = wiki_api_url(wiki_url_suffix)
+	# coalesced callers share the dict of one scrape
+	const_data = dict(get_wiki_cached(wiki_url, wiki_url_suffix))
+	remember_version(wiki_key(wiki_url_suffix), const_data.get('revid') or content_version(const_data))
 	const_data.update({"name": constell['name'], "wiki":constell['wiki']})
 	return JsonResponse(const_data)
 
+def metrics(request):
+	"""
+	Export the timing histograms of this process in the Prometheus text format.
+
+	Args:
+		request: The HTTP request object.
+
+	Returns:
+		HttpResponse: The histograms, or 404 if instrumentation is disabled.
+	"""
+	if not instrumentation.ENABLED:
+		return HttpResponseNotFound("<h1>Page Not Found</h1>")
+	return HttpResponse(instrumentation.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@require_GET
+def static_file(request, path):
+	"""
+	Serve a static file, with the .br or .gz sibling written by build_images if the client accepts it.
+
+	Content-hashed files are cached for a year, the others revalidated with Last-Modified.
+	runserver serves /static/ itself unless it's started with --nostatic.
+
+	Args:
+		request: The HTTP request object.
+		path (str): The path of the file below STATIC_URL.
+
+	Returns:
+		FileResponse: The file, 304 if the client's copy is current, or 404.
+	"""
+	try:
+		found = finders.find(path)
+	except SuspiciousFileOperation:
+		found = None
+	if not found or not os.path.isfile(found):
+		raise Http404(f'"{path}" does not exist')
+
+	# older Pythons don't know AVIF
+	content_type = images.MIME_TYPES.get(found.rpartition('.')[2]) or mimetypes.guess_type(found)[0]
+	serve, encoding = found, None
+	stat = os.stat(found)
+	accepted = accepted_encodings(request)
+	for suffix, coding in (('.br', 'br'), ('.gz', 'gzip')):
+		if coding in accepted and os.path.isfile(found + suffix):
+			# a sibling older than its source wasn't rebuilt since the source was edited
+			if os.stat(found + suffix).st_mtime >= stat.st_mtime:
+				serve, encoding = found + suffix, coding
+				break
+	if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+		return HttpResponseNotModified()
+
+	response = FileResponse(open(serve, 'rb'), content_type=content_type or 'application/octet-stream')
+	response['Last-Modified'] = http_date(stat.st_mtime)
+	if encoding:
+		response['Content-Encoding'] = encoding
+	if os.path.isfile(found + '.gz') or os.path.isfile(found + '.br'):
+		patch_vary_headers(response, ('Accept-Encoding',))
+	if HASHED_NAME_RE.search(path):
+		response['Cache-Control'] = 'public, max-age=31536000, immutable'
+	else:
+		response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+	return response
+
+@require_GET
+def border_image(request, name):
+	"""
+	Serve a mirrored border image, downloading it again if it was evicted from the store.
+
+	Args:
+		request: The HTTP request object.
+		name (str): The content-addressed file name, as linked by the scraped 'border_img'.
+
+	Returns:
+		FileResponse: The image, cached for a year, a redirect to its source if it can't be restored, or 404.
+	"""
+	store = get_store()
+	if store is None or not NAME_RE.match(name):
+		raise Http404(f'"{name}" does not exist')
+	try:
+		if not store.path(name).is_file():
+			restore_image(name)
+		image = open(store.path(name), 'rb')
+	except FileNotFoundError:
+		source = store.source(name)
+		if source is None:
+			raise Http404(f'"{name}" does not exist')
+		return redirect(source)
+	store.touch(name)
+	response = FileResponse(image, content_type=mimetypes.guess_type(name)[0])
+	response['Cache-Control'] = 'public, max-age=31536000, immutable'
+	# svg files may carry scripts, they must not run on our origin
+	response['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'"
+	response['X-Content-Type-Options'] = 'nosniff'
+	return response
+
 def pageNotFound(request, exception):
 	"""
 	Handle the page not found error by returning an HTTP 404 response.
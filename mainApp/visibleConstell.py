@@ -1,9 +1,21 @@
 class VisibleConstell():
+    """
+    A constellation above the horizon with its horizontal coordinates.
+
+    db_info is the shared catalog document, referenced and never copied. Name and id are kept on the
+    result itself, so templates and JSON output don't have to reach into the document.
+    """
+    __slots__ = ('name', 'constell_id', 'az', 'alt', 'db_info')
 
     def __init__(self, db_info, az, alt):
         self.db_info = db_info
+        self.name = db_info['name']
+        self.constell_id = db_info['constell_id']
         self.az = az
         self.alt = alt
-    
+
+    def to_dict(self):
+        return {'constell_id': self.constell_id, 'name': self.name, 'az': self.az, 'alt': self.alt}
+
     def __repr__(self):
-        return self.db_info['name']
\ No newline at end of file
+        return self.name
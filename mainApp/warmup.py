@@ -0,0 +1,95 @@
+import datetime
+import os
+import sys
+import time
+from django.conf import settings
+from django.template.loader import get_template
+from pymongo.errors import PyMongoError
+from redis.exceptions import RedisError
+from mainApp import pools, sidereal
+from mainApp.catalog import get_catalog
+from mainApp.skyIndex import get_sky_index
+
+# Work a cold worker would otherwise do on its first requests, run once by SkygazeConfig.ready() when
+# settings.WARMUP['ENABLED'] is on. Every step is optional and a failing one (e.g. MongoDB still starting)
+# is reported and skipped, the worker then falls back to loading lazily as usual.
+
+WARMUP_DEFAULTS = {
+    'ENABLED': False,
+    # management commands that warm up, the others (migrate, test...) start without touching the pools
+    'COMMANDS': ('runserver',),
+    'POOLS': True,
+    'CATALOG': True,
+    # days of GMST at 0h UT precomputed, starting yesterday
+    'SIDEREAL_DAYS': 366,
+    'SKY_INDEX': True,
+    'TEMPLATES': ('mainApp/home.html', 'mainApp/session.html', 'mainApp/session_cards.html', 'mainApp/constellations.html'),
+}
+
+def warmup_conf():
+    return {**WARMUP_DEFAULTS, **getattr(settings, 'WARMUP', {})}
+
+def should_warm_up(argv=None):
+    """
+    Whether this process serves requests and the warmup is enabled.
+
+    Application servers (gunicorn, uvicorn...) always warm up, manage.py only for settings.WARMUP['COMMANDS'].
+    """
+    conf = warmup_conf()
+    argv = sys.argv if argv is None else argv
+    if not conf['ENABLED']:
+        return False
+    if argv and argv[0].endswith('manage.py'):
+        if len(argv) < 2 or argv[1] not in conf['COMMANDS']:
+            return False
+        # the autoreloader's parent process only watches files, its child serves
+        if argv[1] == 'runserver' and '--noreload' not in argv:
+            return os.environ.get('RUN_MAIN') == 'true'
+    return True
+
+def open_pools():
+    # the clients are lazy, a round trip opens the first connection of each pool
+    pools.get_mongo_client().admin.command('ping')
+    pools.get_redis()
+
+def precompute_sidereal(days):
+    sidereal.precompute_gmst_table(datetime.date.today() - datetime.timedelta(days=1), days)
+
+def load_templates(names):
+    for name in names:
+        get_template(name)
+
+def warm_up(conf=None):
+    """
+    Run the enabled warmup steps.
+
+    Args:
+        conf (dict): Settings of the steps, settings.WARMUP by default.
+
+    Returns:
+        dict: Seconds spent by every step that ran, None for the ones that failed.
+    """
+    conf = conf or warmup_conf()
+    steps = []
+    if conf['POOLS']:
+        steps.append(('pools', open_pools))
+    if conf['CATALOG']:
+        steps.append(('catalog', get_catalog))
+    if conf['SIDEREAL_DAYS']:
+        steps.append(('sidereal', lambda: precompute_sidereal(conf['SIDEREAL_DAYS'])))
+    if conf['SKY_INDEX']:
+        steps.append(('sky_index', get_sky_index))
+    if conf['TEMPLATES']:
+        steps.append(('templates', lambda: load_templates(conf['TEMPLATES'])))
+
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except (PyMongoError, RedisError, OSError) as exc:
+            print(f"Warmup step {name} failed, it will be done on first use: {exc!r}")
+            timings[name] = None
+        else:
+            timings[name] = time.perf_counter() - start
+    return timings
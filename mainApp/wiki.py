@@ -0,0 +1,538 @@
+import asyncio
+import datetime
+import json
+import threading
+from concurrent.futures import Future
+from urllib.parse import quote
+from django.conf import settings
+from pymongo.errors import PyMongoError
+from redis.exceptions import RedisError
+from mainApp import pools
+from mainApp.borders import amirror_image, aresolve_images
+from mainApp.httpcache import purge, wiki_key
+from mainApp.instrumentation import timed
+
+WIKI_DEFAULTS = {
+    'BASE_URL': 'https://en.wikipedia.org',
+    # simultaneous requests of the background warmer
+    'CONCURRENCY': 8,
+    # attempts per request on network errors and 429/5xx responses
+    'RETRIES': 3,
+    # seconds
+    'TIMEOUT': 10,
+    # seconds scraped pages live in Redis in front of MongoDB
+    'L1_TTL': 300,
+    # seconds after which a stored page is served once more and refreshed in the background
+    'STALE_AFTER': 7 * 24 * 3600,
+    # titles per revision query, the API's limit for anonymous clients
+    'BATCH_SIZE': 50,
+}
+
+_inflight = {}
+_refreshing = set()
+_inflight_lock = threading.Lock()
+# async counterparts, only touched from the event loop
+_ainflight = {}
+_background_tasks = set()
+
+def wiki_conf():
+    return {**WIKI_DEFAULTS, **getattr(settings, 'WIKI', {})}
+
+def wiki_suffix(constell):
+    """
+    Get the Wikipedia page title of a constellation, e.g. 'Orion_(constellation)'.
+    """
+    return constell['wiki'].split('/')[-1]
+
+def wiki_api_url(suffix):
+    """
+    Get the MediaWiki parse API url of a page.
+    """
+    return f"{wiki_conf()['BASE_URL']}/w/api.php?action=parse&page={suffix}&format=json"
+
+def revisions_url(suffixes):
+    """
+    Get the MediaWiki info API url returning the current revision ids of pages.
+    """
+    titles = quote('|'.join(suffixes), safe='')
+    return f"{wiki_conf()['BASE_URL']}/w/api.php?action=query&prop=info&titles={titles}&format=json&formatversion=2"
+
+def parse_revisions(data):
+    """
+    Read the revision ids from an info API response.
+
+    Returns:
+        dict: Current revision id by requested title. Missing pages are left out.
+    """
+    query = data.get('query', {})
+    # the API answers with normalized titles ('Orion (constellation)'), map them back to the requested ones
+    requested = {elem['to']: elem['from'] for elem in query.get('normalized', [])}
+    return {requested.get(page['title'], page['title']): page['lastrevid']
+            for page in query.get('pages', []) if 'lastrevid' in page}
+
+def _batches(suffixes):
+    size = wiki_conf()['BATCH_SIZE']
+    return [suffixes[start:start + size] for start in range(0, len(suffixes), size)]
+
+@timed('http.revisions')
+def current_revids(suffixes):
+    """
+    Ask Wikipedia for the current revision ids of pages, with one request per BATCH_SIZE pages.
+
+    Returns:
+        dict: Same as parse_revisions.
+    """
+    import httpx
+    revids = {}
+    for batch in _batches(list(suffixes)):
+        response = httpx.get(revisions_url(batch), follow_redirects=True, timeout=wiki_conf()['TIMEOUT'])
+        response.raise_for_status()
+        revids.update(parse_revisions(response.json()))
+    return revids
+
+async def acurrent_revids(client, suffixes, retries):
+    """
+    Async counterpart of current_revids, with the retries of _get.
+    """
+    revids = {}
+    responses = await asyncio.gather(*(_get(client, revisions_url(batch), retries) for batch in _batches(list(suffixes))))
+    for response in responses:
+        revids.update(parse_revisions(response.json()))
+    return revids
+
+# everything parse_wiki_page needs sits in the lead section, above the first heading of the article
+LEAD_END_MARKERS = ('<div class="mw-heading', '<h2')
+
+def lead_section(page):
+    """
+    Cut the html of a Wikipedia page down to the short description, the infobox and the lead paragraphs.
+    """
+    ends = [index for index in (page.find(marker) for marker in LEAD_END_MARKERS) if index != -1]
+    return page[:min(ends)] if ends else page
+
+@timed('parse.wiki_page')
+def parse_wiki_page(page):
+    """
+    Extracts constellation info from the html of a Wikipedia page.
+
+    Only the lead section is parsed, and the infobox labels are scanned once for every row we need.
+
+    Args:
+        page (str): The html content of the page, as returned by the parse API.
+
+    Returns:
+        dict: The same fields as scrape_wiki_page, but 'border_img_page' holds the href of the
+            image's file page instead of 'border_img'.
+    """
+    # the scraper's libraries are imported on first use, most workers never scrape
+    from selectolax.parser import HTMLParser
+    # create as parsing tree
+    parsed = HTMLParser(lead_section(page))
+    # retrieve short description from tree by searching a div with class="shortdescription
+    short_desc = parsed.css_first("div.shortdescription").text()
+
+    # the td (table-data) of a row is the next sibling of its th with class="infobox-label"
+    rows = {}
+    for label in parsed.css("th.infobox-label"):
+        text = label.text()
+        for wanted in ('Symbolism', 'Bordering'):
+            if wanted not in rows and wanted in text:
+                rows[wanted] = label.next
+        if len(rows) == 2:
+            break
+
+    # get rid of any [2] wikipedia stuff
+    symbolism = rows['Symbolism'].text().split('[')[0].title()
+
+    visibility = parsed.css_first("td.infobox-below").text()
+
+    infobox = parsed.css_first("table.infobox.plainlist")
+    cursor = infobox.next.next.child
+    flavor_text = []
+    while cursor.next is not None:
+        if cursor.tag != "sup":
+            flavor_text.append(cursor.text())
+        cursor=cursor.next
+    flavor_text = ''.join(flavor_text)
+
+    # lets chop up our flavor text a lil bit
+    index_of_space = flavor_text.find(' ', 290, 320)
+    flavor_text = flavor_text[:index_of_space]
+
+    # links to bordering constellations, without the [n] citation links
+    neighbours = [node.text() for node in rows['Bordering'].traverse()
+                  if node.tag == 'a' and not (node.attributes.get('href') or '#cite').startswith('#cite')]
+    neighbours = ''.join(['<ul>'] + [f'<li>{name}</li>' for name in neighbours])
+
+    image = infobox.css_first(".infobox-image")
+    image = image.css_first("img").parent.attributes["href"]
+
+    return {
+        'shortdesc': short_desc,
+        'symbolism': symbolism,
+        'neighbours': neighbours,
+        'visibility': visibility,
+        'flavor_text' : flavor_text,
+        'border_img_page' : image,
+    }
+
+@timed('db.save_wiki_page')
+def save_wiki_page(suffix, scraped):
+    """
+    Store scraped data of a page in the wiki_pages collection of MongoDB.
+
+    Args:
+        suffix (str): The Wikipedia page title.
+        scraped (dict): The result of scrape_wiki_page.
+    """
+    pools.get_mongo_collection('wiki_pages').replace_one(
+        {'_id': suffix},
+        {'_id': suffix, 'data': scraped, 'fetched_at': datetime.datetime.now(datetime.timezone.utc)},
+        upsert=True)
+    purge([wiki_key(suffix)])
+
+@timed('db.stored_revids')
+def stored_revids(suffixes):
+    """
+    Read the revision ids of stored pages from MongoDB.
+
+    Returns:
+        dict: Revision id by suffix, None for pages stored before revisions were recorded.
+    """
+    entries = pools.get_mongo_collection('wiki_pages').find({'_id': {'$in': list(suffixes)}}, {'data.revid': 1})
+    return {entry['_id']: entry['data'].get('revid') for entry in entries}
+
+@timed('db.touch_wiki_pages')
+def touch_wiki_pages(suffixes):
+    """
+    Mark stored pages as fetched now, for pages whose revision didn't change since they were scraped.
+    """
+    pools.get_mongo_collection('wiki_pages').update_many(
+        {'_id': {'$in': list(suffixes)}}, {'$set': {'fetched_at': datetime.datetime.now(datetime.timezone.utc)}})
+
+@timed('db.load_wiki_entry')
+def load_wiki_entry(suffix):
+    """
+    Read stored scraped data of a page from MongoDB.
+
+    Returns:
+        dict: {'_id', 'data', 'fetched_at'}, or None if the page was never stored or MongoDB is unreachable.
+    """
+    if pools.mongo_is_down():
+        return None
+    try:
+        return pools.get_mongo_collection('wiki_pages').find_one({'_id': suffix})
+    except PyMongoError as exc:
+        pools.mark_mongo_down()
+        print(f"Unable to read {suffix} from MongoDB, scraping it: {exc!r}")
+        return None
+
+def is_stale(entry):
+    """
+    Check whether a stored page is older than settings.WIKI['STALE_AFTER'].
+    """
+    fetched_at = entry['fetched_at'].replace(tzinfo=None)
+    age = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - fetched_at
+    return age.total_seconds() > wiki_conf()['STALE_AFTER']
+
+def coalesce(key, func):
+    """
+    Run func() once for all callers that ask for the same key at the same time.
+
+    The first caller runs it, everyone arriving while it runs waits for and shares its result (or exception).
+
+    Returns:
+        The result of func().
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        result = func()
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+def claim_refresh(suffix, ttl=60):
+    """
+    Take the cross-worker refresh lock of a page, so a stale page is rescraped by one worker only.
+
+    Returns:
+        bool: True if this worker should refresh the page.
+    """
+    redis_coll = pools.get_redis()
+    if redis_coll is None:
+        return True
+    try:
+        return bool(redis_coll.set(f'wiki:refreshing:{suffix}', 1, nx=True, ex=ttl))
+    except RedisError:
+        pools.mark_redis_down()
+        return True
+
+def refresh_in_background(key, func):
+    """
+    Run func() in a background thread, unless a refresh of the key is already running in this process.
+
+    Returns:
+        threading.Thread: The started thread, or None if a refresh was already running.
+    """
+    with _inflight_lock:
+        if key in _refreshing:
+            return None
+        _refreshing.add(key)
+
+    def run():
+        try:
+            if claim_refresh(key):
+                coalesce(key, func)
+        except Exception as exc:
+            print(f"Background refresh of {key} failed: {exc!r}")
+        finally:
+            with _inflight_lock:
+                _refreshing.discard(key)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+@timed('http.get')
+async def _get(client, url, retries):
+    # GET with exponential backoff on network errors, throttling and server errors
+    import httpx
+    for attempt in range(retries):
+        try:
+            response = await client.get(url)
+        except httpx.TransportError:
+            if attempt == retries - 1:
+                raise
+        else:
+            if response.status_code != 429 and response.status_code < 500:
+                response.raise_for_status()
+                return response
+            if attempt == retries - 1:
+                response.raise_for_status()
+        await asyncio.sleep(0.5 * 2 ** attempt)
+
+async def fetch_page(client, suffix, retries):
+    # the parsed page, with the border image still to resolve
+    data = (await _get(client, wiki_api_url(suffix), retries)).json()['parse']
+    scraped = parse_wiki_page(data['text']['*'])
+    # the revision the page was scraped at, refreshes skip the pages still at it
+    scraped['revid'] = data.get('revid')
+    return scraped
+
+async def attach_border_image(client, scraped, url, retries):
+    # replace the file page link of a parsed page with the mirrored image
+    del scraped['border_img_page']
+    scraped['border_img'] = await amirror_image(client, url, retries) if url else None
+    return scraped
+
+async def fetch_wiki_page(client, suffix, retries=None):
+    """
+    Scrapes a Wikipedia page and its border image with an async client.
+
+    Args:
+        client (httpx.AsyncClient): The client to use.
+        suffix (str): The Wikipedia page title.
+        retries (int): Attempts per request, settings.WIKI['RETRIES'] by default.
+
+    Returns:
+        dict: Same as scrape_wiki_page.
+    """
+    retries = retries or wiki_conf()['RETRIES']
+    scraped = await fetch_page(client, suffix, retries)
+    href = scraped['border_img_page']
+    url = (await aresolve_images(client, [href], retries))[href]
+    return await attach_border_image(client, scraped, url, retries)
+
+async def scrape_many(suffixes, concurrency=None, retries=None, store=None, revids=None, touch=None):
+    """
+    Scrapes many Wikipedia pages concurrently.
+
+    The pages are fetched first, then all their border images are resolved with BATCH_SIZE files per
+    imageinfo request, and mirrored. Given the revision ids of the stored pages, the current ones are
+    asked first (BATCH_SIZE pages per request) and only the pages that changed are scraped.
+
+    Args:
+        suffixes (list): Wikipedia page titles.
+        concurrency (int): Maximum number of pages in flight, settings.WIKI['CONCURRENCY'] by default.
+        retries (int): Attempts per request, settings.WIKI['RETRIES'] by default.
+        store (callable): Called as store(suffix, scraped) for every scraped page.
+        revids (dict): Revision id of the stored pages by suffix, None to scrape every page.
+        touch (callable): Called as touch(suffixes) with the pages skipped because they didn't change.
+
+    Returns:
+        dict: Scraped data, the exception that stopped the page, or None for an unchanged page, by suffix.
+    """
+    import httpx
+    conf = wiki_conf()
+    retries = retries or conf['RETRIES']
+    semaphore = asyncio.Semaphore(concurrency or conf['CONCURRENCY'])
+    results = {}
+
+    async def fetch_one(client, suffix):
+        async with semaphore:
+            try:
+                results[suffix] = await fetch_page(client, suffix, retries)
+            except Exception as exc:
+                results[suffix] = exc
+
+    async def finish_one(client, suffix, url):
+        async with semaphore:
+            try:
+                scraped = await attach_border_image(client, results[suffix], url, retries)
+                if store is not None:
+                    # stores are blocking (pymongo), keep them off the event loop
+                    await asyncio.to_thread(store, suffix, scraped)
+            except Exception as exc:
+                results[suffix] = exc
+
+    async with httpx.AsyncClient(timeout=conf['TIMEOUT'], follow_redirects=True) as client:
+        if revids is not None:
+            try:
+                current = await acurrent_revids(client, suffixes, retries)
+            except Exception as exc:
+                return dict.fromkeys(suffixes, exc)
+            unchanged = [suffix for suffix in suffixes if suffix in current and current[suffix] == revids.get(suffix)]
+            results.update(dict.fromkeys(unchanged))
+            if unchanged and touch is not None:
+                await asyncio.to_thread(touch, unchanged)
+            suffixes = [suffix for suffix in suffixes if suffix not in results]
+        await asyncio.gather(*(fetch_one(client, suffix) for suffix in suffixes))
+        parsed = [suffix for suffix in suffixes if not isinstance(results[suffix], Exception)]
+        try:
+            urls = await aresolve_images(client, [results[suffix]['border_img_page'] for suffix in parsed], retries)
+        except Exception as exc:
+            for suffix in parsed:
+                results[suffix] = exc
+            return results
+        await asyncio.gather(*(finish_one(client, suffix, urls[results[suffix]['border_img_page']]) for suffix in parsed))
+    return results
+
+def warm_wiki_pages(suffixes, concurrency=None, retries=None, store=save_wiki_page, incremental=False):
+    """
+    Scrapes every given page and stores the results, so requests never have to wait on Wikipedia.
+
+    With incremental, only the pages whose revision changed since they were stored in MongoDB (or that
+    were never stored) are scraped, the others are marked as fetched now.
+
+    Returns:
+        dict: Same as scrape_many.
+    """
+    if not incremental:
+        return asyncio.run(scrape_many(suffixes, concurrency, retries, store))
+    return asyncio.run(scrape_many(suffixes, concurrency, retries, store, stored_revids(suffixes), touch_wiki_pages))
+
+async def acoalesce(key, factory):
+    """
+    Async counterpart of coalesce(): concurrent callers with the same key await one task created by factory().
+
+    The task is shielded, so a cancelled request does not cancel the work others are waiting for.
+    """
+    task = _ainflight.get(key)
+    if task is None:
+        task = _ainflight[key] = asyncio.ensure_future(factory())
+        task.add_done_callback(lambda _: _ainflight.pop(key, None))
+    return await asyncio.shield(task)
+
+@timed('cache.set')
+async def _acache(suffix, scraped):
+    redis_coll = await pools.get_async_redis()
+    if redis_coll is not None:
+        try:
+            await redis_coll.set(suffix, json.dumps(scraped), ex=wiki_conf()['L1_TTL'])
+        except RedisError:
+            pools.mark_redis_down()
+
+async def ascrape_and_store(suffix):
+    """
+    Async counterpart of api.scrape_and_store.
+    """
+    scraped = await fetch_wiki_page(pools.get_async_http_client(), suffix)
+    try:
+        await pools.get_async_mongo_collection('wiki_pages').replace_one(
+            {'_id': suffix},
+            {'_id': suffix, 'data': scraped, 'fetched_at': datetime.datetime.now(datetime.timezone.utc)},
+            upsert=True)
+    except PyMongoError as exc:
+        print(f"Unable to store {suffix} in MongoDB: {exc!r}")
+    else:
+        purge([wiki_key(suffix)])
+    await _acache(suffix, scraped)
+    return scraped
+
+async def arefresh_wiki_page(suffix, stored):
+    """
+    Async counterpart of api.refresh_wiki_page.
+    """
+    revid = stored['data'].get('revid')
+    if revid is not None:
+        client = pools.get_async_http_client()
+        current = await acurrent_revids(client, [suffix], wiki_conf()['RETRIES'])
+        if current.get(suffix) == revid:
+            await pools.get_async_mongo_collection('wiki_pages').update_one(
+                {'_id': suffix}, {'$set': {'fetched_at': datetime.datetime.now(datetime.timezone.utc)}})
+            return stored['data']
+    return await ascrape_and_store(suffix)
+
+async def _arefresh(suffix, stored):
+    redis_coll = await pools.get_async_redis()
+    if redis_coll is not None:
+        try:
+            if not await redis_coll.set(f'wiki:refreshing:{suffix}', 1, nx=True, ex=60):
+                return
+        except RedisError:
+            pools.mark_redis_down()
+    try:
+        await acoalesce(suffix, lambda: arefresh_wiki_page(suffix, stored))
+    except Exception as exc:
+        print(f"Background refresh of {suffix} failed: {exc!r}")
+
+async def aget_wiki_cached(suffix):
+    """
+    Async counterpart of api.get_wiki_cached, using redis.asyncio, AsyncMongoClient and httpx.AsyncClient.
+
+    Args:
+        suffix (str): The Wikipedia page title.
+
+    Returns:
+        dict: A JSON object representing the scraped data from the Wikipedia page.
+    """
+    ttl = wiki_conf()['L1_TTL']
+    redis_coll = await pools.get_async_redis()
+    if redis_coll is not None:
+        try:
+            cached = await redis_coll.get(suffix)
+            if cached is not None:
+                await redis_coll.expire(suffix, ttl)
+                return json.loads(cached)
+        except RedisError:
+            pools.mark_redis_down()
+
+    stored = None
+    if not pools.mongo_is_down():
+        try:
+            stored = await pools.get_async_mongo_collection('wiki_pages').find_one({'_id': suffix})
+        except PyMongoError as exc:
+            pools.mark_mongo_down()
+            print(f"Unable to read {suffix} from MongoDB, scraping it: {exc!r}")
+    if stored is not None:
+        if is_stale(stored) and suffix not in _ainflight:
+            # keep a reference, the loop only holds weak ones to its tasks
+            task = asyncio.create_task(_arefresh(suffix, stored))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        await _acache(suffix, stored['data'])
+        return stored['data']
+
+    return await acoalesce(suffix, lambda: ascrape_and_store(suffix))
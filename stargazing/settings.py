@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mainApp.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,6 +84,65 @@ DATABASES = {
 }
 '''
 
+# Route session, constellations and the wiki/id API to their async versions (mainApp/asyncViews.py),
+# meant for ASGI servers: SKYGAZE_ASYNC_VIEWS=1 uvicorn stargazing.asgi:application
+ASYNC_VIEWS = os.environ.get('SKYGAZE_ASYNC_VIEWS') == '1'
+if ASYNC_VIEWS:
+    # the same middleware, with their hooks run on the event loop instead of a thread each
+    # (see mainApp/asyncMiddleware.py)
+    MIDDLEWARE = [
+        'mainApp.instrumentation.InstrumentationMiddleware',
+        'mainApp.asyncMiddleware.SecurityMiddleware',
+        'mainApp.asyncMiddleware.SessionMiddleware',
+        'mainApp.asyncMiddleware.CommonMiddleware',
+        'mainApp.asyncMiddleware.CsrfViewMiddleware',
+        'mainApp.asyncMiddleware.AuthenticationMiddleware',
+        'mainApp.asyncMiddleware.MessageMiddleware',
+        'mainApp.asyncMiddleware.XFrameOptionsMiddleware',
+    ]
+
+# Every group of settings below overrides the defaults of its module (the *_DEFAULTS dict next to the
+# code that reads it); keys and groups left out keep their defaults.
+
+# Process-wide MongoDB and Redis connection pools (see mainApp/pools.py)
+MONGO = {
+    'URI': os.environ.get('SKYGAZE_MONGO_URI', 'mongodb://localhost:27017'),
+}
+
+REDIS = {
+    'HOST': os.environ.get('SKYGAZE_REDIS_HOST', 'localhost'),
+    'PORT': int(os.environ.get('SKYGAZE_REDIS_PORT', 6379)),
+}
+
+# Precomputed (latitude, sidereal time) visibility index, built with `python manage.py build_sky_index`
+# (see mainApp/skyIndex.py). Without the file every constellation is computed on each request.
+SKY_INDEX = {
+    'PATH': BASE_DIR / 'skyindex.bin',
+}
+
+# Opt-in cache of /session/ results (see SessionCache in mainApp/cache.py). Observations that round
+# to the same site and UTC time bucket share the visible list and the rendered cards.
+SESSION_CACHE = {
+    'ENABLED': os.environ.get('SKYGAZE_SESSION_CACHE') == '1',
+}
+
+# Opt-in warmup of every worker on startup (see mainApp/warmup.py): open the pools, load the catalog and
+# the sky index, precompute sidereal time and compile the templates before the first request
+WARMUP = {
+    'ENABLED': os.environ.get('SKYGAZE_WARMUP') == '1',
+}
+
+# Local mirror of the Wikipedia border images (see mainApp/borders.py), None as ROOT to hotlink them
+BORDERS = {
+    'ROOT': BASE_DIR / 'media' / 'borders',
+}
+
+# Per-request timing of MongoDB, Redis, outgoing HTTP, parsing and compute (see mainApp/instrumentation.py):
+# a Server-Timing header on every response and histograms at /metrics in the Prometheus text format
+INSTRUMENTATION = {
+    'ENABLED': os.environ.get('SKYGAZE_INSTRUMENTATION') == '1',
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 